@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""Record the quotes of brokerbot and replay them through its alerts
+
+Records the pages of Expansion (or the quotes, with --quotes) in a gzip
+file and replays them at full speed on a virtual clock, reporting ticks
+per second and the alerts that would have been sent.
+
+    python backtest.py record quotes.jsonl.gz --interval 60
+    python backtest.py replay quotes.jsonl.gz --rules rules.json
+
+The bot records its quotes too with RECORD_FILE. rules.json has the
+lists "rules" ([chat_id, name, "max" or "min", threshold]), "crossings"
+([chat_id, name, "ema20"]), "subscribers" ([chat_id]) and "alerts"
+([chat_id, "Bbva > 9 and Sab < 2"]).
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "brokerbot", "broker"))
+
+
+def record(args) -> None:
+    from expansion import Expansion
+    from fetcher import Fetcher
+    from recorder import Recorder
+    if args.quotes:
+        recorder = Recorder(Expansion(), args.filename)
+    else:
+        recorder = Recorder(Fetcher(Expansion.url, args.timeout),
+                            args.filename, "expansion")
+    count = 0
+    try:
+        while args.count is None or count < args.count:
+            try:
+                recorder.get()
+                count += 1
+            except Exception as exception:
+                print(f"Can not get the quotes: {exception}",
+                      file=sys.stderr)
+            if args.count is None or count < args.count:
+                time.sleep(args.interval)
+    finally:
+        recorder.close()
+
+
+def replay(args) -> None:
+    from expansion import Expansion
+    from market import MarketCalendar
+    from recorder import read_records, replay as run
+    config = {}
+    if args.rules:
+        with open(args.rules, "r", encoding="utf-8") as fr:
+            config = json.load(fr)
+    records = read_records(args.filename, {"expansion": Expansion.process})
+    result = run(records, config.get("rules", []),
+                 config.get("crossings", []), config.get("subscribers", []),
+                 MarketCalendar() if args.market_hours else None,
+                 config.get("alerts", []))
+    for timestamp, chat_id, text in result["alerts"]:
+        moment = time.strftime("%Y-%m-%d %H:%M:%S",
+                               time.localtime(timestamp))
+        print(f"{moment} {chat_id}: {text}")
+    print(f"{result['ticks']} ticks ({result['skipped']} skipped) in "
+          f"{result['seconds']:.3f}s, {result['ticks_per_second']:.0f} "
+          f"ticks/s, {len(result['alerts'])} alerts")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    parser_record = commands.add_parser("record")
+    parser_record.add_argument("filename")
+    parser_record.add_argument("--interval", type=float, default=60)
+    parser_record.add_argument("--count", type=int, default=None)
+    parser_record.add_argument("--timeout", type=float, default=10)
+    parser_record.add_argument("--quotes", action="store_true")
+    parser_record.set_defaults(function=record)
+    parser_replay = commands.add_parser("replay")
+    parser_replay.add_argument("filename")
+    parser_replay.add_argument("--rules", default="")
+    parser_replay.add_argument("--market-hours", action="store_true")
+    parser_replay.set_defaults(function=replay)
+    args = parser.parse_args()
+    try:
+        args.function(args)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
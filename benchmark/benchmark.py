@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""End to end benchmark of the bots against the fake Bot API
+
+Every bot runs in its own process (the modules of the bots share names)
+with its real Bot class, Dispatcher and Checkpoint, polling the local
+FakeTelegramAPI while a LoadGenerator injects commands. The replies go
+straight to the TelegramClient unless --rate-limit is given, because the
+SendQueue would otherwise measure the Telegram limits instead of the bot.
+
+    python benchmark.py all --updates 2000 --chats 50
+"""
+
+import argparse
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from threading import Event, Thread
+from fakeapi import FakeTelegramAPI
+from loadgen import LoadGenerator
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+BOTS = {
+    "brokerbot": os.path.join(ROOT, "brokerbot", "broker"),
+    "mementobot": os.path.join(ROOT, "mementobot", "mementobot"),
+    "sorteabot": os.path.join(ROOT, "sorteabot", "sorteabot"),
+}
+TOKEN = "1111111111:BENCHMARK"
+SORTEABOT_CHAT_ID = -100123
+QUOTES = {"Santander": 3.54, "Bbva": 7.12, "Iberdrola": 10.85,
+          "Inditex": 34.2, "Telefonica": 3.71}
+
+
+class QuotesMonitor:
+    """Stand-in of the brokerbot Monitor with fixed quotes"""
+
+    def __init__(self) -> None:
+        from snapshot import Snapshot
+        self._snapshot = Snapshot.build(1, QUOTES)
+        self._subscribers = frozenset()
+
+    def get_subscribers(self):
+        return self._subscribers
+
+    def subscribe(self, chat_id):
+        self._subscribers = self._subscribers | {chat_id}
+
+    def get_snapshot(self):
+        return self._snapshot
+
+    def get_rules(self, chat_id):
+        return []
+
+    def get_alerts(self, chat_id):
+        return []
+
+
+def setup_brokerbot(args, telegram_client, send_queue, checkpoint,
+                    state_dir):
+    from bot import Bot
+    bot = Bot(telegram_client, QuotesMonitor(), send_queue, checkpoint,
+              pool_time=1, workers=args.workers)
+    commands = ["/help", "/list", "/get Santander", "/get Bbva"]
+    chat_ids = list(range(1, args.chats + 1))
+    return bot, commands, chat_ids
+
+
+def setup_mementobot(args, telegram_client, send_queue, checkpoint,
+                     state_dir):
+    from bot import Bot
+    from timewatcher import TimeWatcher
+    time_watcher = TimeWatcher(send_queue)
+    bot = Bot(telegram_client, time_watcher, send_queue, checkpoint,
+              pool_time=1, workers=args.workers)
+    commands = ["/help", "/list"]
+    chat_ids = list(range(1, args.chats + 1))
+    return bot, commands, chat_ids
+
+
+def setup_sorteabot(args, telegram_client, send_queue, checkpoint,
+                    state_dir):
+    from bot import Bot
+    from register import Register
+    database = os.path.join(state_dir, "database.db")
+    register = Register(database)
+    bot = Bot(telegram_client, send_queue, SORTEABOT_CHAT_ID, 0, register,
+              checkpoint, pool_time=1, workers=args.workers)
+    commands = ["/participo", "/estado", "/cuenta", "/plazo", "/ayuda"]
+    # sorteabot only listens to one chat
+    return bot, commands, [SORTEABOT_CHAT_ID]
+
+
+def percentile(values: list, percent: int) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100)[percent - 1]
+
+
+def run_bot(name: str, args) -> dict:
+    sys.path.insert(0, BOTS[name])
+    from checkpoint import Checkpoint
+    from sendqueue import SendQueue
+    from telegram import TelegramClient
+    api = FakeTelegramAPI()
+    api.start()
+    telegram_client = TelegramClient(TOKEN, api.url)
+    if args.rate_limit:
+        send_queue = SendQueue(telegram_client)
+        send_queue.start()
+    else:
+        send_queue = telegram_client
+    with tempfile.TemporaryDirectory() as state_dir:
+        checkpoint = Checkpoint(state_dir)
+        setup = globals()[f"setup_{name}"]
+        bot, commands, chat_ids = setup(args, telegram_client, send_queue,
+                                        checkpoint, state_dir)
+        load_generator = LoadGenerator(api, commands, chat_ids,
+                                       users=args.users)
+
+        stopped = Event()
+
+        def poll():
+            while not stopped.is_set():
+                bot.get_updates()
+
+        poller = Thread(target=poll, daemon=True)
+        poller.start()
+        start = time.perf_counter()
+        load_generator.run(args.updates, args.rate)
+        completed = api.wait_replies(args.updates, args.timeout)
+        elapsed = time.perf_counter() - start
+        # the checkpoint is saved in state_dir, before it is removed
+        stopped.set()
+        poller.join()
+        bot.stop()
+    api.stop()
+    latencies = sorted(api.latencies)
+    return {
+        "bot": name,
+        "updates": args.updates,
+        "replies": len(api.messages),
+        "completed": completed,
+        "elapsed": elapsed,
+        "throughput": len(api.messages) / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 50) * 1000,
+        "p99": percentile(latencies, 99) * 1000,
+    }
+
+
+def report(result: dict) -> str:
+    status = "" if result["completed"] else " (timeout)"
+    return (f"{result['bot']}: {result['replies']}/{result['updates']} "
+            f"replies in {result['elapsed']:.2f}s{status} -> "
+            f"{result['throughput']:.1f} updates/s, "
+            f"p50 {result['p50']:.2f} ms, p99 {result['p99']:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("bot", choices=list(BOTS) + ["all"])
+    parser.add_argument("--updates", type=int, default=1000)
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=0,
+                        help="updates per second (0 = as fast as possible)")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--rate-limit", action="store_true",
+                        help="send the replies through the SendQueue")
+    args = parser.parse_args()
+    if args.bot == "all":
+        options = sys.argv[2:]
+        for name in BOTS:
+            subprocess.run([sys.executable, __file__, name] + options,
+                           check=False)
+        return
+    logging.basicConfig(level=logging.WARNING)
+    print(report(run_bot(args.bot, args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import json
+import logging
+import time
+from collections import defaultdict, deque
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Condition, Thread
+from urllib.parse import parse_qsl, urlparse
+
+logger = logging.getLogger(__name__)
+
+MAX_UPDATES = 100
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Bot",
+            "username": "fakebot"}
+
+
+class FakeTelegramAPI(Thread):
+    """Local stand-in for the Telegram Bot API
+
+    Implements getMe, getUpdates (with long polling), sendMessage,
+    getChatAdministrators and getChatMember for any token. Updates are
+    injected with `inject` and every message sent by the bot is recorded
+    with the time elapsed since the oldest unanswered update of its chat.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        logger.debug("__init__")
+        super().__init__()
+        self.daemon = True
+        self._condition = Condition()
+        self._updates = deque()
+        self._next_update_id = 1
+        self._pending = defaultdict(deque)
+        self._administrators = defaultdict(list)
+        self.messages = []
+        self.latencies = []
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def add_administrator(self, chat_id: int, user: dict) -> None:
+        self._administrators[chat_id].append({"status": "administrator",
+                                              "user": user})
+
+    def inject(self, update: dict) -> int:
+        """Queue an update for getUpdates. Returns its update_id"""
+        with self._condition:
+            update_id = self._next_update_id
+            self._next_update_id += 1
+            update = dict(update, update_id=update_id)
+            self._updates.append(update)
+            chat_id = self.get_chat_id(update)
+            if chat_id is not None:
+                self._pending[chat_id].append(time.perf_counter())
+            self._condition.notify_all()
+            return update_id
+
+    def wait_replies(self, count: int, timeout: float) -> bool:
+        """Wait until `count` messages have been sent by the bot"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while len(self.messages) < count:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            return True
+
+    @staticmethod
+    def get_chat_id(update: dict):
+        message = update.get("message")
+        return message["chat"]["id"] if message else None
+
+    def get_updates(self, params: dict) -> list:
+        offset = int(params.get("offset", 0))
+        timeout = float(params.get("timeout", 0))
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            # the updates below the offset are confirmed
+            while self._updates and self._updates[0]["update_id"] < offset:
+                self._updates.popleft()
+            while not self._updates:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            return list(self._updates)[:MAX_UPDATES]
+
+    def send_message(self, params: dict) -> dict:
+        chat_id = int(params["chat_id"])
+        with self._condition:
+            now = time.perf_counter()
+            if self._pending[chat_id]:
+                self.latencies.append(now - self._pending[chat_id].popleft())
+            message = {"message_id": len(self.messages) + 1,
+                       "chat": {"id": chat_id}, "date": int(time.time()),
+                       "text": params.get("text", ""), "from": BOT_USER}
+            self.messages.append(message)
+            self._condition.notify_all()
+            return message
+
+    def process(self, method: str, params: dict):
+        if method == "getMe":
+            return BOT_USER
+        if method == "getUpdates":
+            return self.get_updates(params)
+        if method == "sendMessage":
+            return self.send_message(params)
+        if method == "getChatAdministrators":
+            return self._administrators[int(params["chat_id"])]
+        if method == "getChatMember":
+            user_id = int(params["user_id"])
+            for member in self._administrators[int(params["chat_id"])]:
+                if member["user"]["id"] == user_id:
+                    return member
+            return {"status": "member", "user": {"id": user_id}}
+        if method in ("setWebhook", "deleteWebhook"):
+            return True
+        return None
+
+    def _handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _reply(self):
+                url = urlparse(self.path)
+                method = url.path.rsplit("/", 1)[-1]
+                params = dict(parse_qsl(url.query))
+                length = int(self.headers.get("Content-Length", 0))
+                if length > 0:
+                    params.update(json.loads(self.rfile.read(length)))
+                result = api.process(method, params)
+                if result is None:
+                    status = HTTPStatus.NOT_FOUND
+                    content = {"ok": False, "error_code": 404,
+                               "description": "Not Found"}
+                else:
+                    status = HTTPStatus.OK
+                    content = {"ok": True, "result": result}
+                body = json.dumps(content).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            # TelegramClient._post sends the json body with a GET
+            do_GET = _reply
+            do_POST = _reply
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def run(self):
+        logger.debug("run")
+        self._server.serve_forever()
+
+    def stop(self) -> None:
+        logger.debug("stop")
+        with self._condition:
+            self._condition.notify_all()
+        self._server.shutdown()
+        self._server.server_close()
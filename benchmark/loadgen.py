@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import itertools
+import random
+import time
+
+FIRST_NAMES = ("Ana", "Luis", "Marta", "Pablo", "Lucía", "Jorge", "Elena")
+
+
+class LoadGenerator:
+    """Injects a stream of synthetic commands into the fake Bot API
+
+    Attributes
+    ----------
+    commands : Texts to send, chosen at random
+    chat_ids : Chats where the commands are sent
+    users : Number of different users that send the commands
+    thread_id : Topic of the messages (0 for none)
+    """
+
+    def __init__(self, api, commands: list, chat_ids: list, users: int = 100,
+                 thread_id: int = 0, seed: int = 0) -> None:
+        self._api = api
+        self._commands = commands
+        self._chat_ids = chat_ids
+        self._thread_id = thread_id
+        self._random = random.Random(seed)
+        self._message_ids = itertools.count(1)
+        self._users = [self.user(index) for index in range(1, users + 1)]
+
+    @staticmethod
+    def user(index: int) -> dict:
+        return {"id": 1000 + index, "is_bot": False,
+                "first_name": FIRST_NAMES[index % len(FIRST_NAMES)],
+                "last_name": f"{index}", "username": f"user{index}",
+                "language_code": "es"}
+
+    def message(self, chat_id: int, user: dict, text: str) -> dict:
+        message = {"message_id": next(self._message_ids), "from": user,
+                   "chat": {"id": chat_id,
+                            "type": "supergroup" if chat_id < 0
+                            else "private"},
+                   "date": int(time.time()), "text": text}
+        if self._thread_id:
+            message["message_thread_id"] = self._thread_id
+        return {"message": message}
+
+    def next_update(self) -> dict:
+        chat_id = self._random.choice(self._chat_ids)
+        user = self._random.choice(self._users)
+        text = self._random.choice(self._commands)
+        return self.message(chat_id, user, text)
+
+    def run(self, count: int, rate: float = 0) -> float:
+        """Inject `count` updates, `rate` per second (0 = no limit)
+
+        Returns the time spent injecting them
+        """
+        start = time.perf_counter()
+        for index in range(count):
+            if rate:
+                delay = start + index / rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            self._api.inject(self.next_update())
+        return time.perf_counter() - start
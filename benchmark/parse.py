@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Parse time of the quote pages of brokerbot
+
+Compares the precompiled extractors of Expansion and Bolsarama with the
+previous implementation, that translated CSS selectors for every row,
+using the pages saved in brokerbot/tests/fixtures.
+
+    python parse.py --iterations 1000
+"""
+
+import argparse
+import os
+import sys
+import time
+import lxml.html
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+FIXTURES = os.path.join(ROOT, "brokerbot", "tests", "fixtures")
+sys.path.insert(0, os.path.join(ROOT, "brokerbot", "broker"))
+
+
+def cssselect_expansion(content):
+    data = {}
+    root = lxml.html.fromstring(content)
+    for row in root.cssselect(r"table#listado_valores tbody tr"):
+        name = row.cssselect("td>a")[0].text.title()
+        data[name] = float(row.cssselect("td")[1].text.replace(",", "."))
+    return data
+
+
+def cssselect_bolsarama(content):
+    data = {}
+    root = lxml.html.fromstring(content)
+    for row in root.cssselect("table.table.table-responsive>tbody>tr"):
+        name = row.cssselect("th>a")[0].text.title()
+        td = row.cssselect("td>span")[0]
+        data[name] = float(td.text[:-1].replace(",", "."))
+    return data
+
+
+def measure(function, content: bytes, iterations: int) -> float:
+    """Microseconds per page"""
+    function(content)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function(content)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+    from bolsarama import Bolsarama
+    from expansion import Expansion
+    cases = (("expansion", Expansion.process, cssselect_expansion),
+             ("bolsarama", Bolsarama.process, cssselect_bolsarama))
+    for name, process, baseline in cases:
+        with open(os.path.join(FIXTURES, f"{name}.html"), "rb") as fr:
+            content = fr.read()
+        assert process(content) == baseline(content)
+        new = measure(process, content, args.iterations)
+        old = measure(baseline, content, args.iterations)
+        print(f"{name}: {new:.1f} us/page (cssselect {old:.1f} us/page, "
+              f"x{old / new:.1f})")
+
+
+if __name__ == "__main__":
+    main()
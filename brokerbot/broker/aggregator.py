@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import logging
+import statistics
+import time
+import unicodedata
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from threading import Lock
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+FASTEST = "fastest"
+CONSENSUS = "consensus"
+TIMEOUT = 10
+# max relative difference between sources before they disagree
+TOLERANCE = 0.01
+# threads shared by all the sources
+WORKERS = 4
+# seconds the last quotes of a source are used while it has no new ones
+MAX_AGE = 900
+
+SOURCE_SECONDS = REGISTRY.histogram("broker_source_seconds",
+                                    "Time to get the quotes from a source",
+                                    ("source",))
+SOURCE_ERRORS = REGISTRY.counter("broker_source_errors_total",
+                                 "Failed or timed out requests to a source",
+                                 ("source",))
+
+
+class AggregatorException(Exception):
+    pass
+
+
+def normalize(name: str) -> str:
+    """Same key for the same ticker in every source
+
+    Without accents, dots or repeated spaces: "Acciona Energía" and
+    "ACCIONA  ENERGIA" are both "Acciona Energia".
+    """
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(char for char in name
+                   if not unicodedata.combining(char) and char != ".")
+    return " ".join(name.split()).title()
+
+
+class QuoteAggregator:
+    """Gets the quotes from several sources at the same time
+
+    With FASTEST the first source that answers wins, with CONSENSUS every
+    source that answers within `timeout` is used and the quotes are the
+    median of the sources. Either way `get` never takes longer than
+    `timeout` seconds. A source that is still busy with the previous
+    request is skipped.
+
+    The sources share a pool of `workers` threads and each one is
+    requested at most every its interval. Until then, or while it is
+    busy, late or failing, its last quotes are used for up to `max_age`
+    seconds, so sources of different indices add up their tickers.
+
+    Attributes
+    ----------
+    sources : Name and source, any object with a `get` method that
+        returns a dict of name and value
+    intervals : Name and minimum seconds between requests to the source
+    """
+
+    def __init__(self, sources: dict, mode: str = FASTEST,
+                 timeout: float = TIMEOUT,
+                 tolerance: float = TOLERANCE,
+                 intervals: dict | None = None,
+                 workers: int = WORKERS,
+                 max_age: float = MAX_AGE) -> None:
+        logger.debug("__init__")
+        if mode not in (FASTEST, CONSENSUS):
+            raise AggregatorException(f"{mode} is not a valid mode")
+        self._sources = sources
+        self._mode = mode
+        self._timeout = timeout
+        self._tolerance = tolerance
+        self._intervals = intervals or {}
+        self._max_age = max_age
+        self._executor = ThreadPoolExecutor(
+                max(1, min(workers, len(sources))),
+                thread_name_prefix="source")
+        self._lock = Lock()
+        self._running = {}
+        self._due = {}
+        # name: (time, quotes) of the last answer of every source
+        self._last = {}
+        self._stats = {name: {"ok": 0, "errors": 0, "timeouts": 0,
+                              "skipped": 0, "seconds": 0.0,
+                              "last_error": None}
+                       for name in sources}
+        self._disagreements = 0
+
+    def get(self) -> dict:
+        """Quotes by normalized name"""
+        logger.debug("get")
+        futures = {}
+        now = time.monotonic()
+        with self._lock:
+            for name, source in self._sources.items():
+                if now < self._due.get(name, 0):
+                    continue
+                running = self._running.get(name)
+                if running is not None and not running.done():
+                    self._stats[name]["skipped"] += 1
+                    continue
+                future = self._executor.submit(self._fetch, name, source)
+                self._running[name] = future
+                self._due[name] = now + self._intervals.get(name, 0)
+                futures[future] = name
+        results = {}
+        pending = set(futures)
+        deadline = time.monotonic() + self._timeout
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, remaining,
+                                 return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.result() is not None:
+                    results[futures[future]] = future.result()
+            if results and self._mode == FASTEST:
+                break
+        if self._mode == CONSENSUS or not results:
+            with self._lock:
+                for future in pending:
+                    self._stats[futures[future]]["timeouts"] += 1
+                    SOURCE_ERRORS.inc(source=futures[future])
+        # keep the order of the sources, the new quotes have preference
+        ordered = [results[name] for name in self._sources
+                   if name in results]
+        with self._lock:
+            for name in self._sources:
+                if name in results or name not in self._last:
+                    continue
+                timestamp, data = self._last[name]
+                if time.monotonic() - timestamp <= self._max_age:
+                    ordered.append(data)
+        if not ordered:
+            raise AggregatorException("No source answered")
+        if self._mode == FASTEST:
+            return self._merge_first(ordered)
+        return self._merge_median(ordered)
+
+    def get_stats(self) -> dict:
+        """Health of every source"""
+        with self._lock:
+            stats = {}
+            for name, values in self._stats.items():
+                calls = values["ok"] + values["errors"]
+                stats[name] = dict(values, seconds_avg=values["seconds"] /
+                                   calls if calls else 0.0)
+            stats["disagreements"] = self._disagreements
+            return stats
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _fetch(self, name: str, source):
+        start = time.perf_counter()
+        try:
+            data = {normalize(ticker): value
+                    for ticker, value in source.get().items()}
+        except Exception as exception:
+            logger.error(f"Can not get the quotes from {name}: {exception}")
+            SOURCE_ERRORS.inc(source=name)
+            with self._lock:
+                self._stats[name]["errors"] += 1
+                self._stats[name]["last_error"] = str(exception)
+            return None
+        seconds = time.perf_counter() - start
+        SOURCE_SECONDS.observe(seconds, source=name)
+        with self._lock:
+            self._stats[name]["ok"] += 1
+            self._stats[name]["seconds"] += seconds
+            self._last[name] = (time.monotonic(), data)
+        return data
+
+    @staticmethod
+    def _merge_first(results: list) -> dict:
+        data = {}
+        for result in reversed(results):
+            data.update(result)
+        return data
+
+    def _merge_median(self, results: list) -> dict:
+        values = {}
+        for result in results:
+            for name, value in result.items():
+                values.setdefault(name, []).append(value)
+        data = {}
+        disagreements = 0
+        for name, items in values.items():
+            data[name] = statistics.median(items)
+            if len(items) > 1 and data[name] and \
+                    (max(items) - min(items)) / data[name] > self._tolerance:
+                logger.warning(f"Sources disagree about {name}: {items}")
+                disagreements += 1
+        with self._lock:
+            self._disagreements += disagreements
+        return data
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import logging
+from threading import Lock
+from rules import MAX, Rule
+
+logger = logging.getLogger(__name__)
+
+# the price has to go back this fraction of the threshold to re-arm a rule
+HYSTERESIS = 0.005
+# seconds between two alerts of the same rule
+COOLDOWN = 1800
+# seconds the alerts of a chat are held to send them in one message
+WINDOW = 300
+# Telegram max length of a message
+MAX_LENGTH = 4096
+
+
+class RuleStates:
+    """Armed or fired state of the alert rules
+
+    A rule fires when the price crosses its threshold and then it is
+    disarmed until the price goes back beyond the threshold by the
+    hysteresis band, so a price that oscillates around the threshold
+    fires once. A rule that crosses again during its cooldown is held
+    and fires when the cooldown ends, if the price is still beyond.
+    """
+
+    def __init__(self, hysteresis: float = HYSTERESIS,
+                 cooldown: float = COOLDOWN) -> None:
+        self._hysteresis = hysteresis
+        self._cooldown = cooldown
+        # name: {rule: price that re-arms it}
+        self._disarmed = {}
+        # rule: time when it can fire again
+        self._cooling = {}
+        # name: rules crossed during their cooldown
+        self._held = {}
+        # the monitor updates while the bot discards replaced rules
+        self._lock = Lock()
+
+    def update(self, name: str, current: float, crossed: list,
+               now: float) -> list:
+        """The rules that fire, of the ones crossed by the new price"""
+        with self._lock:
+            disarmed = self._disarmed.get(name)
+            if disarmed:
+                for rule, price in list(disarmed.items()):
+                    if current <= price if rule.kind == MAX else \
+                            current >= price:
+                        del disarmed[rule]
+                if not disarmed:
+                    del self._disarmed[name]
+            held = self._held.pop(name, set())
+            candidates = [rule for rule in crossed
+                          if rule not in self._disarmed.get(name, ())]
+            candidates.extend(rule for rule in held if rule not in candidates)
+            fired = []
+            for rule in candidates:
+                if not self._is_beyond(rule, current):
+                    continue
+                if now < self._cooling.get(rule, 0):
+                    self._held.setdefault(name, set()).add(rule)
+                    continue
+                band = rule.threshold * self._hysteresis
+                self._disarmed.setdefault(name, {})[rule] = \
+                    rule.threshold - band if rule.kind == MAX \
+                    else rule.threshold + band
+                self._cooling[rule] = now + self._cooldown
+                fired.append(rule)
+            return fired
+
+    def discard(self, chat_id: int, name: str, kind: str) -> None:
+        """Forget the state of the rule, when it is replaced"""
+        def matches(rule: Rule) -> bool:
+            return (rule.chat_id, rule.name, rule.kind) == \
+                (chat_id, name, kind)
+        with self._lock:
+            disarmed = self._disarmed.get(name, {})
+            for rule in list(filter(matches, disarmed)):
+                del disarmed[rule]
+            for rule in list(filter(matches, self._cooling)):
+                del self._cooling[rule]
+            self._held.get(name, set()).difference_update(
+                    list(filter(matches, self._held.get(name, set()))))
+
+    def hold(self, rule: Rule, current: float) -> None:
+        """Fire a new rule in the next update if the price is already
+        beyond its threshold, as it is not going to cross it"""
+        if self._is_beyond(rule, current):
+            with self._lock:
+                self._held.setdefault(rule.name, set()).add(rule)
+
+    @staticmethod
+    def _is_beyond(rule: Rule, current: float) -> bool:
+        if rule.kind == MAX:
+            return current > rule.threshold
+        return current < rule.threshold
+
+
+class AlertCoalescer:
+    """Joins the alerts of a chat in one message per window
+
+    The first alert of a chat is sent right away and the next ones in
+    the following `window` seconds are held and sent together when it
+    ends, so a volatile session does not spend the Telegram quota.
+    """
+
+    def __init__(self, send_queue, window: float = WINDOW) -> None:
+        self._send_queue = send_queue
+        self._window = window
+        self._lock = Lock()
+        self._last_sent = {}
+        self._pending = {}
+
+    def add(self, chat_id: int, messages: list, now: float) -> None:
+        with self._lock:
+            if chat_id in self._pending:
+                self._pending[chat_id].extend(messages)
+                return
+            if now - self._last_sent.get(chat_id, -self._window) >= \
+                    self._window:
+                self._last_sent[chat_id] = now
+                self._send(chat_id, messages)
+            else:
+                self._pending[chat_id] = list(messages)
+
+    def flush(self, now: float, force: bool = False) -> float:
+        """Send the held alerts whose window ended
+
+        Returns the seconds to the end of the next window, or the window
+        if there are no alerts held.
+        """
+        next_flush = self._window
+        with self._lock:
+            for chat_id in list(self._pending):
+                due = self._last_sent[chat_id] + self._window
+                if force or due <= now:
+                    self._last_sent[chat_id] = now
+                    self._send(chat_id, self._pending.pop(chat_id))
+                else:
+                    next_flush = min(next_flush, due - now)
+        return next_flush
+
+    def _send(self, chat_id: int, messages: list) -> None:
+        text = ""
+        for message in messages:
+            if text and len(text) + len(message) + 1 > MAX_LENGTH:
+                self._send_queue.send_message(text, chat_id)
+                text = ""
+            text = f"{text}\n{message}" if text else message
+        if text:
+            self._send_queue.send_message(text, chat_id)
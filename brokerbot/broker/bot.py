@@ -21,15 +21,26 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-import json
 import logging
-import os
+import math
+from aggregator import normalize
+from chart import (ChartCache, merge_bars, parse_window, render_candles,
+                   render_line, UNITS, WINDOW)
+from checkpoint import Checkpoint
+from dispatcher import Dispatcher, WORKERS
+from metrics import REGISTRY
+from model import Update
+from router import Router
+from sendqueue import SendQueue
+from snapshot import Snapshot
 from telegram import TelegramClient
 
 logger = logging.getLogger(__name__)
 
-CURDIR = os.path.realpath(os.path.dirname(__file__))
-CONFIG = os.path.join(CURDIR, "config.json")
+POLL_SECONDS = REGISTRY.histogram("bot_poll_seconds",
+                                  "Time of the getUpdates long polls")
+UPDATES = REGISTRY.counter("bot_updates_total", "Updates received",
+                           ("status",))
 
 
 class BotException(Exception):
@@ -37,78 +48,99 @@ class BotException(Exception):
 
 
 class Bot:
-    def __init__(self, token, monitor, pool_time=300):
+    def __init__(self, telegram_client: TelegramClient, monitor,
+                 send_queue: SendQueue, checkpoint: Checkpoint, username="",
+                 pool_time=300, workers=WORKERS):
         logger.debug("__init__")
         self._pool_time = pool_time
-        self._telegram_client = TelegramClient(token)
+        self._telegram_client = telegram_client
+        self._send_queue = send_queue
         self._monitor = monitor
-        self._read_config()
-
-    def _read_config(self) -> None:
-        logger.debug("_read_config")
-        if os.path.exists(CONFIG):
-            with open(CONFIG, "r") as fr:
-                config = json.load(fr)
-                self._offset = config["offset"]
-        else:
-            self._offset = 0
+        self._checkpoint = checkpoint
+        self._router = Router(username)
+        self._router.add(self.process_help, "/help")
+        self._router.add(self.process_list, "/list")
+        self._router.add(self.process_get, "/get")
+        self._router.add(self.process_warning, "/warning")
+        self._router.add(self.process_max, "/max")
+        self._router.add(self.process_min, "/min")
+        self._router.add(self.process_configuration, "/configuration")
+        self._router.add(self.process_cross, "/cross")
+        self._router.add(self.process_uncross, "/uncross")
+        self._router.add(self.process_indicators, "/indicators")
+        self._router.add(self.process_chart, "/chart")
+        self._router.add(self.process_alert, "/alert")
+        self._router.add(self.process_unalert, "/unalert")
+        self._charts = ChartCache()
+        self._dispatcher = Dispatcher(self._handle_update, workers)
+        self._dispatcher.start()
+
+    def set_webhook(self, url: str, secret_token: str = "") -> None:
+        logger.debug("set_webhook")
+        self._telegram_client.set_webhook(url, secret_token)
+
+    def delete_webhook(self) -> None:
+        logger.debug("delete_webhook")
+        self._telegram_client.delete_webhook()
 
-    def _save_config(self) -> None:
-        logger.debug("_save_config")
-        with open(CONFIG, "w") as fw:
-            config = {
-                "offset": self._offset
-            }
-            json.dump(config, fw)
+    def stop(self) -> None:
+        """Wait for the updates dispatched and save the checkpoint"""
+        logger.debug("stop")
+        self._dispatcher.stop()
+        self._checkpoint.flush()
 
     def get_updates(self):
         logger.debug("get_updates")
-        response = self._telegram_client.get_updates(self._offset,
-                                                     self._pool_time)
+        with POLL_SECONDS.time():
+            response = self._telegram_client.get_updates(
+                    self._checkpoint.offset, self._pool_time)
         if response["ok"] and response["result"]:
             offset = max([item["update_id"] for item in response["result"]])
-            self._offset = offset + 1
-            self._save_config()
             self._process_response(response)
+            self._checkpoint.advance(offset + 1)
 
     def _process_response(self, response):
         logger.debug("_process_response")
-        chat_id = None
         for message in response["result"]:
-            try:
-                logger.debug(f"Message: {message}")
-                chat_id = message["message"]["chat"]["id"]
-                if self._monitor.get_chat_id() is None:
-                    self._monitor.set_chat_id(chat_id)
-                text = message["message"]["text"]
-                logger.debug(f"Text: {text}")
-                if text.startswith("/help"):
-                    self.process_help(message)
-                elif text.startswith("/list"):
-                    self.process_list(message)
-                elif text.startswith("/get"):
-                    self.process_get(message)
-                elif text.startswith("/warning"):
-                    self.process_warning(message)
-                elif text.startswith("/max"):
-                    self.process_max(message)
-                elif text.startswith("/min"):
-                    self.process_min(message)
-                elif text.startswith("/configuration"):
-                    self.process_configuration(message)
-                elif text.startswith("/"):
-                    command = text.split(" ")[0]
-                    msg = f"The command {command} is not implemented"
-                    raise BotException(msg)
-            except Exception as exception:
-                if chat_id:
-                    self._telegram_client.send_message(str(exception), chat_id)
+            if self._checkpoint.seen(message["update_id"]):
+                logger.debug(f"Already processed: {message['update_id']}")
+                UPDATES.inc(status="duplicated")
+                continue
+            UPDATES.inc(status="dispatched")
+            self._dispatcher.dispatch(message)
+
+    def _handle_update(self, data):
+        # in the worker: the update is done once the handler finishes
+        try:
+            self._process_update(data)
+        finally:
+            self._checkpoint.done(data["update_id"])
+
+    def _process_update(self, data):
+        logger.debug("_process_update")
+        chat_id = None
+        try:
+            logger.debug(f"Message: {data}")
+            message = Update.from_dict(data).message
+            if message is None or message.text is None:
+                return
+            chat_id = message.chat_id
+            if not self._monitor.get_subscribers():
+                self._monitor.subscribe(chat_id)
+            logger.debug(f"Text: {message.text}")
+            command = self._router.get_command(message.text)
+            if command and not self._router.dispatch(command, message):
+                msg = f"The command {command} is not implemented"
+                raise BotException(msg)
+        except Exception as exception:
+            if chat_id:
+                self._send_queue.send_message(str(exception), chat_id)
 
     def process_help(self, message):
-        chat_id = message["message"]["chat"]["id"]
+        chat_id = message.chat_id
         items = []
         items.append("/help 👉 show this help")
-        items.append("/list 👉 list Ibex 35 values")
+        items.append("/list 👉 list the values")
         items.append("/get 👉 get a value (/get <action>)")
         items.append(
                 "/max 👉 set max value for action (/max <action>,<value>)")
@@ -116,80 +148,209 @@ class Bot:
                 "/min 👉 set min value for action (/min <action>,<value>)")
         items.append(
                 "/configuration 👉 show max and min values configurated")
-        self._telegram_client.send_message("\n".join(items), chat_id)
+        items.append("/cross 👉 warn when the price crosses an average "
+                     "(/cross <action>,<sma20|ema20|...>)")
+        items.append("/uncross 👉 stop warning of a crossing "
+                     "(/uncross <action>,<indicator>)")
+        items.append(
+                "/indicators 👉 show the indicators (/indicators <action>)")
+        items.append(
+                "/chart 👉 chart of the prices (/chart <action> [6h|5d])")
+        items.append("/alert 👉 warn when the expression becomes true "
+                     "(/alert Santander > 4.2 and pct(Bbva, 1d) < -3)")
+        items.append("/unalert 👉 remove an alert (/unalert <number>)")
+        self._send_queue.send_message("\n".join(items), chat_id)
 
     def process_configuration(self, message):
-        chat_id = message["message"]["chat"]["id"]
-        data = self._monitor.get_data()
-        if data:
-            msg = "\n".join([f"{name} 👉 Max: {values['max']}, Min: {values['min']}" for name, values in data])
-            self._telegram_client.send_message(msg, chat_id)
+        chat_id = message.chat_id
+        rules = self._monitor.get_rules(chat_id)
+        alerts = self._monitor.get_alerts(chat_id)
+        if rules or alerts:
+            values = {}
+            for rule in rules:
+                values.setdefault(rule.name, {"max": None, "min": None})
+                values[rule.name][rule.kind] = rule.threshold
+            lines = [f"{name} 👉 Max: {value['max']}, Min: {value['min']}"
+                     for name, value in values.items()]
+            lines.extend(f"{number}. {expression.text}"
+                         for number, expression in enumerate(alerts, 1))
+            self._send_queue.send_message("\n".join(lines), chat_id)
         else:
-            msg = "There is no max and min values configurated"
+            msg = "There is no max and min values or alerts configurated"
             raise BotException(msg)
 
-
-
     def process_warning(self, message):
         logger.debug("process_warning")
-        chat_id = message["message"]["chat"]["id"]
-        self._monitor.set_chat_id(chat_id)
+        chat_id = message.chat_id
+        self._monitor.subscribe(chat_id)
 
     def process_min(self, message):
         logger.debug("process_min")
-        chat_id = message["message"]["chat"]["id"]
-        text = message["message"]["text"]
+        chat_id = message.chat_id
+        text = message.text
         items = text.split(" ")
         if len(items) > 1 and items[1].find(",") > 0:
             name, value = items[1].split(",")
-            value = float(value.strip())
-            self._monitor.set_min(name, value)
+            value = self._get_threshold(value)
+            self._monitor.set_min(chat_id, name, value)
             msg = f"Configured min value for {name} ({value})"
-            self._telegram_client.send_message(msg, chat_id)
+            self._send_queue.send_message(msg, chat_id)
         else:
             msg = "Name and value are mandatories. Set as 'name,value'"
             raise BotException(msg)
 
     def process_max(self, message):
         logger.debug("process_max")
-        chat_id = message["message"]["chat"]["id"]
-        text = message["message"]["text"]
+        chat_id = message.chat_id
+        text = message.text
         items = text.split(" ")
         if len(items) > 1 and items[1].find(",") > 0:
             name, value = items[1].split(",")
-            value = float(value.strip())
-            self._monitor.set_max(name, value)
+            value = self._get_threshold(value)
+            self._monitor.set_max(chat_id, name, value)
             msg = f"Configured max value for {name} ({value})"
-            self._telegram_client.send_message(msg, chat_id)
+            self._send_queue.send_message(msg, chat_id)
         else:
             msg = "Name and value are mandatories. Set as 'name,value'"
             raise BotException(msg)
 
+    def process_cross(self, message):
+        logger.debug("process_cross")
+        chat_id = message.chat_id
+        name, indicator = self._get_name_and_value(message.text)
+        self._monitor.subscribe_crossing(chat_id, name, indicator)
+        msg = f"Configured crossing of {indicator} for {name}"
+        self._send_queue.send_message(msg, chat_id)
+
+    def process_uncross(self, message):
+        logger.debug("process_uncross")
+        chat_id = message.chat_id
+        name, indicator = self._get_name_and_value(message.text)
+        if not self._monitor.unsubscribe_crossing(chat_id, name, indicator):
+            msg = f"There is no crossing of {indicator} for {name}"
+            raise BotException(msg)
+        msg = f"Removed crossing of {indicator} for {name}"
+        self._send_queue.send_message(msg, chat_id)
+
+    def process_indicators(self, message):
+        logger.debug("process_indicators")
+        chat_id = message.chat_id
+        items = message.text.split(" ")
+        if len(items) < 2:
+            msg = "Error: tienes que proporcionar un nombre"
+            raise BotException(msg)
+        name = normalize(items[1])
+        indicators = self._monitor.get_indicators(name)
+        if indicators is None:
+            msg = f"Error: no hay indicadores para {name}"
+            raise BotException(msg)
+        lines = [name]
+        for key, value in indicators.items():
+            value = "-" if value is None else f"{value:.4f}"
+            lines.append(f"{key} 👉 {value}")
+        self._send_queue.send_message("\n".join(lines), chat_id)
+
+    def process_chart(self, message):
+        logger.debug("process_chart")
+        chat_id = message.chat_id
+        items = message.text.split(" ")
+        if len(items) < 2:
+            msg = "Error: tienes que proporcionar un nombre"
+            raise BotException(msg)
+        name = normalize(items[1])
+        window = items[2] if len(items) > 2 else WINDOW
+        seconds = parse_window(window)
+        version = self._monitor.get_snapshot().version
+        chart = self._charts.get((name, seconds, version),
+                                 lambda: self._render_chart(name, seconds))
+        self._send_queue.send_photo(chart, chat_id, f"{name} {window}")
+
+    def process_alert(self, message):
+        logger.debug("process_alert")
+        chat_id = message.chat_id
+        items = message.text.split(" ", 1)
+        if len(items) < 2 or not items[1].strip():
+            msg = "The expression is mandatory (/alert Bbva > 9)"
+            raise BotException(msg)
+        expression, value = self._monitor.add_alert(chat_id, items[1])
+        msg = f"Configured alert {expression.text}"
+        if value:
+            msg += " (ya se cumple)"
+        self._send_queue.send_message(msg, chat_id)
+
+    def process_unalert(self, message):
+        logger.debug("process_unalert")
+        chat_id = message.chat_id
+        items = message.text.split(" ")
+        alerts = self._monitor.get_alerts(chat_id)
+        if len(items) < 2 or not items[1].isdigit() or \
+                not 0 < int(items[1]) <= len(alerts):
+            msg = "The number of the alert is mandatory, see /configuration"
+            raise BotException(msg)
+        expression = alerts[int(items[1]) - 1]
+        self._monitor.remove_alert(chat_id, expression.text)
+        msg = f"Removed alert {expression.text}"
+        self._send_queue.send_message(msg, chat_id)
+
+    def _render_chart(self, name: str, seconds: int) -> bytes:
+        bars = self._monitor.get_bars(name, seconds)
+        if not bars:
+            msg = f"Error: no hay histórico para {name}"
+            raise BotException(msg)
+        if seconds > UNITS["d"]:
+            return render_candles(merge_bars(bars))
+        return render_line([bar[4] for bar in bars])
+
+    @staticmethod
+    def _get_threshold(value: str) -> float:
+        try:
+            threshold = float(value.strip())
+        except ValueError:
+            threshold = math.nan
+        if not math.isfinite(threshold):
+            msg = f"{value.strip()} is not a valid value"
+            raise BotException(msg)
+        return threshold
+
+    @staticmethod
+    def _get_name_and_value(text: str) -> tuple:
+        items = text.split(" ")
+        if len(items) > 1 and items[1].find(",") > 0:
+            name, value = items[1].split(",", 1)
+            return name, value.strip()
+        msg = "Name and value are mandatories. Set as 'name,value'"
+        raise BotException(msg)
+
     def process_list(self, message):
         logger.debug("process_list")
-        chat_id = message["message"]["chat"]["id"]
-        response = ""
-        data = self._monitor.get_current_data()
-        logger.debug(f"Data: {data}")
-        response = "\n".join([f"{name}: {value}"
-                              for name, value in data.items()])
-        self._telegram_client.send_message(response, chat_id=chat_id)
+        chat_id = message.chat_id
+        snapshot = self._monitor.get_snapshot()
+        response = snapshot.text + self._get_age(snapshot)
+        self._send_queue.send_message(response, chat_id=chat_id)
 
     def process_get(self, message):
         logger.debug("process_get")
         response = None
-        text = message["message"]["text"]
-        chat_id = message["message"]["chat"]["id"]
+        text = message.text
+        chat_id = message.chat_id
         items = text.split(" ")
         if len(items) > 1:
-            name = items[1].title()
-            data = self._monitor.get_current_data()
-            if name in data.keys():
-                response = f"Valor para {name}: {data[name]}"
+            name = normalize(items[1])
+            snapshot = self._monitor.get_snapshot()
+            if name in snapshot.data:
+                response = (f"Valor para {name}: {snapshot.data[name]}"
+                            f"{self._get_age(snapshot)}")
             if response is None:
                 msg = f"Error: no encontrado este valor para {name}"
                 raise BotException(msg)
         else:
             msg = "Error: tienes que proporcionar un nombre"
             raise BotException(msg)
-        self._telegram_client.send_message(response, chat_id=chat_id)
+        self._send_queue.send_message(response, chat_id=chat_id)
+
+    @staticmethod
+    def _get_age(snapshot: Snapshot) -> str:
+        """Nothing or how old are the quotes if they are stale"""
+        if not snapshot.is_stale():
+            return ""
+        return f"\n(hace {int(snapshot.get_age() // 60)} minutos)"
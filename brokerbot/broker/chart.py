@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import re
+import struct
+import zlib
+from collections import OrderedDict
+from threading import Lock
+from metrics import REGISTRY
+
+WIDTH = 600
+HEIGHT = 240
+MARGIN = 10
+CANDLES = 48
+CACHE_SIZE = 128
+WINDOW = "1d"
+MAX_WINDOW = 30 * 86400
+UNITS = {"h": 3600, "d": 86400}
+WINDOW_PATTERN = re.compile(r"^(\d+)([hd])$")
+BACKGROUND = (255, 255, 255)
+GRID = (225, 225, 225)
+LINE = (33, 102, 172)
+UP = (26, 152, 80)
+DOWN = (215, 48, 39)
+
+CACHE_REQUESTS = REGISTRY.counter("broker_chart_cache_total",
+                                  "Charts requested", ("result",))
+
+
+class ChartException(Exception):
+    pass
+
+
+def parse_window(text: str) -> int:
+    """Seconds of a window like 6h or 5d"""
+    match = WINDOW_PATTERN.match(text.strip().lower())
+    if match is None:
+        raise ChartException(f"{text} is not a window (6h, 1d, 5d...)")
+    seconds = int(match.group(1)) * UNITS[match.group(2)]
+    if not 0 < seconds <= MAX_WINDOW:
+        raise ChartException("The window must be between 1h and 30d")
+    return seconds
+
+
+class Canvas:
+    """RGB image in memory that can be saved as PNG"""
+
+    def __init__(self, width: int, height: int,
+                 background: tuple = BACKGROUND) -> None:
+        self.width = width
+        self.height = height
+        self._pixels = bytearray(bytes(background) * width * height)
+
+    def set_pixel(self, x: int, y: int, color: tuple) -> None:
+        if 0 <= x < self.width and 0 <= y < self.height:
+            position = 3 * (y * self.width + x)
+            self._pixels[position:position + 3] = bytes(color)
+
+    def line(self, x0: int, y0: int, x1: int, y1: int,
+             color: tuple) -> None:
+        """Bresenham"""
+        dx = abs(x1 - x0)
+        dy = -abs(y1 - y0)
+        sx = 1 if x0 < x1 else -1
+        sy = 1 if y0 < y1 else -1
+        error = dx + dy
+        while True:
+            self.set_pixel(x0, y0, color)
+            if x0 == x1 and y0 == y1:
+                return
+            double = 2 * error
+            if double >= dy:
+                error += dy
+                x0 += sx
+            if double <= dx:
+                error += dx
+                y0 += sy
+
+    def rectangle(self, x0: int, y0: int, x1: int, y1: int,
+                  color: tuple) -> None:
+        """Filled, both corners included"""
+        x0, x1 = sorted((max(x0, 0), min(x1, self.width - 1)))
+        row = bytes(color) * (x1 - x0 + 1)
+        for y in range(max(min(y0, y1), 0),
+                       min(max(y0, y1), self.height - 1) + 1):
+            position = 3 * (y * self.width + x0)
+            self._pixels[position:position + len(row)] = row
+
+    def to_png(self) -> bytes:
+        stride = 3 * self.width
+        # filter type 0 (none) at the start of every row
+        raw = b"".join(b"\x00" + self._pixels[y * stride:(y + 1) * stride]
+                       for y in range(self.height))
+        return b"".join((
+            b"\x89PNG\r\n\x1a\n",
+            _chunk(b"IHDR", struct.pack(">IIBBBBB", self.width, self.height,
+                                        8, 2, 0, 0, 0)),
+            _chunk(b"IDAT", zlib.compress(raw, 6)),
+            _chunk(b"IEND", b"")))
+
+
+def _chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + \
+        struct.pack(">I", zlib.crc32(kind + data))
+
+
+def _scale(low: float, high: float, height: int):
+    """Function from price to row, the highest price at the top"""
+    span = (high - low) or 1.0
+    usable = height - 2 * MARGIN - 1
+
+    def scale(value: float) -> int:
+        return MARGIN + round((high - value) / span * usable)
+    return scale
+
+
+def _grid(canvas: Canvas) -> None:
+    for index in range(5):
+        y = MARGIN + index * (canvas.height - 2 * MARGIN - 1) // 4
+        canvas.line(0, y, canvas.width - 1, y, GRID)
+
+
+def render_line(prices: list, width: int = WIDTH,
+                height: int = HEIGHT) -> bytes:
+    """Sparkline of the prices as PNG"""
+    if not prices:
+        raise ChartException("There are no prices")
+    canvas = Canvas(width, height)
+    _grid(canvas)
+    scale = _scale(min(prices), max(prices), height)
+    step = (width - 2 * MARGIN - 1) / max(len(prices) - 1, 1)
+    points = [(MARGIN + round(index * step), scale(price))
+              for index, price in enumerate(prices)]
+    for (x0, y0), (x1, y1) in zip(points, points[1:]):
+        canvas.line(x0, y0, x1, y1, LINE)
+    if len(points) == 1:
+        canvas.set_pixel(*points[0], LINE)
+    return canvas.to_png()
+
+
+def merge_bars(bars: list, count: int = CANDLES) -> list:
+    """(open, high, low, close) of `count` groups of OHLC bars"""
+    size = max(1, -(-len(bars) // count))
+    return [(group[0][1], max(bar[2] for bar in group),
+             min(bar[3] for bar in group), group[-1][4])
+            for group in (bars[index:index + size]
+                          for index in range(0, len(bars), size))]
+
+
+def render_candles(candles: list, width: int = WIDTH,
+                   height: int = HEIGHT) -> bytes:
+    """Candlestick chart of (open, high, low, close) as PNG"""
+    if not candles:
+        raise ChartException("There are no prices")
+    canvas = Canvas(width, height)
+    _grid(canvas)
+    scale = _scale(min(candle[2] for candle in candles),
+                   max(candle[1] for candle in candles), height)
+    step = (width - 2 * MARGIN) / len(candles)
+    body = max(1, int(step * 0.6) // 2)
+    for index, (opening, high, low, closing) in enumerate(candles):
+        x = MARGIN + int(step * index + step / 2)
+        color = UP if closing >= opening else DOWN
+        canvas.line(x, scale(high), x, scale(low), color)
+        canvas.rectangle(x - body, scale(opening), x + body, scale(closing),
+                         color)
+    return canvas.to_png()
+
+
+class ChartCache:
+    """LRU of rendered charts
+
+    The key includes the version of the quotes, so a chart is rendered
+    once by price update however many times it is requested.
+    """
+
+    def __init__(self, size: int = CACHE_SIZE) -> None:
+        self._size = size
+        self._lock = Lock()
+        self._charts = OrderedDict()
+
+    def get(self, key: tuple, render) -> bytes:
+        """The chart of key, calling render() if it is not cached"""
+        with self._lock:
+            chart = self._charts.get(key)
+            if chart is not None:
+                self._charts.move_to_end(key)
+                CACHE_REQUESTS.inc(result="hit")
+                return chart
+        CACHE_REQUESTS.inc(result="miss")
+        chart = render()
+        with self._lock:
+            self._charts[key] = chart
+            self._charts.move_to_end(key)
+            while len(self._charts) > self._size:
+                self._charts.popitem(last=False)
+        return chart
+
+    def __len__(self) -> int:
+        return len(self._charts)
@@ -22,16 +22,22 @@
 # SOFTWARE.
 
 import logging
-import lxml.html
-import requests
+from extractor import Extractor
+from fetcher import Fetcher, FetcherException, TIMEOUT
+from plugins import register
 
 logger = logging.getLogger(__name__)
 
+EXTRACTOR = Extractor("//table[@id='listado_valores']//tbody/tr",
+                      "string((.//td/a)[1])",
+                      "string((.//td)[2]/text())")
+
 
 class ExpansionException(Exception):
     pass
 
 
+@register("expansion")
 class Expansion:
     """
     Obtiene los datos de Expansion
@@ -40,41 +46,35 @@ class Expansion:
 
     Attributes
     ----------
-    headers : Encabezados
+    timeout : Segundos de espera de la respuesta
+    url : Otra página con el mismo formato (otro índice)
     """
     url = ("https://www.expansion.com/mercados/cotizaciones/indices/"
            "ibex25_I.IB.html")
 
-    def __init__(self) -> None:
+    def __init__(self, timeout: float = TIMEOUT,
+                 url: str | None = None) -> None:
         logger.debug("__init__")
-        self._session = requests.Session()
-        self._session.headers = {
-            "User-Agent": ("Mozilla/5.0 (Macintosh; Intel Mac OS X "
-                           "10_10_1) AppleWebKit/537.36 (KHTML, "
-                           "like Gecko) Chrome/39.0.2171.95 "
-                           "Safari/537.36")}
+        self._fetcher = Fetcher(url or self.url, timeout)
+        self._data = None
 
     def get(self):
+        """Las cotizaciones. Solo procesa la página si ha cambiado"""
         logger.debug("get")
-        response = self._session.get(self.url)
-        logger.debug(f"Response. Status code: {response.status_code}. Content:"
-                     f"response.text")
-        if response.status_code != 200:
-            msg = f"HTTP Error: {response.status_code}. {response.text}"
-            raise ExpansionException(msg)
-        return self.process(response.text)
+        try:
+            content = self._fetcher.get()
+        except FetcherException as exception:
+            raise ExpansionException(exception) from exception
+        if content is not None:
+            try:
+                self._data = self.process(content)
+            except Exception:
+                # process it again next time, even if it does not change
+                self._fetcher.reset()
+                raise
+        return self._data
 
     @staticmethod
     def process(content):
         logger.debug("process")
-        data = {}
-        root = lxml.html.fromstring(content)
-        rows = root.cssselect(r"table#listado_valores tbody tr")
-        lxml.html.tostring(rows[0])
-        for row in rows:
-            th = row.cssselect("td>a")[0]
-            name = th.text.title()
-            td = row.cssselect("td")[1]
-            value = float(td.text.replace(",", "."))
-            data[name] = value
-        return data
+        return EXTRACTOR.extract(content)
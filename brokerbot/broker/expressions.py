@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import logging
+import operator
+import re
+import time
+from dataclasses import dataclass
+from threading import Lock
+from aggregator import normalize
+from alerts import COOLDOWN
+
+logger = logging.getLogger(__name__)
+
+TOKEN = re.compile(r'\s*(?:(?P<number>\d+(?:\.\d+)?)(?P<unit>[mhd])?\b'
+                   r'|"(?P<string>[^"]+)"'
+                   r'|(?P<op><=|>=|==|!=|[<>()+\-*/,])'
+                   r'|(?P<word>[^\W\d][\w.&]*))')
+UNITS = {"m": 60, "h": 3600, "d": 86400}
+KEYWORDS = ("and", "or", "not")
+COMPARISONS = {"<": operator.lt, "<=": operator.le, ">": operator.gt,
+               ">=": operator.ge, "==": operator.eq, "!=": operator.ne}
+ARITHMETIC = {"+": operator.add, "-": operator.sub, "*": operator.mul,
+              "/": operator.truediv}
+# max length of an expression
+MAX_LENGTH = 200
+
+
+class ExpressionException(Exception):
+    pass
+
+
+@dataclass(slots=True, frozen=True)
+class Expression:
+    """An alert expression compiled once
+
+    evaluate(prices, past) gets the prices by name and past(name,
+    seconds), the price seconds ago or None, and returns a bool.
+    """
+    text: str
+    tickers: frozenset
+    evaluate: object
+
+
+def _tokenize(text: str) -> list:
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = TOKEN.match(text, position)
+        if match is None or match.end() == position:
+            raise ExpressionException(
+                    f"Unexpected {text[position:].strip()[:10]!r}")
+        position = match.end()
+        kind = match.lastgroup if match.lastgroup != "unit" else "number"
+        if kind == "number":
+            tokens.append(("number", (float(match.group("number")),
+                                      match.group("unit"))))
+        elif kind == "word" and match.group("word").lower() in KEYWORDS:
+            tokens.append(("op", match.group("word").lower()))
+        else:
+            tokens.append((kind, match.group(kind)))
+    return tokens
+
+
+def _compare(function, left, right):
+    def evaluate(prices, past):
+        a = left(prices, past)
+        b = right(prices, past)
+        return a is not None and b is not None and function(a, b)
+    return evaluate
+
+
+def _either(left, right):
+    return lambda prices, past: bool(left(prices, past) or
+                                     right(prices, past))
+
+
+def _both(left, right):
+    return lambda prices, past: bool(left(prices, past) and
+                                     right(prices, past))
+
+
+def _calculate(function, left, right):
+    def evaluate(prices, past):
+        a = left(prices, past)
+        b = right(prices, past)
+        if a is None or b is None or (function is operator.truediv and
+                                      not b):
+            return None
+        return function(a, b)
+    return evaluate
+
+
+def _pct(name: str, seconds: float):
+    def evaluate(prices, past):
+        current = prices.get(name)
+        before = past(name, seconds)
+        if current is None or not before:
+            return None
+        return (current - before) / before * 100
+    return evaluate
+
+
+class _Parser:
+    """Recursive descent parser that builds the closures
+
+    expression := and ("or" and)*
+    and := not ("and" not)*
+    not := "not" not | sum (comparison sum)?
+    sum := product (("+" | "-") product)*
+    product := factor (("*" | "/") factor)*
+    factor := number | ticker | "-" factor | "(" expression ")"
+              | "pct(" ticker "," window ")"
+    """
+
+    def __init__(self, text: str) -> None:
+        self._tokens = _tokenize(text)
+        self._position = 0
+        self.tickers = set()
+
+    def parse(self):
+        function, boolean = self._or()
+        if self._position < len(self._tokens):
+            raise ExpressionException(
+                    f"Unexpected {self._tokens[self._position][1]!r}")
+        if not boolean:
+            raise ExpressionException("The expression has to be a "
+                                      "comparison (Bbva > 9)")
+        return function
+
+    def _peek(self):
+        if self._position < len(self._tokens):
+            return self._tokens[self._position]
+        return (None, None)
+
+    def _next(self):
+        token = self._peek()
+        if token[0] is None:
+            raise ExpressionException("Unexpected end of the expression")
+        self._position += 1
+        return token
+
+    def _expect(self, value: str) -> None:
+        if self._next() != ("op", value):
+            raise ExpressionException(f"Expected {value!r}")
+
+    def _or(self):
+        left, boolean = self._and()
+        while self._peek() == ("op", "or"):
+            self._next()
+            right = self._boolean(self._and())
+            left = _either(self._boolean((left, boolean)), right)
+            boolean = True
+        return left, boolean
+
+    def _and(self):
+        left, boolean = self._not()
+        while self._peek() == ("op", "and"):
+            self._next()
+            right = self._boolean(self._not())
+            left = _both(self._boolean((left, boolean)), right)
+            boolean = True
+        return left, boolean
+
+    def _not(self):
+        if self._peek() == ("op", "not"):
+            self._next()
+            operand = self._boolean(self._not())
+            return (lambda prices, past: not operand(prices, past)), True
+        left = self._sum()
+        kind, value = self._peek()
+        if kind == "op" and value in COMPARISONS:
+            self._next()
+            right = self._number(self._sum())
+            return _compare(COMPARISONS[value], self._number(left),
+                            right), True
+        return left
+
+    def _sum(self):
+        left = self._product()
+        while self._peek()[0] == "op" and self._peek()[1] in "+-":
+            function = ARITHMETIC[self._next()[1]]
+            left = _calculate(function, self._number(left),
+                              self._number(self._product())), False
+        return left
+
+    def _product(self):
+        left = self._factor()
+        while self._peek()[0] == "op" and self._peek()[1] in "*/":
+            function = ARITHMETIC[self._next()[1]]
+            left = _calculate(function, self._number(left),
+                              self._number(self._factor())), False
+        return left
+
+    def _factor(self):
+        """(function, boolean), boolean if it is a comparison"""
+        kind, value = self._next()
+        if kind == "number":
+            number, unit = value
+            if unit is not None:
+                raise ExpressionException(f"{number:g}{unit} is a window, "
+                                          "only for pct")
+            return (lambda prices, past: number), False
+        if kind == "op" and value == "-":
+            operand = self._number(self._factor())
+            return _calculate(operator.sub, lambda prices, past: 0.0,
+                              operand), False
+        if kind == "op" and value == "(":
+            result = self._or()
+            self._expect(")")
+            return result
+        if kind == "word" and value.lower() == "pct" and \
+                self._peek() == ("op", "("):
+            self._next()
+            name = self._ticker()
+            self._expect(",")
+            kind, window = self._next()
+            if kind != "number" or window[1] is None:
+                raise ExpressionException("Expected a window as 30m, 4h "
+                                          "or 1d")
+            self._expect(")")
+            return _pct(name, window[0] * UNITS[window[1]]), False
+        if kind in ("word", "string"):
+            self._position -= 1
+            name = self._ticker()
+            return (lambda prices, past: prices.get(name)), False
+        raise ExpressionException(f"Unexpected {value!r}")
+
+    def _ticker(self) -> str:
+        """A name in quotes or several words, Acciona Energia"""
+        kind, value = self._next()
+        if kind == "string":
+            words = [value]
+        elif kind == "word":
+            words = [value]
+            while self._peek()[0] == "word":
+                words.append(self._next()[1])
+        else:
+            raise ExpressionException(f"Expected a name, not {value!r}")
+        name = normalize(" ".join(words))
+        self.tickers.add(name)
+        return name
+
+    @staticmethod
+    def _boolean(result):
+        function, boolean = result
+        if not boolean:
+            raise ExpressionException("and, or and not need comparisons")
+        return function
+
+    @staticmethod
+    def _number(result):
+        function, boolean = result
+        if boolean:
+            raise ExpressionException("A comparison is not a number")
+        return function
+
+
+def compile_expression(text: str) -> Expression:
+    """Parse an expression like `Santander > 4.2 and Bbva < 9` or
+    `pct(Iberdrola, 1d) < -3` (percentage from the price a day ago)"""
+    text = " ".join(text.split())
+    if not text:
+        raise ExpressionException("The expression is empty")
+    if len(text) > MAX_LENGTH:
+        raise ExpressionException(f"The expression is longer than "
+                                  f"{MAX_LENGTH} characters")
+    parser = _Parser(text)
+    evaluate = parser.parse()
+    return Expression(text, frozenset(parser.tickers), evaluate)
+
+
+class _State:
+    __slots__ = ("expression", "value", "cooling")
+
+    def __init__(self, expression: Expression, value: bool) -> None:
+        self.expression = expression
+        self.value = value
+        self.cooling = 0.0
+
+
+class ExpressionIndex:
+    """Alert expressions of every chat, by the tickers they depend on
+
+    On every tick only the expressions of the tickers whose price
+    changed are evaluated. An expression fires when it becomes true and
+    not again until it has been false and `cooldown` seconds passed.
+    """
+
+    def __init__(self, cooldown: float = COOLDOWN) -> None:
+        self._cooldown = cooldown
+        self._lock = Lock()
+        # (chat_id, text): _State
+        self._states = {}
+        # ticker: {(chat_id, text)}
+        self._dependents = {}
+
+    def add(self, chat_id: int, expression: Expression,
+            value: bool = False) -> None:
+        """Add the expression, value is its current result"""
+        key = (chat_id, expression.text)
+        with self._lock:
+            self._remove(key)
+            self._states[key] = _State(expression, value)
+            for ticker in expression.tickers:
+                self._dependents.setdefault(ticker, set()).add(key)
+
+    def remove(self, chat_id: int, text: str) -> bool:
+        with self._lock:
+            return self._remove((chat_id, text)) is not None
+
+    def _remove(self, key: tuple):
+        state = self._states.pop(key, None)
+        if state is not None:
+            for ticker in state.expression.tickers:
+                dependents = self._dependents[ticker]
+                dependents.discard(key)
+                if not dependents:
+                    del self._dependents[ticker]
+        return state
+
+    def get_expressions(self, chat_id: int) -> list:
+        with self._lock:
+            return sorted((state.expression for (chat, _), state
+                           in self._states.items() if chat == chat_id),
+                          key=lambda expression: expression.text)
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def update(self, prices, changed, past, now: float | None = None
+               ) -> list:
+        """(chat_id, expression) of the ones that became true
+
+        Parameters
+        ----------
+        prices : Current prices by name
+        changed : Names whose price changed since the last update
+        past : past(name, seconds), the price seconds ago or None
+        """
+        now = time.time() if now is None else now
+        fired = []
+        with self._lock:
+            keys = set()
+            for name in changed:
+                keys.update(self._dependents.get(name, ()))
+            for key in keys:
+                state = self._states[key]
+                try:
+                    value = bool(state.expression.evaluate(prices, past))
+                except Exception as exception:
+                    logger.error(f"{state.expression.text}: {exception}")
+                    continue
+                if value and not state.value and now >= state.cooling:
+                    state.cooling = now + self._cooldown
+                    fired.append((key[0], state.expression))
+                state.value = value
+        return fired
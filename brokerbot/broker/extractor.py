@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import logging
+import lxml.html
+from lxml import etree
+
+logger = logging.getLogger(__name__)
+
+
+def to_float(text: str) -> float:
+    """A number with decimal comma ("12,34") or with a unit ("12,34€")"""
+    return float(text.strip(" \xa0\n€%").replace(",", "."))
+
+
+class ExtractorException(Exception):
+    pass
+
+
+class Extractor:
+    """Gets the name and the value of every row of a table
+
+    The XPath expressions are compiled once, when the Extractor is
+    created, and the table is walked once per page.
+
+    Attributes
+    ----------
+    rows : XPath of the rows
+    name : XPath, relative to the row, of the name
+    value : XPath, relative to the row, of the value
+    """
+
+    def __init__(self, rows: str, name: str, value: str,
+                 convert=to_float) -> None:
+        self._rows = etree.XPath(rows)
+        self._name = etree.XPath(name)
+        self._value = etree.XPath(value)
+        self._convert = convert
+
+    def extract(self, content) -> dict:
+        """Name and value of every row of the page (bytes or str)"""
+        data = {}
+        root = lxml.html.fromstring(content)
+        for row in self._rows(root):
+            name = self._name(row)
+            if not name:
+                continue
+            try:
+                data[name.strip().title()] = self._convert(self._value(row))
+            except ValueError as exception:
+                raise ExtractorException(f"{name}: {exception}")
+        if not data:
+            raise ExtractorException("No rows found")
+        return data
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import hashlib
+import logging
+import requests
+from threading import Lock
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+TIMEOUT = 10
+USER_AGENT = ("Mozilla/5.0 (Macintosh; Intel Mac OS X 10_10_1) "
+              "AppleWebKit/537.36 (KHTML, like Gecko) "
+              "Chrome/39.0.2171.95 Safari/537.36")
+# requests decodes brotli only if the package is installed
+ACCEPT_ENCODING = "br, gzip, deflate" if brotli else "gzip, deflate"
+
+
+class FetcherException(Exception):
+    pass
+
+
+class Fetcher:
+    """Downloads a page only when it changed
+
+    Sends `If-None-Match` and `If-Modified-Since` with the validators of
+    the previous response and compares a hash of the body, so `get`
+    returns None when the page is the same as the last time.
+
+    Attributes
+    ----------
+    url : Url of the page
+    timeout : Seconds to wait for the response
+    """
+
+    def __init__(self, url: str, timeout: float = TIMEOUT,
+                 session: requests.Session | None = None) -> None:
+        logger.debug("__init__")
+        self._url = url
+        self._timeout = timeout
+        # the session can be shared, the headers go in every request
+        self._session = session if session else requests.Session()
+        self._lock = Lock()
+        self._etag = None
+        self._last_modified = None
+        self._digest = None
+        self._stats = {"requests": 0, "not_modified": 0, "unchanged": 0,
+                       "changed": 0, "bytes": 0}
+
+    def get(self) -> bytes | None:
+        """The body (bytes) of the page or None if it did not change"""
+        logger.debug("get")
+        headers = {"User-Agent": USER_AGENT,
+                   "Accept-Encoding": ACCEPT_ENCODING}
+        with self._lock:
+            if self._etag:
+                headers["If-None-Match"] = self._etag
+            if self._last_modified:
+                headers["If-Modified-Since"] = self._last_modified
+            self._stats["requests"] += 1
+        response = self._session.get(self._url, headers=headers,
+                                     timeout=self._timeout)
+        logger.debug(f"Response. Status code: {response.status_code}")
+        if response.status_code == 304:
+            with self._lock:
+                self._stats["not_modified"] += 1
+            return None
+        if response.status_code != 200:
+            msg = f"HTTP Error: {response.status_code}. {response.text}"
+            raise FetcherException(msg)
+        content = response.content
+        digest = hashlib.blake2b(content, digest_size=16).digest()
+        with self._lock:
+            self._etag = response.headers.get("ETag")
+            self._last_modified = response.headers.get("Last-Modified")
+            self._stats["bytes"] += len(content)
+            if digest == self._digest:
+                self._stats["unchanged"] += 1
+                return None
+            self._digest = digest
+            self._stats["changed"] += 1
+        return content
+
+    def reset(self) -> None:
+        """Forget the previous response"""
+        with self._lock:
+            self._etag = None
+            self._last_modified = None
+            self._digest = None
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
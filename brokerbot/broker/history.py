@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import logging
+import mmap
+import os
+import struct
+import time
+from bisect import bisect_left, bisect_right
+from threading import Lock
+from aggregator import normalize
+from rollup import Rollup, RollupException, TIERS
+
+logger = logging.getLogger(__name__)
+
+# 30 days of quotes every 5 minutes
+CAPACITY = 30 * 24 * 12
+MAGIC = b"QHS2"
+# magic, capacity, number of quotes ever appended, number of quotes evicted
+HEADER = struct.Struct("<4sIQQ")
+EXTENSION = ".bin"
+# seconds the quotes are kept, older ones are in the bars of Rollup
+RETENTION = 2 * 86400
+# a query returns at least this number of points if it can
+POINTS = 120
+
+
+class HistoryException(Exception):
+    pass
+
+
+class _Timestamps:
+    """The timestamps of a Series in order, for bisect"""
+
+    def __init__(self, series: "Series") -> None:
+        self._series = series
+
+    def __len__(self) -> int:
+        return len(self._series)
+
+    def __getitem__(self, index: int) -> float:
+        return self._series._timestamps[self._series._physical(index)]
+
+
+class Series:
+    """Ring buffer of (timestamp, price) of a ticker in a mmaped file
+
+    The file is a header and two columns of doubles, the timestamps and
+    the prices, so a quote is 16 bytes and nothing is copied to read it.
+    When the buffer is full the oldest quote is overwritten. Timestamps
+    must grow, so a range is found with a bisect. The evicted quotes are
+    left out until they are overwritten, also after a restart.
+    """
+
+    def __init__(self, filename: str, capacity: int = CAPACITY) -> None:
+        self._lock = Lock()
+        exists = os.path.exists(filename)
+        self._file = open(filename, "r+b" if exists else "w+b")
+        if exists:
+            header = self._file.read(HEADER.size)
+            if len(header) < HEADER.size:
+                self._file.close()
+                raise HistoryException(f"{filename} is truncated")
+            magic, capacity, self._count, self._evicted = HEADER.unpack(
+                    header)
+            if magic != MAGIC:
+                self._file.close()
+                raise HistoryException(f"{filename} is not a history file")
+            if os.fstat(self._file.fileno()).st_size < \
+                    HEADER.size + 16 * capacity:
+                self._file.close()
+                raise HistoryException(f"{filename} is truncated")
+        else:
+            self._count = 0
+            self._evicted = 0
+            self._file.write(HEADER.pack(MAGIC, capacity, 0, 0))
+            self._file.truncate(HEADER.size + 16 * capacity)
+        self._capacity = capacity
+        self._mmap = mmap.mmap(self._file.fileno(),
+                               HEADER.size + 16 * capacity)
+        size = 8 * capacity
+        view = memoryview(self._mmap)
+        self._timestamps = view[HEADER.size:HEADER.size + size].cast("d")
+        self._prices = view[HEADER.size + size:].cast("d")
+
+    def __len__(self) -> int:
+        return self._count - max(self._evicted,
+                                 self._count - self._capacity)
+
+    def _physical(self, index: int) -> int:
+        """Position in the file of the index-th oldest quote"""
+        return (self._count - len(self) + index) % self._capacity
+
+    def _write_header(self) -> None:
+        HEADER.pack_into(self._mmap, 0, MAGIC, self._capacity, self._count,
+                         self._evicted)
+
+    def append(self, timestamp: float, price: float) -> None:
+        with self._lock:
+            if len(self) and timestamp < self._timestamps[
+                    self._physical(len(self) - 1)]:
+                raise HistoryException(f"{timestamp} is older than the last")
+            position = self._count % self._capacity
+            self._timestamps[position] = timestamp
+            self._prices[position] = price
+            self._count += 1
+            self._write_header()
+
+    def last(self):
+        """The last (timestamp, price) or None"""
+        with self._lock:
+            if not len(self):
+                return None
+            position = self._physical(len(self) - 1)
+            return self._timestamps[position], self._prices[position]
+
+    def range(self, start: float, end: float) -> list:
+        """The (timestamp, price) between start and end, both included"""
+        with self._lock:
+            timestamps = _Timestamps(self)
+            first = bisect_left(timestamps, start)
+            last = bisect_right(timestamps, end)
+            return [(self._timestamps[position], self._prices[position])
+                    for position in map(self._physical,
+                                        range(first, last))]
+
+    def at(self, timestamp: float):
+        """The price at timestamp, the last one before it, or None"""
+        with self._lock:
+            index = bisect_right(_Timestamps(self), timestamp) - 1
+            if index < 0:
+                return None
+            return self._prices[self._physical(index)]
+
+    def first(self) -> float | None:
+        """Timestamp of the oldest quote"""
+        with self._lock:
+            return self._timestamps[self._physical(0)] if len(self) \
+                else None
+
+    def evict(self, before: float) -> int:
+        """Leave out the quotes older than before, returns how many"""
+        with self._lock:
+            count = bisect_left(_Timestamps(self), before)
+            if count:
+                self._evicted = self._count - len(self) + count
+                self._write_header()
+            return count
+
+    def flush(self) -> None:
+        with self._lock:
+            self._mmap.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._timestamps.release()
+            self._prices.release()
+            self._mmap.close()
+            self._file.close()
+
+
+class History:
+    """Quotes of every ticker, one Series (file) by ticker in directory
+
+    The quotes are rolled up in OHLC bars (see rollup.py) as they arrive
+    and compact, scheduled, evicts the quotes older than `retention` and
+    the cold bars. query picks the coarsest resolution for a range.
+    """
+
+    def __init__(self, directory: str, capacity: int = CAPACITY,
+                 retention: float = RETENTION,
+                 tiers: tuple = TIERS) -> None:
+        logger.debug("__init__")
+        os.makedirs(directory, exist_ok=True)
+        self._directory = directory
+        self._capacity = capacity
+        self._retention = retention
+        self._rollup = Rollup(directory, tiers)
+        self._lock = Lock()
+        self._series = {}
+        for filename in os.listdir(directory):
+            if filename.endswith(EXTENSION):
+                name = filename[:-len(EXTENSION)]
+                self._series[name] = Series(
+                        os.path.join(directory, filename), capacity)
+
+    def names(self) -> list:
+        with self._lock:
+            return sorted(self._series)
+
+    def get(self, name: str) -> Series | None:
+        with self._lock:
+            return self._series.get(normalize(name))
+
+    def add(self, data: dict, timestamp: float | None = None) -> None:
+        """Append the quotes (name and price) of the same moment"""
+        logger.debug("add")
+        if timestamp is None:
+            timestamp = time.time()
+        for name, price in data.items():
+            name = normalize(name)
+            self._get_or_create(name).append(timestamp, price)
+            try:
+                self._rollup.add(name, timestamp, price)
+            except RollupException as exception:
+                raise HistoryException(exception) from exception
+
+    def range(self, name: str, start: float, end: float) -> list:
+        series = self.get(name)
+        return series.range(start, end) if series else []
+
+    def query(self, name: str, start: float, end: float,
+              points: int = POINTS) -> tuple:
+        """(resolution, bars) of the ticker between start and end
+
+        The resolution is the coarsest one that gives `points` bars in
+        the range, or a coarser one if it has not got quotes old enough,
+        0 for the quotes themselves. The bars are (timestamp, open, high,
+        low, close).
+        """
+        name = normalize(name)
+        resolutions = [0] + self._rollup.get_resolutions()
+        wanted = (end - start) / points
+        first = max(index for index, resolution in enumerate(resolutions)
+                    if resolution <= wanted)
+        chosen = None
+        oldest = None
+        for resolution in resolutions[first:]:
+            since = self._first(name, resolution)
+            if since is None:
+                continue
+            if since <= start:
+                chosen = resolution
+                break
+            if oldest is None or since < oldest:
+                chosen, oldest = resolution, since
+        if chosen is None:
+            return 0, []
+        if chosen == 0:
+            return 0, [(timestamp, price, price, price, price)
+                       for timestamp, price in self.range(name, start, end)]
+        return chosen, self._rollup.range(name, chosen, start, end)
+
+    def at(self, name: str, timestamp: float) -> float | None:
+        """The price at timestamp, from the bars if it is evicted"""
+        name = normalize(name)
+        for resolution in [0] + self._rollup.get_resolutions():
+            since = self._first(name, resolution)
+            if since is not None and since <= timestamp:
+                if resolution == 0:
+                    return self.get(name).at(timestamp)
+                return self._rollup.at(name, resolution, timestamp)
+        return None
+
+    def _first(self, name: str, resolution: int) -> float | None:
+        if resolution:
+            return self._rollup.first(name, resolution)
+        series = self.get(name)
+        return series.first() if series else None
+
+    def compact(self, now: float | None = None) -> int:
+        """Evict the old quotes and bars, returns how many"""
+        logger.debug("compact")
+        now = time.time() if now is None else now
+        with self._lock:
+            series = list(self._series.values())
+        evicted = sum(item.evict(now - self._retention) for item in series)
+        return evicted + self._rollup.compact(now)
+
+    def flush(self) -> None:
+        logger.debug("flush")
+        with self._lock:
+            for series in self._series.values():
+                series.flush()
+        self._rollup.flush()
+
+    def close(self) -> None:
+        logger.debug("close")
+        with self._lock:
+            for series in self._series.values():
+                series.close()
+            self._series = {}
+        self._rollup.close()
+
+    def _get_or_create(self, name: str) -> Series:
+        with self._lock:
+            if name not in self._series:
+                filename = name.replace(os.sep, "_") + EXTENSION
+                self._series[name] = Series(
+                        os.path.join(self._directory, filename),
+                        self._capacity)
+            return self._series[name]
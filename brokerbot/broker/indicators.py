@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import math
+import re
+from collections import deque
+from dataclasses import dataclass
+from datetime import date
+from threading import Lock
+
+PERIOD = 20
+MIN_PERIOD = 2
+MAX_PERIOD = 200
+SMA = "sma"
+EMA = "ema"
+INDICATOR = re.compile(r"^(sma|ema)(\d+)$")
+
+
+class IndicatorException(Exception):
+    pass
+
+
+def parse_indicator(text: str) -> tuple:
+    """("ema", 20) from "ema20" """
+    match = INDICATOR.match(text.strip().lower())
+    if match is None:
+        raise IndicatorException(f"{text} is not sma<period> or ema<period>")
+    period = int(match.group(2))
+    if not MIN_PERIOD <= period <= MAX_PERIOD:
+        raise IndicatorException(
+                f"The period must be between {MIN_PERIOD} and {MAX_PERIOD}")
+    return match.group(1), period
+
+
+class SimpleMovingAverage:
+    """Mean of the last `period` prices, with a running sum"""
+
+    __slots__ = ("period", "_values", "_sum")
+
+    def __init__(self, period: int) -> None:
+        self.period = period
+        self._values = deque()
+        self._sum = 0.0
+
+    def update(self, value: float) -> None:
+        self._values.append(value)
+        self._sum += value
+        if len(self._values) > self.period:
+            self._sum -= self._values.popleft()
+
+    @property
+    def value(self) -> float | None:
+        if len(self._values) < self.period:
+            return None
+        return self._sum / self.period
+
+
+class ExponentialMovingAverage:
+    """EMA with alpha 2 / (period + 1), ready after `period` prices"""
+
+    __slots__ = ("period", "_alpha", "_value", "_count")
+
+    def __init__(self, period: int) -> None:
+        self.period = period
+        self._alpha = 2 / (period + 1)
+        self._value = None
+        self._count = 0
+
+    def update(self, value: float) -> None:
+        self._count += 1
+        if self._value is None:
+            self._value = value
+        else:
+            self._value += self._alpha * (value - self._value)
+
+    @property
+    def value(self) -> float | None:
+        return self._value if self._count >= self.period else None
+
+
+class Volatility:
+    """Standard deviation of the last `period` log returns"""
+
+    __slots__ = ("period", "_returns", "_sum", "_squares", "_last")
+
+    def __init__(self, period: int = PERIOD) -> None:
+        self.period = period
+        self._returns = deque()
+        self._sum = 0.0
+        self._squares = 0.0
+        self._last = None
+
+    def update(self, value: float) -> None:
+        if self._last and value > 0:
+            log_return = math.log(value / self._last)
+            self._returns.append(log_return)
+            self._sum += log_return
+            self._squares += log_return * log_return
+            if len(self._returns) > self.period:
+                old = self._returns.popleft()
+                self._sum -= old
+                self._squares -= old * old
+        self._last = value
+
+    @property
+    def value(self) -> float | None:
+        count = len(self._returns)
+        if count < self.period:
+            return None
+        mean = self._sum / count
+        return math.sqrt(max(self._squares / count - mean * mean, 0.0))
+
+
+class DailyRange:
+    """Open, high, low and close of the day"""
+
+    __slots__ = ("day", "open", "high", "low", "close")
+
+    def __init__(self) -> None:
+        self.day = None
+        self.open = self.high = self.low = self.close = None
+
+    def update(self, value: float, day: date) -> None:
+        if day != self.day:
+            self.day = day
+            self.open = self.high = self.low = value
+        else:
+            self.high = max(self.high, value)
+            self.low = min(self.low, value)
+        self.close = value
+
+
+class TickerIndicators:
+    """Indicators of a ticker, all of them updated in O(1) by price"""
+
+    def __init__(self) -> None:
+        self.volatility = Volatility()
+        self.daily = DailyRange()
+        self.averages = {(SMA, PERIOD): SimpleMovingAverage(PERIOD),
+                         (EMA, PERIOD): ExponentialMovingAverage(PERIOD)}
+
+    def get_average(self, kind: str, period: int):
+        """The average, created (and empty) the first time"""
+        if (kind, period) not in self.averages:
+            average = SimpleMovingAverage(period) if kind == SMA else \
+                ExponentialMovingAverage(period)
+            self.averages[(kind, period)] = average
+        return self.averages[(kind, period)]
+
+    def update(self, value: float, day: date) -> None:
+        self.volatility.update(value)
+        self.daily.update(value, day)
+        for average in self.averages.values():
+            average.update(value)
+
+    def get(self) -> dict:
+        values = {f"{kind}{period}": average.value
+                  for (kind, period), average in self.averages.items()}
+        values.update(volatility=self.volatility.value,
+                      open=self.daily.open, high=self.daily.high,
+                      low=self.daily.low, close=self.daily.close)
+        return values
+
+
+@dataclass(slots=True, frozen=True)
+class Crossing:
+    chat_id: int
+    name: str
+    indicator: str
+    price: float
+    value: float
+    upwards: bool
+
+
+class IndicatorEngine:
+    """Indicators of every ticker and the chats subscribed to crossings
+
+    A crossing happens when the price goes from one side of an average
+    (sma20, ema50...) to the other between two updates.
+    """
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._tickers = {}
+        # name -> (kind, period) -> set of chat ids
+        self._subscriptions = {}
+        # name -> (kind, period) -> side of the price (True above)
+        self._sides = {}
+
+    def _get_ticker(self, name: str) -> TickerIndicators:
+        if name not in self._tickers:
+            self._tickers[name] = TickerIndicators()
+        return self._tickers[name]
+
+    def subscribe(self, chat_id: int, name: str, indicator: str) -> None:
+        key = parse_indicator(indicator)
+        with self._lock:
+            self._get_ticker(name).get_average(*key)
+            self._subscriptions.setdefault(name, {}).setdefault(
+                    key, set()).add(chat_id)
+
+    def unsubscribe(self, chat_id: int, name: str, indicator: str) -> bool:
+        key = parse_indicator(indicator)
+        with self._lock:
+            chats = self._subscriptions.get(name, {}).get(key, set())
+            if chat_id not in chats:
+                return False
+            chats.discard(chat_id)
+            if not chats:
+                del self._subscriptions[name][key]
+                self._sides.get(name, {}).pop(key, None)
+                if not self._subscriptions[name]:
+                    del self._subscriptions[name]
+                    self._sides.pop(name, None)
+            return True
+
+    def get_subscriptions(self, chat_id: int) -> list:
+        """(name, indicator) of the crossings the chat is subscribed to"""
+        with self._lock:
+            return sorted((name, f"{kind}{period}")
+                          for name, keys in self._subscriptions.items()
+                          for (kind, period), chats in keys.items()
+                          if chat_id in chats)
+
+    def get(self, name: str) -> dict | None:
+        with self._lock:
+            ticker = self._tickers.get(name)
+            return ticker.get() if ticker else None
+
+    def load(self, name: str, prices: list, day: date) -> None:
+        """Add past prices of the day, without crossings"""
+        with self._lock:
+            ticker = self._get_ticker(name)
+            for price in prices:
+                ticker.update(price, day)
+
+    def update(self, data: dict, day: date) -> list:
+        """Add the prices of a check, returns the crossings"""
+        crossings = []
+        with self._lock:
+            for name, price in data.items():
+                ticker = self._get_ticker(name)
+                ticker.update(price, day)
+                subscriptions = self._subscriptions.get(name)
+                if not subscriptions:
+                    continue
+                sides = self._sides.setdefault(name, {})
+                for key, chats in subscriptions.items():
+                    value = ticker.averages[key].value
+                    if value is None or price == value:
+                        continue
+                    above = price > value
+                    if sides.get(key, above) != above:
+                        indicator = f"{key[0]}{key[1]}"
+                        crossings.extend(Crossing(chat_id, name, indicator,
+                                                  price, value, above)
+                                         for chat_id in chats)
+                    sides[key] = above
+        return crossings
@@ -21,12 +21,33 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import atexit
 import logging
 import os
 import sys
+# the sources of quotes register themselves in plugins
+import bolsarama  # noqa: F401
+import expansion  # noqa: F401
+from aggregator import (FASTEST, QuoteAggregator, TIMEOUT,
+                        WORKERS as SOURCE_WORKERS)
+from alerts import COOLDOWN, HYSTERESIS, WINDOW
 from bot import Bot
+from checkpoint import Checkpoint, FLUSH_EVERY, FLUSH_INTERVAL
+from dispatcher import WORKERS
 from dotenv import load_dotenv
-from monitor import Monitor
+from history import History, RETENTION
+from market import (AdaptiveInterval, MarketCalendar, MAX_INTERVAL,
+                    MIN_INTERVAL)
+from metrics import MetricsServer, REGISTRY
+from monitor import Monitor, TIME_LAPSE
+from plugins import DEFAULT_SOURCES, parse_sources
+from recorder import Recorder
+from scheduler import Scheduler
+from sendqueue import SendQueue
+from store import Store
+from telegram import (API_URL, AsyncTelegramClient, AsyncTelegramRunner,
+                      TelegramClient)
+from webhook import WebhookServer
 
 logging.basicConfig(
         stream=sys.stdout,
@@ -35,16 +56,121 @@ logging.basicConfig(
         )
 logger = logging.getLogger(__name__)
 
+CURDIR = os.path.realpath(os.path.dirname(__file__))
+# seconds between compactions of the history
+COMPACT_INTERVAL = 3600
+
+
+def compact_history(history: History) -> None:
+    """Compact the history from the scheduler
+
+    History.compact returns the number of evicted quotes and bars, that
+    the scheduler would take as the seconds to its next run.
+    """
+    evicted = history.compact()
+    logger.debug(f"Evicted {evicted} quotes and bars")
+
+
+def setup(config, scheduler: Scheduler, session=None) -> Bot:
+    """Build the bot from its configuration (the environment variables)
+
+    The periodic tasks go to `scheduler` and the requests to Telegram use
+    `session`, so that several bots can share them.
+    """
+    logger.debug("setup")
+    token = config.get("TOKEN", "")
+    api_url = config.get("TELEGRAM_API_URL", API_URL)
+    telegram_client = TelegramClient(token, api_url, session)
+    if config.get("ASYNC_SEND", "false").lower() == "true":
+        # the messages go out through aiohttp, many of them in flight
+        async_runner = AsyncTelegramRunner(
+                AsyncTelegramClient(token, api_url=api_url))
+        async_runner.start()
+        send_queue = SendQueue(async_runner)
+    else:
+        send_queue = SendQueue(telegram_client)
+    send_queue.start()
+    metrics_port = config.get("METRICS_PORT", "")
+    if metrics_port:
+        REGISTRY.gauge("telegram_send_queue_depth",
+                       "Messages waiting to be sent",
+                       lambda: send_queue.get_stats()["depth"])
+        metrics_host = config.get("METRICS_HOST", "127.0.0.1")
+        metrics_server = MetricsServer(metrics_host, int(metrics_port))
+        metrics_server.start()
+    quotes_timeout = float(config.get("QUOTES_TIMEOUT", TIMEOUT))
+    sources, intervals = parse_sources(
+            config.get("SOURCES", DEFAULT_SOURCES), quotes_timeout)
+    aggregator = QuoteAggregator(
+            sources, config.get("QUOTES_MODE", FASTEST), quotes_timeout,
+            intervals=intervals,
+            workers=int(config.get("SOURCE_WORKERS", SOURCE_WORKERS)))
+    record_file = config.get("RECORD_FILE", "")
+    if record_file:
+        # the quotes to replay them later with benchmark/backtest.py
+        aggregator = Recorder(aggregator, record_file)
+        atexit.register(aggregator.close)
+    state_dir = config.get("STATE_DIR", CURDIR)
+    history = History(config.get("HISTORY_DIR",
+                                 os.path.join(state_dir, "history")),
+                      retention=float(config.get("HISTORY_RETENTION",
+                                                 RETENTION)))
+    atexit.register(history.flush)
+    scheduler.every(COMPACT_INTERVAL, lambda: compact_history(history))
+    store = Store(config.get("DATABASE",
+                             os.path.join(state_dir, "brokerbot.db")))
+    calendar = None
+    interval = None
+    if config.get("MARKET_HOURS", "true").lower() == "true":
+        calendar = MarketCalendar()
+        interval = AdaptiveInterval(
+                float(config.get("MIN_INTERVAL", MIN_INTERVAL)),
+                float(config.get("MAX_INTERVAL", MAX_INTERVAL)))
+    window = float(config.get("ALERT_WINDOW", WINDOW))
+    monitor = Monitor(send_queue, aggregator, history, store, calendar,
+                      interval,
+                      hysteresis=float(config.get("ALERT_HYSTERESIS",
+                                                  HYSTERESIS)),
+                      cooldown=float(config.get("ALERT_COOLDOWN", COOLDOWN)),
+                      window=window)
+    scheduler.every(TIME_LAPSE, monitor.check)
+    if window > 0:
+        scheduler.every(window, monitor.flush_alerts, window)
+    flush_interval = float(config.get("FLUSH_INTERVAL", FLUSH_INTERVAL))
+    flush_every = int(config.get("FLUSH_EVERY", FLUSH_EVERY))
+    checkpoint = Checkpoint(state_dir, flush_interval, flush_every)
+    atexit.register(checkpoint.flush)
+    username = telegram_client.get_me()["result"]["username"]
+    workers = int(config.get("WORKERS", WORKERS))
+    return Bot(telegram_client, monitor, send_queue, checkpoint,
+               username=username, workers=workers)
+
+
+def serve(bot: Bot, config) -> None:
+    """Receive the updates from the webhook or with long polling"""
+    logger.debug("serve")
+    webhook_url = config.get("WEBHOOK_URL", "")
+    if webhook_url:
+        webhook_secret = config.get("WEBHOOK_SECRET", "")
+        webhook_port = int(config.get("WEBHOOK_PORT", 8080))
+        bot.set_webhook(webhook_url, webhook_secret)
+        webhook = WebhookServer(bot, webhook_url, port=webhook_port,
+                                secret_token=webhook_secret)
+        webhook.run()
+    else:
+        # getUpdates does not work while a webhook is set
+        bot.delete_webhook()
+        while True:
+            bot.get_updates()
+
 
 def main():
     load_dotenv()
-    token = os.getenv("TOKEN", "")
-    monitor = Monitor(token)
-    monitor.start()
-    bot = Bot(token, monitor)
+    scheduler = Scheduler()
+    bot = setup(os.environ, scheduler)
+    scheduler.start()
     logger.debug("main")
-    while True:
-        bot.get_updates()
+    serve(bot, os.environ)
 
 
 if __name__ == "__main__":
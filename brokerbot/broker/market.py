@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import logging
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+logger = logging.getLogger(__name__)
+
+TIMEZONE = "Europe/Madrid"
+# continuous session and closing auction of the Spanish market
+OPEN = time(9, 0)
+CLOSE = time(17, 40)
+EARLY_CLOSE = time(14, 5)
+MIN_INTERVAL = 60
+MAX_INTERVAL = 900
+# expected relative move of the prices between two checks
+TARGET_MOVE = 0.002
+SMOOTHING = 0.3
+
+
+def easter(year: int) -> date:
+    """Easter Sunday (anonymous Gregorian algorithm)"""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    j = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * j) // 451
+    month, day = divmod(h + j - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+class MarketCalendar:
+    """Trading days and hours of the Spanish stock market
+
+    Closed on weekends, January 1, Good Friday, Easter Monday, May 1 and
+    December 25 and 26. December 24 and 31 close early.
+    """
+
+    def __init__(self, timezone: str = TIMEZONE, opening: time = OPEN,
+                 closing: time = CLOSE,
+                 early_closing: time = EARLY_CLOSE) -> None:
+        self._timezone = ZoneInfo(timezone)
+        self._open = opening
+        self._close = closing
+        self._early_close = early_closing
+        self._holidays = {}
+
+    def _get_holidays(self, year: int) -> frozenset:
+        if year not in self._holidays:
+            sunday = easter(year)
+            self._holidays[year] = frozenset((
+                date(year, 1, 1), sunday - timedelta(days=2),
+                sunday + timedelta(days=1), date(year, 5, 1),
+                date(year, 12, 25), date(year, 12, 26)))
+        return self._holidays[year]
+
+    def is_trading_day(self, day: date) -> bool:
+        return day.weekday() < 5 and day not in self._get_holidays(day.year)
+
+    def get_hours(self, day: date) -> tuple:
+        """Opening and closing times of a trading day"""
+        close = self._early_close if (day.month, day.day) in \
+            ((12, 24), (12, 31)) else self._close
+        return (datetime.combine(day, self._open, self._timezone),
+                datetime.combine(day, close, self._timezone))
+
+    def now(self, timestamp: float | None = None) -> datetime:
+        if timestamp is None:
+            return datetime.now(self._timezone)
+        return datetime.fromtimestamp(timestamp, self._timezone)
+
+    def is_open(self, now: datetime | None = None) -> bool:
+        now = now.astimezone(self._timezone) if now else self.now()
+        if not self.is_trading_day(now.date()):
+            return False
+        opening, closing = self.get_hours(now.date())
+        return opening <= now < closing
+
+    def next_open(self, now: datetime | None = None) -> datetime:
+        """Now if the market is open, otherwise the next opening"""
+        now = now.astimezone(self._timezone) if now else self.now()
+        day = now.date()
+        while True:
+            if self.is_trading_day(day):
+                opening, closing = self.get_hours(day)
+                if now < closing:
+                    return max(opening, now)
+            day += timedelta(days=1)
+
+
+class AdaptiveInterval:
+    """Time between checks that follows the volatility
+
+    Keeps an exponential moving average of the relative moves of the
+    prices per second and waits the time in which the prices are
+    expected to move `target` (0.2 %), between min and max seconds.
+    """
+
+    def __init__(self, min_interval: float = MIN_INTERVAL,
+                 max_interval: float = MAX_INTERVAL,
+                 target: float = TARGET_MOVE,
+                 smoothing: float = SMOOTHING) -> None:
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._target = target
+        self._smoothing = smoothing
+        self._speed = None
+        self._previous = None
+
+    def update(self, data: dict, timestamp: float) -> float:
+        """Add the prices of a check, returns the seconds to the next"""
+        if self._previous is not None:
+            previous_data, previous_timestamp = self._previous
+            elapsed = timestamp - previous_timestamp
+            moves = [abs(price - previous_data[name]) / previous_data[name]
+                     for name, price in data.items()
+                     if previous_data.get(name)]
+            if moves and elapsed > 0:
+                speed = sum(moves) / len(moves) / elapsed
+                self._speed = speed if self._speed is None else \
+                    self._smoothing * speed + \
+                    (1 - self._smoothing) * self._speed
+        self._previous = (data, timestamp)
+        return self.get()
+
+    def get(self) -> float:
+        if not self._speed:
+            return self._max_interval if self._speed == 0 \
+                else self._min_interval
+        return min(self._max_interval,
+                   max(self._min_interval, self._target / self._speed))
+
+    def reset(self) -> None:
+        """Forget the last prices (the market closed)"""
+        self._previous = None
@@ -22,42 +22,135 @@
 # SOFTWARE.
 
 import logging
-from expansion import Expansion
-from telegram import TelegramClient
-from threading import Thread
-from time import sleep
+import math
+import time
+from datetime import datetime
+from aggregator import QuoteAggregator, normalize
+from alerts import (AlertCoalescer, COOLDOWN, HYSTERESIS, RuleStates,
+                    WINDOW)
+from expressions import (Expression, ExpressionException, ExpressionIndex,
+                         compile_expression)
+from history import History, HistoryException
+from indicators import IndicatorEngine
+from market import AdaptiveInterval, MarketCalendar
+from metrics import REGISTRY
+from rules import MAX, MIN, Rule, RuleIndex
+from sendqueue import SendQueue
+from snapshot import Snapshot
+from store import Store
+from threading import Lock
 
 logger = logging.getLogger(__name__)
 TIME_LAPSE = 300
+# daily variation (from the open) sent to the subscribers
+VARIATION = 0.03
+
+SCRAPE_SECONDS = REGISTRY.histogram("broker_scrape_seconds",
+                                    "Time to get the quotes")
+SCRAPE_ERRORS = REGISTRY.counter("broker_scrape_errors_total",
+                                 "Failed attempts to get the quotes")
+ALERTS = REGISTRY.counter("broker_alerts_total", "Alerts sent")
+HELD = REGISTRY.counter("broker_alerts_held_total",
+                        "Crossings of rules disarmed or in cooldown")
 
 
 class MonitorException(Exception):
     pass
 
 
-class Monitor(Thread):
-    def __init__(self, token: str) -> None:
+class Monitor:
+    """Checks the quotes and the alerts. Schedule check every TIME_LAPSE
+
+    With a MarketCalendar nothing is checked while the market is closed
+    and with an AdaptiveInterval the time between checks follows the
+    volatility. check returns the seconds to the next check. clock gives
+    the time of the checks, a virtual one to replay recorded quotes.
+
+    The rules re-arm with `hysteresis` and wait `cooldown` seconds
+    between alerts, and the alerts of a chat are sent together once per
+    `window` (see alerts.py), with flush_alerts scheduled. The alert
+    expressions are evaluated when the price of their tickers changes.
+    """
+
+    def __init__(self, send_queue: SendQueue, aggregator: QuoteAggregator,
+                 history: History | None = None,
+                 store: Store | None = None,
+                 calendar: MarketCalendar | None = None,
+                 interval: AdaptiveInterval | None = None,
+                 clock=time.time, hysteresis: float = HYSTERESIS,
+                 cooldown: float = COOLDOWN,
+                 window: float = WINDOW) -> None:
         logger.debug("__init__")
-        super().__init__()
-        self._daemon = True
-        self._telegram_client = TelegramClient(token)
-        self._expansion = Expansion()
-        self._initial_data = self._expansion.get()
-        self._current_data = self._initial_data
-        self._data = {}
-        self._increment = 100
-        self._decrement = 100
-        self._chat_id = None
-
-    def get_data(self):
-        return self._data.items()
-
-    def set_chat_id(self, chat_id):
-        logger.debug("set_chat_id")
-        self._chat_id = chat_id
-
-    def get_chat_id(self):
-        return self._chat_id
+        self._clock = clock
+        self._send_queue = send_queue
+        self._aggregator = aggregator
+        self._history = history
+        self._store = store
+        self._calendar = calendar
+        self._interval = interval
+        self._snapshot = Snapshot.build(1, self._aggregator.get(), clock())
+        self._rules = RuleIndex()
+        self._states = RuleStates(hysteresis, cooldown)
+        self._expressions = ExpressionIndex(cooldown)
+        self._coalescer = AlertCoalescer(send_queue, window)
+        self._indicators = IndicatorEngine()
+        self._increment = VARIATION
+        self._decrement = VARIATION
+        # (name, upwards) of the variations sent today
+        self._variations = set()
+        self._day = None
+        self._subscribers = frozenset()
+        self._lock = Lock()
+        if history is not None:
+            self._load_indicators()
+        if store is not None:
+            for rule in store.get_rules():
+                self._rules.set(rule.chat_id, rule.name, rule.kind,
+                                rule.threshold)
+            for chat_id, name, indicator in store.get_crossings():
+                self._indicators.subscribe(chat_id, name, indicator)
+            self._subscribers = frozenset(store.get_subscribers())
+            for chat_id, text in store.get_expressions():
+                try:
+                    expression = compile_expression(text)
+                except ExpressionException as exception:
+                    logger.error(f"Can not load {text}: {exception}")
+                    continue
+                self._expressions.add(chat_id, expression,
+                                      self._evaluate(expression))
+
+    def _load_indicators(self) -> None:
+        """The quotes of today in the history, for the daily open"""
+        now = self._clock()
+        moment = self._get_moment(now)
+        start = moment.replace(hour=0, minute=0, second=0,
+                               microsecond=0).timestamp()
+        for name in self._history.names():
+            prices = [price for _, price
+                      in self._history.range(name, start, now)]
+            if prices:
+                self._indicators.load(name, prices, moment.date())
+
+    def _get_moment(self, timestamp: float) -> datetime:
+        if self._calendar is not None:
+            return self._calendar.now(timestamp)
+        return datetime.fromtimestamp(timestamp)
+
+    def get_rules(self, chat_id: int) -> list:
+        return self._rules.get_rules(chat_id)
+
+    def subscribe(self, chat_id: int) -> None:
+        """Send the variations to the chat"""
+        logger.debug("subscribe")
+        with self._lock:
+            if chat_id in self._subscribers:
+                return
+            if self._store is not None:
+                self._store.add_subscriber(chat_id)
+            self._subscribers = self._subscribers | {chat_id}
+
+    def get_subscribers(self) -> frozenset:
+        return self._subscribers
 
     def set_increment(self, increment):
         logger.debug("set_increment")
@@ -66,31 +159,96 @@ class Monitor(Thread):
             raise MonitorException(msg)
         self._increment = increment
 
-    def set_max(self, name, value):
+    def set_max(self, chat_id: int, name: str, value: float) -> None:
         logger.debug("set_max")
-        if name not in self._current_data:
-            msg = f"{name} is not in Ibex 35"
-            raise MonitorException(msg)
-        if name in self._data:
-            self._data[name]["max"] = value
-            self._data[name]["maxw"] = False
-        else:
-            self._data[name] = {"max": value, "min": None, "maxw": False,
-                                "minw": False}
-        logger.debug(self._data)
-
-    def set_min(self, name, value):
+        self._set_rule(chat_id, name, MAX, value)
+
+    def set_min(self, chat_id: int, name: str, value: float) -> None:
         logger.debug("set_min")
-        if name not in self._current_data:
-            msg = f"{name} is not in Ibex 35"
+        self._set_rule(chat_id, name, MIN, value)
+
+    def _set_rule(self, chat_id: int, name: str, kind: str,
+                  value: float) -> None:
+        name = normalize(name)
+        if name not in self._snapshot.data:
+            msg = f"{name} is not in the quotes"
+            raise MonitorException(msg)
+        if not math.isfinite(value):
+            # NaN breaks the bisect of the rules
+            msg = f"{value} is not a valid value"
             raise MonitorException(msg)
-        if name in self._data:
-            self._data[name]["max"] = value
-            self._data[name]["maxw"] = False
-        else:
-            self._data[name] = {"max": value, "min": None, "maxw": False,
-                                "minw": False}
-        logger.debug(self._data)
+        if self._store is not None:
+            self._store.save_rule(Rule(chat_id, name, kind, value))
+        rule = self._rules.set(chat_id, name, kind, value)
+        self._states.discard(chat_id, name, kind)
+        self._states.hold(rule, self._snapshot.data[name])
+
+    def subscribe_crossing(self, chat_id: int, name: str,
+                           indicator: str) -> None:
+        """Send to the chat when the price crosses the indicator (ema20)"""
+        logger.debug("subscribe_crossing")
+        name = normalize(name)
+        if name not in self._snapshot.data:
+            msg = f"{name} is not in the quotes"
+            raise MonitorException(msg)
+        indicator = indicator.strip().lower()
+        self._indicators.subscribe(chat_id, name, indicator)
+        if self._store is not None:
+            self._store.save_crossing(chat_id, name, indicator)
+
+    def unsubscribe_crossing(self, chat_id: int, name: str,
+                             indicator: str) -> bool:
+        logger.debug("unsubscribe_crossing")
+        name = normalize(name)
+        indicator = indicator.strip().lower()
+        if self._store is not None:
+            self._store.delete_crossing(chat_id, name, indicator)
+        return self._indicators.unsubscribe(chat_id, name, indicator)
+
+    def get_crossings(self, chat_id: int) -> list:
+        return self._indicators.get_subscriptions(chat_id)
+
+    def get_indicators(self, name: str) -> dict | None:
+        return self._indicators.get(normalize(name))
+
+    def add_alert(self, chat_id: int, text: str) -> tuple:
+        """Alert when the expression becomes true
+
+        Returns the compiled Expression and whether it is true now.
+        """
+        logger.debug("add_alert")
+        try:
+            expression = compile_expression(text)
+        except ExpressionException as exception:
+            raise MonitorException(exception) from exception
+        for name in expression.tickers:
+            if name not in self._snapshot.data:
+                msg = f"{name} is not in the quotes"
+                raise MonitorException(msg)
+        value = self._evaluate(expression)
+        if self._store is not None:
+            self._store.save_expression(chat_id, expression.text)
+        self._expressions.add(chat_id, expression, value)
+        return expression, value
+
+    def remove_alert(self, chat_id: int, text: str) -> bool:
+        logger.debug("remove_alert")
+        if self._store is not None:
+            self._store.delete_expression(chat_id, text)
+        return self._expressions.remove(chat_id, text)
+
+    def get_alerts(self, chat_id: int) -> list:
+        return self._expressions.get_expressions(chat_id)
+
+    def _evaluate(self, expression: Expression) -> bool:
+        return bool(expression.evaluate(self._snapshot.data,
+                                        self._get_past))
+
+    def _get_past(self, name: str, seconds: float) -> float | None:
+        """Price of the ticker seconds ago, from the history"""
+        if self._history is None:
+            return None
+        return self._history.at(name, self._clock() - seconds)
 
     def set_decrement(self, decrement):
         logger.debug("set_decrement")
@@ -99,46 +257,97 @@ class Monitor(Thread):
             raise MonitorException(msg)
         self._decrement = decrement
 
-    def get_current_data(self):
-        logger.debug("get_current_data")
-        return self._current_data
-
-    def run(self):
-        logger.debug("run")
-        while True:
-            self.current_data = self._expansion.get()
-            if self._chat_id is not None:
-                logger.debug("== check ==")
-                logger.debug(self._current_data)
-                logger.debug(self._data)
-                variations = []
-                for name, current_value in self._current_data.items():
-                    initial_value = self._initial_data[name]
-                    variation = (current_value - initial_value)/initial_value
-                    if variation > 0 and variation > self._increment:
-                        # send message
-                        msg = f"El valor de {name} se incremento {variation}%"
-                        variations.append(msg)
-                    elif variation < 0 and abs(variation) > self._decrement:
-                        # send message
-                        msg = f"El valor de {name} se decrementó {variation}%"
-                        variations.append(msg)
-                    if name in self._data:
-                        if self._data[name]["min"] is not None and \
-                                self._data[name]["min"] > current_value and \
-                                self._data[name]["minw"] is False:
-                            msg = (f"El valor de {name} bajó por debajo de el "
-                                   "mínimo fijado")
-                            self._data[name]["minw"] = True
-                            variations.append(msg)
-                        if self._data[name]["max"] is not None and \
-                                self._data[name]["max"] < current_value and \
-                                self._data[name]["maxw"] is False:
-                            msg = f"El valor de {name} superó el máximo fijado"
-                            self._data[name]["maxw"] = True
-                            variations.append(msg)
-
-                if variations:
-                    msg = "\n".join(variations)
-                    self._telegram_client.send_message(msg, self._chat_id)
-            sleep(TIME_LAPSE)
+    def get_bars(self, name: str, seconds: float) -> list:
+        """(timestamp, open, high, low, close) of the last seconds, at the
+        coarsest resolution of the history for them"""
+        if self._history is None:
+            return []
+        now = self._clock()
+        return self._history.query(name, now - seconds, now)[1]
+
+    def flush_alerts(self, force: bool = False) -> float:
+        """Send the alerts held, returns the seconds to the next flush"""
+        return self._coalescer.flush(self._clock(), force)
+
+    def get_snapshot(self) -> Snapshot:
+        """The last quotes, a reference that is replaced, not modified"""
+        return self._snapshot
+
+    def check(self) -> float | None:
+        logger.debug("check")
+        if self._calendar is not None:
+            now = self._calendar.now(self._clock())
+            if not self._calendar.is_open(now):
+                if self._interval is not None:
+                    self._interval.reset()
+                return (self._calendar.next_open(now) - now).total_seconds()
+        try:
+            with SCRAPE_SECONDS.time():
+                data = self._aggregator.get()
+        except Exception as exception:
+            logger.error(f"Can not get the quotes: {exception}")
+            SCRAPE_ERRORS.inc()
+            return
+        now = self._clock()
+        previous = self._snapshot
+        self._snapshot = Snapshot.build(previous.version + 1, data, now)
+        if self._history is not None:
+            try:
+                self._history.add(data, now)
+            except HistoryException as exception:
+                # the alerts go on without the history
+                logger.error(f"Can not save the quotes: {exception}")
+        logger.debug("== check ==")
+        day = self._get_moment(now).date()
+        if day != self._day:
+            self._day = day
+            self._variations = set()
+        alerts = {}
+        for crossing in self._indicators.update(data, day):
+            direction = "arriba" if crossing.upwards else "abajo"
+            msg = (f"{crossing.name} cruzó hacia {direction} su "
+                   f"{crossing.indicator.upper()} ({crossing.value:.3f})")
+            alerts.setdefault(crossing.chat_id, []).append(msg)
+        variations = []
+        for name, current_value in data.items():
+            indicators = self._indicators.get(name)
+            opening = indicators["open"] if indicators else None
+            if opening:
+                variation = (current_value - opening) / opening
+                if variation > self._increment and \
+                        (name, True) not in self._variations:
+                    self._variations.add((name, True))
+                    msg = f"El valor de {name} se incrementó {variation:.2%}"
+                    variations.append(msg)
+                elif -variation > self._decrement and \
+                        (name, False) not in self._variations:
+                    self._variations.add((name, False))
+                    msg = f"El valor de {name} se decrementó {variation:.2%}"
+                    variations.append(msg)
+            previous_value = previous.data.get(name)
+            crossed = [] if previous_value is None else \
+                self._rules.crossed(name, previous_value, current_value)
+            fired = self._states.update(name, current_value, crossed, now)
+            HELD.inc(len([rule for rule in crossed if rule not in fired]))
+            for rule in fired:
+                if rule.kind == MAX:
+                    msg = f"El valor de {name} superó el máximo fijado"
+                else:
+                    msg = (f"El valor de {name} bajó por debajo de el "
+                           "mínimo fijado")
+                alerts.setdefault(rule.chat_id, []).append(msg)
+        changed = [name for name, value in data.items()
+                   if previous.data.get(name) != value]
+        for chat_id, expression in self._expressions.update(
+                data, changed, self._get_past, now):
+            msg = f"Se cumple la alerta {expression.text}"
+            alerts.setdefault(chat_id, []).append(msg)
+        if variations:
+            for chat_id in self._subscribers:
+                alerts.setdefault(chat_id, []).extend(variations)
+        for chat_id, messages in alerts.items():
+            ALERTS.inc(len(messages))
+            self._coalescer.add(chat_id, messages, now)
+        if self._interval is not None:
+            return self._interval.update(data, now)
+        return None
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import logging
+
+logger = logging.getLogger(__name__)
+
+# name and class of the sources of quotes
+PLUGINS = {}
+DEFAULT_SOURCES = "expansion,bolsarama"
+
+
+class PluginException(Exception):
+    pass
+
+
+def register(name: str):
+    """Class decorator that makes a source of quotes available by name
+
+    The class is built with `(timeout, url)`, url None for its default
+    page, and its `get` returns a dict of name and value.
+    """
+    def decorator(cls):
+        PLUGINS[name] = cls
+        return cls
+    return decorator
+
+
+def get_plugins() -> list:
+    return sorted(PLUGINS)
+
+
+def create(plugin: str, timeout: float, url: str | None = None):
+    if plugin not in PLUGINS:
+        raise PluginException(f"{plugin} is not a source, "
+                              f"use {', '.join(get_plugins())}")
+    return PLUGINS[plugin](timeout, url)
+
+
+def parse_sources(text: str, timeout: float) -> tuple:
+    """Sources and their intervals (seconds) from the configuration
+
+    Entries separated by commas, each one `name:plugin[:interval[:url]]`
+    or just `plugin`, for instance
+    `expansion,continuo:expansion:300:https://...`. Without an interval
+    the source is requested in every check.
+    """
+    sources = {}
+    intervals = {}
+    for entry in text.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        fields = entry.split(":", 3)
+        name = fields[0]
+        plugin = fields[1] if len(fields) > 1 else name
+        try:
+            interval = float(fields[2]) if len(fields) > 2 and fields[2] \
+                else 0.0
+        except ValueError:
+            raise PluginException(f"{entry}: {fields[2]} is not a valid "
+                                  "interval") from None
+        url = fields[3] if len(fields) > 3 else None
+        if name in sources:
+            raise PluginException(f"{name} is repeated")
+        sources[name] = create(plugin, timeout, url)
+        intervals[name] = interval
+    if not sources:
+        raise PluginException("There are no sources")
+    return sources, intervals
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import base64
+import gzip
+import json
+import logging
+import tempfile
+import time
+from threading import Lock
+from aggregator import normalize
+from history import History
+from monitor import Monitor
+from rules import MAX
+
+logger = logging.getLogger(__name__)
+
+# seconds the recorder writes in the same gzip member
+FLUSH_INTERVAL = 300
+
+
+class RecorderException(Exception):
+    pass
+
+
+def _encode(timestamp: float, data=None, page: bytes | None = None,
+            source: str = "") -> str:
+    record = {"t": timestamp}
+    if page is not None:
+        record["source"] = source
+        record["page"] = base64.b64encode(page).decode("ascii")
+    else:
+        record["data"] = data
+    return json.dumps(record, ensure_ascii=False) + "\n"
+
+
+def write_record(filename: str, timestamp: float, data=None,
+                 page: bytes | None = None, source: str = "") -> None:
+    """Append a record, the quotes or the page of a source, to the file
+
+    The record is a gzip member with a JSON line. The file is a sequence
+    of members, so it can be appended to after a restart.
+    """
+    with gzip.open(filename, "at", encoding="utf-8") as fw:
+        fw.write(_encode(timestamp, data, page, source))
+
+
+def read_records(filename: str, parsers: dict | None = None):
+    """Yield (timestamp, quotes) from a recorded file
+
+    The pages are parsed with the parser of their source, for instance
+    {"expansion": Expansion.process}. The names of the tickers are
+    normalized, as the aggregator does.
+    """
+    with gzip.open(filename, "rt", encoding="utf-8") as fr:
+        try:
+            for number, line in enumerate(fr, 1):
+                try:
+                    record = json.loads(line)
+                    if "page" in record:
+                        parser = (parsers or {})[record["source"]]
+                        page = base64.b64decode(record["page"])
+                        data = parser(page)
+                    else:
+                        data = record["data"]
+                    yield record["t"], {normalize(name): price
+                                        for name, price in data.items()}
+                except Exception as exception:
+                    msg = f"{filename}:{number} {exception!r}"
+                    raise RecorderException(msg) from exception
+        except EOFError:
+            # the last member is cut if the recorder was not closed
+            logger.error(f"{filename} is truncated")
+
+
+class Recorder:
+    """A source that records what other source gets
+
+    It wraps the source of the quotes (QuoteAggregator, Expansion) or of
+    the pages (Fetcher, that returns None if the page has not changed).
+    The file stays open and the records go to the same gzip member,
+    that is closed every `flush_interval` seconds, so a crash loses at
+    most the records of the last one.
+    """
+
+    def __init__(self, source, filename: str, name: str = "",
+                 clock=time.time,
+                 flush_interval: float = FLUSH_INTERVAL) -> None:
+        logger.debug("__init__")
+        self._source = source
+        self._filename = filename
+        self._name = name
+        self._clock = clock
+        self._flush_interval = flush_interval
+        self._lock = Lock()
+        self._file = None
+        self._opened = 0.0
+
+    def get(self):
+        result = self._source.get()
+        now = self._clock()
+        try:
+            if isinstance(result, bytes):
+                self._write(now, _encode(now, page=result,
+                                         source=self._name))
+            elif result is not None:
+                self._write(now, _encode(now, data=result))
+        except OSError as exception:
+            # recording never stops the bot
+            logger.error(f"Can not record in {self._filename}: {exception}")
+            self.close()
+        return result
+
+    def _write(self, now: float, line: str) -> None:
+        with self._lock:
+            if self._file is None:
+                self._file = gzip.open(self._filename, "at",
+                                       encoding="utf-8")
+                self._opened = now
+            self._file.write(line)
+            if now - self._opened >= self._flush_interval:
+                self._close()
+
+    def close(self) -> None:
+        """Close the gzip member, the next record starts a new one"""
+        logger.debug("close")
+        with self._lock:
+            self._close()
+
+    def _close(self) -> None:
+        if self._file is not None:
+            try:
+                self._file.close()
+            finally:
+                self._file = None
+
+
+class VirtualClock:
+    """The time of the records being replayed"""
+
+    def __init__(self, now: float = 0.0) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class ReplaySource:
+    """Returns the quotes of the record being replayed"""
+
+    def __init__(self, data: dict | None = None) -> None:
+        self.data = data
+
+    def get(self) -> dict:
+        return self.data
+
+
+class AlertCollector:
+    """Takes the place of the SendQueue and keeps the alerts"""
+
+    def __init__(self, clock) -> None:
+        self._clock = clock
+        self.alerts = []
+
+    def send_message(self, text: str, chat_id: int,
+                     thread_id: int = 0) -> None:
+        for line in text.split("\n"):
+            self.alerts.append((self._clock(), chat_id, line))
+
+
+def replay(records, rules=(), crossings=(), subscribers=(),
+           calendar=None, expressions=()) -> dict:
+    """Run the records through the alerts of Monitor at full speed
+
+    Parameters
+    ----------
+    records : (timestamp, quotes) in time order, as read_records yields
+    rules : (chat_id, name, kind, threshold), kind is max or min
+    crossings : (chat_id, name, indicator), as ema20
+    subscribers : chats that get the daily variations
+    calendar : MarketCalendar, to skip the records out of market hours
+    expressions : (chat_id, text), as Bbva > 9 and Sab < 2
+
+    Returns
+    -------
+    ticks, skipped, seconds (wall time), ticks_per_second and the alerts,
+    a list of (timestamp, chat_id, text)
+
+    The replayed quotes are kept in a History in a temporary directory,
+    for the past prices of the expressions.
+    """
+    records = iter(records)
+    try:
+        timestamp, data = next(records)
+    except StopIteration:
+        raise RecorderException("There are no records") from None
+    with tempfile.TemporaryDirectory() as directory:
+        history = History(directory)
+        try:
+            history.add(data, timestamp)
+            return _replay(records, history, timestamp, data, rules,
+                           crossings, subscribers, calendar, expressions)
+        finally:
+            history.close()
+
+
+def _replay(records, history: History, timestamp: float, data: dict,
+            rules, crossings, subscribers, calendar, expressions) -> dict:
+    clock = VirtualClock(timestamp)
+    source = ReplaySource(data)
+    collector = AlertCollector(clock)
+    monitor = Monitor(collector, source, history, calendar=calendar,
+                      clock=clock)
+    for chat_id, name, kind, threshold in rules:
+        if kind == MAX:
+            monitor.set_max(chat_id, name, threshold)
+        else:
+            monitor.set_min(chat_id, name, threshold)
+    for chat_id, name, indicator in crossings:
+        monitor.subscribe_crossing(chat_id, name, indicator)
+    for chat_id in subscribers:
+        monitor.subscribe(chat_id)
+    for chat_id, text in expressions:
+        monitor.add_alert(chat_id, text)
+    ticks = 0
+    skipped = 0
+    start = time.perf_counter()
+    for timestamp, data in records:
+        if timestamp < clock.now:
+            skipped += 1
+            continue
+        clock.now = timestamp
+        source.data = data
+        version = monitor.get_snapshot().version
+        monitor.check()
+        monitor.flush_alerts()
+        if monitor.get_snapshot().version == version:
+            skipped += 1
+        else:
+            ticks += 1
+    monitor.flush_alerts(force=True)
+    seconds = time.perf_counter() - start
+    return {"ticks": ticks,
+            "skipped": skipped,
+            "seconds": seconds,
+            "ticks_per_second": ticks / seconds if seconds else 0.0,
+            "alerts": collector.alerts}
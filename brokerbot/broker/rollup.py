@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import logging
+import mmap
+import os
+import struct
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+MINUTE = 60
+HOUR = 3600
+DAY = 86400
+# resolution, seconds its bars are kept in the ring and whether they are
+# archived when they leave it (the minutes are in the hours anyway)
+TIERS = ((MINUTE, 7 * DAY, False),
+         (HOUR, 180 * DAY, True),
+         (DAY, 3 * 365 * DAY, True))
+MAGIC = b"QHB1"
+# magic, capacity, number of bars ever appended, number of bars evicted
+HEADER = struct.Struct("<4sIQQ")
+# timestamp (start of the bar), open, high, low and close
+COLUMNS = 5
+ARCHIVE_MAGIC = b"QHA1"
+# magic, rows and first and last timestamp of a chunk of the archive
+CHUNK = struct.Struct("<4sIdd")
+LENGTH = struct.Struct("<I")
+BARS_EXTENSION = ".bars"
+ARCHIVE_EXTENSION = ".archive"
+
+
+class RollupException(Exception):
+    pass
+
+
+class _Starts:
+    """The timestamps of the bars in order, for bisect"""
+
+    def __init__(self, bars: "Bars") -> None:
+        self._bars = bars
+
+    def __len__(self) -> int:
+        return len(self._bars)
+
+    def __getitem__(self, index: int) -> float:
+        return self._bars._columns[0][self._bars._physical(index)]
+
+
+class Bars:
+    """Ring buffer of OHLC bars of a ticker in a mmaped file
+
+    Like Series, with a column for the start of the bar and the open,
+    high, low and close. A price updates the last bar if it is in the
+    same `resolution` seconds, otherwise it starts a new one, so the bars
+    are built as the quotes arrive. The evicted bars are not read again.
+    """
+
+    def __init__(self, filename: str, resolution: int,
+                 capacity: int) -> None:
+        self._lock = Lock()
+        self._resolution = resolution
+        exists = os.path.exists(filename)
+        self._file = open(filename, "r+b" if exists else "w+b")
+        if exists:
+            header = self._file.read(HEADER.size)
+            if len(header) < HEADER.size:
+                self._file.close()
+                raise RollupException(f"{filename} is truncated")
+            magic, capacity, self._count, self._evicted = HEADER.unpack(
+                    header)
+            if magic != MAGIC:
+                self._file.close()
+                raise RollupException(f"{filename} is not a bars file")
+            if os.fstat(self._file.fileno()).st_size < \
+                    HEADER.size + 8 * COLUMNS * capacity:
+                self._file.close()
+                raise RollupException(f"{filename} is truncated")
+        else:
+            self._count = 0
+            self._evicted = 0
+            self._file.write(HEADER.pack(MAGIC, capacity, 0, 0))
+            self._file.truncate(HEADER.size + 8 * COLUMNS * capacity)
+        self._capacity = capacity
+        self._mmap = mmap.mmap(self._file.fileno(),
+                               HEADER.size + 8 * COLUMNS * capacity)
+        view = memoryview(self._mmap)
+        size = 8 * capacity
+        self._columns = [view[HEADER.size + size * column:
+                              HEADER.size + size * (column + 1)].cast("d")
+                         for column in range(COLUMNS)]
+
+    def __len__(self) -> int:
+        return self._count - max(self._evicted,
+                                 self._count - self._capacity)
+
+    def _physical(self, index: int) -> int:
+        return (self._count - len(self) + index) % self._capacity
+
+    def _get(self, position: int) -> tuple:
+        return tuple(column[position] for column in self._columns)
+
+    def _write_header(self) -> None:
+        HEADER.pack_into(self._mmap, 0, MAGIC, self._capacity, self._count,
+                         self._evicted)
+
+    def add(self, timestamp: float, price: float) -> None:
+        start = timestamp - timestamp % self._resolution
+        with self._lock:
+            if len(self):
+                position = self._physical(len(self) - 1)
+                last = self._columns[0][position]
+                if start < last:
+                    raise RollupException(
+                            f"{timestamp} is older than the last bar")
+                if start == last:
+                    high, low, close = self._columns[2:]
+                    high[position] = max(high[position], price)
+                    low[position] = min(low[position], price)
+                    close[position] = price
+                    return
+            position = self._count % self._capacity
+            self._columns[0][position] = start
+            for column in self._columns[1:]:
+                column[position] = price
+            self._count += 1
+            self._write_header()
+
+    def first(self) -> float | None:
+        """Start of the oldest bar"""
+        with self._lock:
+            return self._columns[0][self._physical(0)] if len(self) \
+                else None
+
+    def range(self, start: float, end: float) -> list:
+        """The bars that start between start and end, both included"""
+        with self._lock:
+            starts = _Starts(self)
+            first = bisect_left(starts, start - start % self._resolution)
+            last = bisect_right(starts, end)
+            return [self._get(self._physical(index))
+                    for index in range(first, last)]
+
+    def at(self, timestamp: float) -> float | None:
+        """Close of the bar of timestamp, or of the last one before it"""
+        with self._lock:
+            index = bisect_right(_Starts(self), timestamp) - 1
+            if index < 0:
+                return None
+            return self._columns[4][self._physical(index)]
+
+    def cold(self, before: float) -> list:
+        """The bars that end before `before`"""
+        with self._lock:
+            count = bisect_right(_Starts(self), before - self._resolution)
+            return [self._get(self._physical(index))
+                    for index in range(count)]
+
+    def evict(self, before: float) -> int:
+        """Remove the bars that end before `before`, returns how many"""
+        with self._lock:
+            count = bisect_right(_Starts(self), before - self._resolution)
+            if count:
+                self._evicted = self._count - len(self) + count
+                self._write_header()
+            return count
+
+    def flush(self) -> None:
+        with self._lock:
+            self._mmap.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            for column in self._columns:
+                column.release()
+            self._mmap.close()
+            self._file.close()
+
+
+class Archive:
+    """Cold bars in a compressed columnar file
+
+    The file is a sequence of chunks, one by compaction, each one with
+    its number of rows and time range and then every column compressed
+    with zlib. Only the chunks in the requested range are decompressed.
+    """
+
+    def __init__(self, filename: str) -> None:
+        self._filename = filename
+        self._lock = Lock()
+
+    def append(self, bars: list) -> None:
+        if not bars:
+            return
+        with self._lock, open(self._filename, "ab") as fw:
+            fw.write(CHUNK.pack(ARCHIVE_MAGIC, len(bars), bars[0][0],
+                                bars[-1][0]))
+            for column in zip(*bars):
+                data = zlib.compress(array("d", column).tobytes())
+                fw.write(LENGTH.pack(len(data)))
+                fw.write(data)
+
+    def _chunks(self, start: float, end: float, decompress: bool = True):
+        """Yield the first and last timestamp and the columns (if
+        decompress) of the chunks that overlap start and end"""
+        if not os.path.exists(self._filename):
+            return
+        with open(self._filename, "rb") as fr:
+            while header := fr.read(CHUNK.size):
+                if len(header) < CHUNK.size:
+                    logger.error(f"{self._filename} is truncated")
+                    return
+                magic, rows, first, last = CHUNK.unpack(header)
+                if magic != ARCHIVE_MAGIC:
+                    raise RollupException(
+                            f"{self._filename} is not an archive")
+                wanted = first <= end and last >= start
+                columns = []
+                for _ in range(COLUMNS):
+                    size, = LENGTH.unpack(fr.read(LENGTH.size))
+                    if not wanted or not decompress:
+                        fr.seek(size, os.SEEK_CUR)
+                        continue
+                    column = array("d")
+                    column.frombytes(zlib.decompress(fr.read(size)))
+                    columns.append(column)
+                if wanted:
+                    yield first, last, columns
+
+    def range(self, start: float, end: float) -> list:
+        with self._lock:
+            result = []
+            for _, _, columns in self._chunks(start, end):
+                for bar in zip(*columns):
+                    # a crash in compact can archive the same bars twice
+                    if start <= bar[0] <= end and \
+                            (not result or bar[0] > result[-1][0]):
+                        result.append(bar)
+            return result
+
+    def at(self, timestamp: float) -> float | None:
+        """Close of the archived bar of timestamp, or of the last one
+        before it"""
+        with self._lock:
+            firsts = [first for first, _, _ in self._chunks(
+                float("-inf"), timestamp, decompress=False)]
+            if not firsts:
+                return None
+            # only the chunks from the last one that starts before it
+            close = None
+            for _, _, columns in self._chunks(max(firsts), timestamp):
+                for start, price in zip(columns[0], columns[4]):
+                    if start <= timestamp:
+                        close = price
+            return close
+
+    def first(self) -> float | None:
+        with self._lock:
+            if not os.path.exists(self._filename):
+                return None
+            with open(self._filename, "rb") as fr:
+                header = fr.read(CHUNK.size)
+            if len(header) < CHUNK.size:
+                return None
+            return CHUNK.unpack(header)[2]
+
+
+class Rollup:
+    """OHLC bars of every ticker at the resolutions of `tiers`
+
+    The bars are updated with every quote and compact, that runs in the
+    background, evicts the ones older than the retention of their tier,
+    archiving them if the tier says so.
+    """
+
+    def __init__(self, directory: str, tiers: tuple = TIERS) -> None:
+        logger.debug("__init__")
+        os.makedirs(directory, exist_ok=True)
+        self._directory = directory
+        self._tiers = tiers
+        self._lock = Lock()
+        self._bars = {}
+        self._archives = {}
+        resolutions = self.get_resolutions()
+        for filename in os.listdir(directory):
+            if not filename.endswith(BARS_EXTENSION):
+                continue
+            name, _, resolution = filename[:-len(BARS_EXTENSION)] \
+                .rpartition(".")
+            if resolution.isdigit() and int(resolution) in resolutions:
+                self._get_or_create(name, int(resolution))
+
+    def get_resolutions(self) -> list:
+        return [resolution for resolution, _, _ in self._tiers]
+
+    def add(self, name: str, timestamp: float, price: float) -> None:
+        for resolution in self.get_resolutions():
+            self._get_or_create(name, resolution).add(timestamp, price)
+
+    def compact(self, now: float) -> int:
+        """Evict (and archive) the cold bars, returns how many"""
+        logger.debug("compact")
+        evicted = 0
+        for resolution, retention, archived in self._tiers:
+            with self._lock:
+                items = [(name, bars) for (name, tier), bars
+                         in self._bars.items() if tier == resolution]
+            for name, bars in items:
+                # archived before they are evicted, a crash in between
+                # repeats bars in the archive, skipped by Archive.range
+                if archived:
+                    self._get_archive(name, resolution).append(
+                            bars.cold(now - retention))
+                evicted += bars.evict(now - retention)
+        return evicted
+
+    def range(self, name: str, resolution: int, start: float,
+              end: float) -> list:
+        """The bars of the resolution, from the archive and the ring"""
+        bars = self._get(name, resolution)
+        if bars is None:
+            return []
+        first = bars.first()
+        result = []
+        if first is None or start < first:
+            archive = self._get_archive(name, resolution)
+            result = [bar for bar in archive.range(
+                start, end if first is None else min(end, first))
+                if first is None or bar[0] < first]
+        return result + bars.range(start, end)
+
+    def first(self, name: str, resolution: int) -> float | None:
+        """Start of the oldest bar of the resolution"""
+        bars = self._get(name, resolution)
+        if bars is None:
+            return None
+        archived = self._get_archive(name, resolution).first()
+        return archived if archived is not None else bars.first()
+
+    def at(self, name: str, resolution: int,
+           timestamp: float) -> float | None:
+        """Close of the bar of timestamp, from the archive if it is
+        evicted"""
+        bars = self._get(name, resolution)
+        if bars is None:
+            return None
+        price = bars.at(timestamp)
+        if price is None:
+            price = self._get_archive(name, resolution).at(timestamp)
+        return price
+
+    def flush(self) -> None:
+        with self._lock:
+            for bars in self._bars.values():
+                bars.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            for bars in self._bars.values():
+                bars.close()
+            self._bars = {}
+
+    def _get(self, name: str, resolution: int) -> Bars | None:
+        with self._lock:
+            return self._bars.get((name, resolution))
+
+    def _get_or_create(self, name: str, resolution: int) -> Bars:
+        with self._lock:
+            if (name, resolution) not in self._bars:
+                retention = {tier: seconds for tier, seconds, _
+                             in self._tiers}[resolution]
+                filename = f"{name.replace(os.sep, '_')}.{resolution}"
+                # a day more, compact has to run before it is overwritten
+                self._bars[(name, resolution)] = Bars(
+                        os.path.join(self._directory,
+                                     filename + BARS_EXTENSION),
+                        resolution, (retention + DAY) // resolution + 1)
+            return self._bars[(name, resolution)]
+
+    def _get_archive(self, name: str, resolution: int) -> Archive:
+        with self._lock:
+            if (name, resolution) not in self._archives:
+                filename = f"{name.replace(os.sep, '_')}.{resolution}"
+                self._archives[(name, resolution)] = Archive(
+                        os.path.join(self._directory,
+                                     filename + ARCHIVE_EXTENSION))
+            return self._archives[(name, resolution)]
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import logging
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+MAX = "max"
+MIN = "min"
+
+
+class RuleException(Exception):
+    pass
+
+
+@dataclass(slots=True, frozen=True)
+class Rule:
+    chat_id: int
+    name: str
+    kind: str
+    threshold: float
+
+
+class _Thresholds:
+    """Rules of a ticker and a kind sorted by threshold"""
+
+    __slots__ = ("thresholds", "rules")
+
+    def __init__(self) -> None:
+        self.thresholds = []
+        self.rules = []
+
+    def add(self, rule: Rule) -> None:
+        index = bisect_right(self.thresholds, rule.threshold)
+        self.thresholds.insert(index, rule.threshold)
+        self.rules.insert(index, rule)
+
+    def remove(self, rule: Rule) -> None:
+        first = bisect_left(self.thresholds, rule.threshold)
+        last = bisect_right(self.thresholds, rule.threshold)
+        for index in range(first, last):
+            if self.rules[index] == rule:
+                del self.thresholds[index]
+                del self.rules[index]
+                return
+        raise RuleException(f"{rule} is not in the index")
+
+
+class RuleIndex:
+    """Alert rules of every chat, by ticker and sorted by threshold
+
+    A max rule triggers when the price goes above its threshold and a min
+    rule when it goes below, so the rules triggered by a new price are
+    the ones between the previous and the new price, found with a
+    bisect in O(log n + k).
+    """
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._index = {MAX: {}, MIN: {}}
+        self._rules = {}
+
+    def set(self, chat_id: int, name: str, kind: str,
+            threshold: float) -> Rule:
+        """Add the rule, replacing the one of the chat for name and kind"""
+        if kind not in self._index:
+            raise RuleException(f"{kind} is not a valid kind of rule")
+        rule = Rule(chat_id, name, kind, threshold)
+        with self._lock:
+            self._remove((chat_id, name, kind))
+            self._rules[(chat_id, name, kind)] = rule
+            self._index[kind].setdefault(name, _Thresholds()).add(rule)
+        return rule
+
+    def remove(self, chat_id: int, name: str, kind: str) -> Rule | None:
+        with self._lock:
+            return self._remove((chat_id, name, kind))
+
+    def _remove(self, key: tuple) -> Rule | None:
+        rule = self._rules.pop(key, None)
+        if rule is not None:
+            thresholds = self._index[rule.kind][rule.name]
+            thresholds.remove(rule)
+            if not thresholds.rules:
+                del self._index[rule.kind][rule.name]
+        return rule
+
+    def get_rules(self, chat_id: int | None = None) -> list:
+        """The rules of the chat, or all of them, by name and kind"""
+        with self._lock:
+            return sorted((rule for rule in self._rules.values()
+                           if chat_id is None or rule.chat_id == chat_id),
+                          key=lambda rule: (rule.name, rule.kind))
+
+    def __len__(self) -> int:
+        return len(self._rules)
+
+    def crossed(self, name: str, previous: float, current: float) -> list:
+        """The rules crossed when the price went from previous to current"""
+        with self._lock:
+            if current > previous:
+                thresholds = self._index[MAX].get(name)
+                if thresholds is None:
+                    return []
+                # previous <= threshold < current
+                first = bisect_left(thresholds.thresholds, previous)
+                last = bisect_left(thresholds.thresholds, current)
+            elif current < previous:
+                thresholds = self._index[MIN].get(name)
+                if thresholds is None:
+                    return []
+                # current < threshold <= previous
+                first = bisect_right(thresholds.thresholds, current)
+                last = bisect_right(thresholds.thresholds, previous)
+            else:
+                return []
+            return thresholds.rules[first:last]
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import time
+from dataclasses import dataclass, field
+from types import MappingProxyType
+
+# quotes older than this are shown with their age
+STALE_AFTER = 900
+
+
+@dataclass(slots=True, frozen=True)
+class Snapshot:
+    """Quotes of a check, never modified once published
+
+    Monitor publishes a new Snapshot replacing the reference, so the bot
+    threads read a consistent version without locks. The /list text is
+    rendered once per version.
+    """
+    version: int
+    data: MappingProxyType
+    timestamp: float = field(default_factory=time.time)
+    text: str = ""
+
+    @classmethod
+    def build(cls, version: int, data: dict,
+              timestamp: float | None = None) -> "Snapshot":
+        text = "\n".join([f"{name}: {value}"
+                          for name, value in data.items()])
+        return cls(version, MappingProxyType(dict(data)),
+                   time.time() if timestamp is None else timestamp, text)
+
+    def get_age(self, now: float | None = None) -> float:
+        """Seconds since the quotes were got"""
+        return (time.time() if now is None else now) - self.timestamp
+
+    def is_stale(self, max_age: float = STALE_AFTER,
+                 now: float | None = None) -> bool:
+        return self.get_age(now) > max_age
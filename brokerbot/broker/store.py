@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import logging
+import sqlite3
+from threading import Lock
+from rules import Rule
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS rules(
+        chat_id INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        threshold REAL NOT NULL,
+        PRIMARY KEY (chat_id, name, kind)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS rules_name ON rules(name, kind, threshold);
+    CREATE TABLE IF NOT EXISTS subscribers(
+        chat_id INTEGER PRIMARY KEY
+    );
+    CREATE TABLE IF NOT EXISTS crossings(
+        chat_id INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        indicator TEXT NOT NULL,
+        PRIMARY KEY (chat_id, name, indicator)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS expressions(
+        chat_id INTEGER NOT NULL,
+        text TEXT NOT NULL,
+        PRIMARY KEY (chat_id, text)
+    ) WITHOUT ROWID;
+"""
+
+
+class StoreException(Exception):
+    pass
+
+
+class Store:
+    """Alert rules, subscribers, crossings and alert expressions of
+    brokerbot in SQLite
+
+    The database is in WAL mode, every change is written when it is made
+    and everything is read once, at startup, to build the RuleIndex.
+    """
+
+    def __init__(self, db: str) -> None:
+        logger.debug("__init__")
+        self._lock = Lock()
+        try:
+            self._connection = sqlite3.connect(db, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.executescript(SCHEMA)
+        except sqlite3.Error as exception:
+            raise StoreException(exception)
+
+    def _execute(self, sql: str, data: tuple = ()) -> list:
+        with self._lock:
+            try:
+                with self._connection:
+                    return self._connection.execute(sql, data).fetchall()
+            except sqlite3.Error as exception:
+                logger.error(exception)
+                raise StoreException(exception)
+
+    def save_rule(self, rule: Rule) -> None:
+        logger.debug("save_rule")
+        self._execute("INSERT OR REPLACE INTO rules (chat_id, name, kind,"
+                      " threshold) VALUES (?, ?, ?, ?)",
+                      (rule.chat_id, rule.name, rule.kind, rule.threshold))
+
+    def delete_rule(self, chat_id: int, name: str, kind: str) -> None:
+        logger.debug("delete_rule")
+        self._execute("DELETE FROM rules WHERE chat_id = ? AND name = ? AND"
+                      " kind = ?", (chat_id, name, kind))
+
+    def get_rules(self) -> list:
+        logger.debug("get_rules")
+        return [Rule(*row) for row in self._execute(
+            "SELECT chat_id, name, kind, threshold FROM rules")]
+
+    def add_subscriber(self, chat_id: int) -> None:
+        logger.debug("add_subscriber")
+        self._execute("INSERT OR IGNORE INTO subscribers (chat_id) VALUES"
+                      " (?)", (chat_id,))
+
+    def get_subscribers(self) -> list:
+        logger.debug("get_subscribers")
+        return [row[0] for row in self._execute(
+            "SELECT chat_id FROM subscribers")]
+
+    def save_crossing(self, chat_id: int, name: str, indicator: str) -> None:
+        logger.debug("save_crossing")
+        self._execute("INSERT OR IGNORE INTO crossings (chat_id, name,"
+                      " indicator) VALUES (?, ?, ?)",
+                      (chat_id, name, indicator))
+
+    def delete_crossing(self, chat_id: int, name: str,
+                        indicator: str) -> None:
+        logger.debug("delete_crossing")
+        self._execute("DELETE FROM crossings WHERE chat_id = ? AND name = ?"
+                      " AND indicator = ?", (chat_id, name, indicator))
+
+    def get_crossings(self) -> list:
+        """(chat_id, name, indicator) of every crossing subscription"""
+        logger.debug("get_crossings")
+        return [tuple(row) for row in self._execute(
+            "SELECT chat_id, name, indicator FROM crossings")]
+
+    def save_expression(self, chat_id: int, text: str) -> None:
+        logger.debug("save_expression")
+        self._execute("INSERT OR IGNORE INTO expressions (chat_id, text)"
+                      " VALUES (?, ?)", (chat_id, text))
+
+    def delete_expression(self, chat_id: int, text: str) -> None:
+        logger.debug("delete_expression")
+        self._execute("DELETE FROM expressions WHERE chat_id = ? AND"
+                      " text = ?", (chat_id, text))
+
+    def get_expressions(self) -> list:
+        """(chat_id, text) of every alert expression"""
+        logger.debug("get_expressions")
+        return [tuple(row) for row in self._execute(
+            "SELECT chat_id, text FROM expressions")]
+
+    def close(self) -> None:
+        logger.debug("close")
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import json
+import logging
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+MAX_BODY = 1024 * 1024
+
+
+class WebhookServer(Thread):
+    """Receive the updates that Telegram POSTs to the webhook
+
+    Every update is handed to `bot._process_response` as soon as it
+    arrives, as if it came from getUpdates.
+    """
+
+    def __init__(self, bot, url: str, host: str = "0.0.0.0",
+                 port: int = 8080, secret_token: str = "") -> None:
+        logger.debug("__init__")
+        super().__init__()
+        self.daemon = True
+        self._bot = bot
+        self._path = urlparse(url).path or "/"
+        self._secret_token = secret_token
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def _handler(self):
+        webhook = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                status = webhook.process(self.path, self.headers,
+                                         self.rfile)
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        return Handler
+
+    def process(self, path, headers, rfile) -> HTTPStatus:
+        logger.debug("process")
+        if path != self._path:
+            return HTTPStatus.NOT_FOUND
+        if self._secret_token and \
+                headers.get(SECRET_HEADER) != self._secret_token:
+            return HTTPStatus.FORBIDDEN
+        length = int(headers.get("Content-Length", 0))
+        if length <= 0 or length > MAX_BODY:
+            return HTTPStatus.BAD_REQUEST
+        try:
+            update = json.loads(rfile.read(length))
+        except ValueError:
+            return HTTPStatus.BAD_REQUEST
+        # the bot already answers the errors to the chat, so Telegram only
+        # needs to know that the update was received
+        try:
+            self._bot._process_response({"ok": True, "result": [update]})
+        except Exception as exception:
+            logger.error(f"Webhook: {exception}")
+        return HTTPStatus.OK
+
+    def run(self):
+        logger.debug("run")
+        self._server.serve_forever()
+
+    def stop(self) -> None:
+        logger.debug("stop")
+        self._server.shutdown()
+        self._server.server_close()
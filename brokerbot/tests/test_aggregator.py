@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import time
+import pytest
+from broker.aggregator import (AggregatorException, CONSENSUS, FASTEST,
+                               QuoteAggregator, normalize)
+
+
+class Source:
+    def __init__(self, data, delay=0.0, error=None):
+        self._data = data
+        self._delay = delay
+        self._error = error
+        self.calls = 0
+
+    def get(self):
+        self.calls += 1
+        time.sleep(self._delay)
+        if self._error:
+            raise self._error
+        return self._data
+
+
+class TestAggregator:
+    def test_normalize(self):
+        assert normalize("ACCIONA  ENERGÍA") == "Acciona Energia"
+        assert normalize("Acciona Energia") == "Acciona Energia"
+        assert normalize("B.B.V.A.") == "Bbva"
+
+    def test_fastest(self):
+        aggregator = QuoteAggregator({
+            "slow": Source({"Bbva": 1.0}, delay=0.5),
+            "fast": Source({"Bbva": 2.0})}, FASTEST, timeout=2)
+        start = time.monotonic()
+        assert aggregator.get() == {"Bbva": 2.0}
+        assert time.monotonic() - start < 0.4
+        aggregator.close()
+
+    def test_fastest_error(self):
+        aggregator = QuoteAggregator({
+            "down": Source({}, error=ValueError("down")),
+            "up": Source({"Bbva": 2.0}, delay=0.1)}, FASTEST, timeout=2)
+        assert aggregator.get() == {"Bbva": 2.0}
+        stats = aggregator.get_stats()
+        assert stats["down"]["errors"] == 1
+        assert stats["up"]["ok"] == 1
+        aggregator.close()
+
+    def test_consensus(self):
+        aggregator = QuoteAggregator({
+            "a": Source({"Bbva": 1.0, "Grifols": 10.0}),
+            "b": Source({"BBVA": 1.0, "Iberdrola": 5.0}),
+            "c": Source({"Bbva": 4.0})}, CONSENSUS, timeout=2)
+        assert aggregator.get() == {"Bbva": 1.0, "Grifols": 10.0,
+                                    "Iberdrola": 5.0}
+        assert aggregator.get_stats()["disagreements"] == 1
+        aggregator.close()
+
+    def test_timeout(self):
+        aggregator = QuoteAggregator({
+            "slow": Source({"Bbva": 1.0}, delay=0.5)}, CONSENSUS,
+            timeout=0.1)
+        start = time.monotonic()
+        with pytest.raises(AggregatorException):
+            aggregator.get()
+        assert time.monotonic() - start < 0.4
+        assert aggregator.get_stats()["slow"]["timeouts"] == 1
+        # still busy with the first request
+        with pytest.raises(AggregatorException):
+            aggregator.get()
+        assert aggregator.get_stats()["slow"]["skipped"] == 1
+        aggregator.close()
+
+    def test_intervals(self):
+        ibex = Source({"Bbva": 1.0})
+        continuo = Source({"Ezentis": 0.1})
+        aggregator = QuoteAggregator({"ibex": ibex, "continuo": continuo},
+                                     CONSENSUS, timeout=2,
+                                     intervals={"continuo": 300},
+                                     workers=1)
+        assert aggregator.get() == {"Bbva": 1.0, "Ezentis": 0.1}
+        continuo._error = ValueError("down")
+        # not requested again, its last quotes are used
+        assert aggregator.get() == {"Bbva": 1.0, "Ezentis": 0.1}
+        assert (ibex.calls, continuo.calls) == (2, 1)
+        aggregator.close()
+
+    def test_max_age(self):
+        source = Source({"Bbva": 1.0})
+        aggregator = QuoteAggregator({"a": source}, FASTEST, timeout=2,
+                                     max_age=0)
+        aggregator.get()
+        source._error = ValueError("down")
+        with pytest.raises(AggregatorException):
+            aggregator.get()
+        aggregator.close()
+
+    def test_mode(self):
+        with pytest.raises(AggregatorException):
+            QuoteAggregator({}, "slowest")
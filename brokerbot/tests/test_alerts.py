@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+from broker.alerts import AlertCoalescer, MAX_LENGTH, RuleStates
+from broker.rules import MAX, MIN, Rule
+
+
+class SendQueue:
+    def __init__(self):
+        self.messages = []
+
+    def send_message(self, text, chat_id, thread_id=0):
+        self.messages.append((chat_id, text))
+
+
+class TestRuleStates:
+    def test_hysteresis(self):
+        rule = Rule(1, "Bbva", MAX, 10.0)
+        states = RuleStates(hysteresis=0.01, cooldown=0)
+        assert states.update("Bbva", 10.1, [rule], 0) == [rule]
+        # oscillates around the threshold without re-arming
+        assert states.update("Bbva", 9.95, [], 1) == []
+        assert states.update("Bbva", 10.1, [rule], 2) == []
+        # goes back beyond the band, 9.9
+        assert states.update("Bbva", 9.8, [], 3) == []
+        assert states.update("Bbva", 10.1, [rule], 4) == [rule]
+
+    def test_cooldown(self):
+        rule = Rule(1, "Bbva", MIN, 10.0)
+        states = RuleStates(hysteresis=0, cooldown=60)
+        assert states.update("Bbva", 9.9, [rule], 0) == [rule]
+        assert states.update("Bbva", 10.5, [], 10) == []
+        # crossed during the cooldown, held until it ends
+        assert states.update("Bbva", 9.9, [rule], 20) == []
+        assert states.update("Bbva", 9.8, [], 40) == []
+        assert states.update("Bbva", 9.8, [], 60) == [rule]
+
+    def test_held_dropped(self):
+        rule = Rule(1, "Bbva", MAX, 10.0)
+        states = RuleStates(hysteresis=0, cooldown=60)
+        states.update("Bbva", 10.1, [rule], 0)
+        states.update("Bbva", 9.0, [], 10)
+        states.update("Bbva", 10.1, [rule], 20)
+        # back below the threshold when the cooldown ends
+        assert states.update("Bbva", 9.5, [], 70) == []
+
+    def test_discard(self):
+        rule = Rule(1, "Bbva", MAX, 10.0)
+        states = RuleStates(hysteresis=0.01, cooldown=60)
+        states.update("Bbva", 10.1, [rule], 0)
+        states.discard(1, "Bbva", MAX)
+        assert states.update("Bbva", 10.2, [rule], 10) == [rule]
+
+    def test_hold(self):
+        rule = Rule(1, "Bbva", MAX, 10.0)
+        states = RuleStates(hysteresis=0.01, cooldown=60)
+        # added when the price is already above the maximum
+        states.hold(rule, 10.5)
+        assert states.update("Bbva", 10.6, [], 0) == [rule]
+        states.hold(Rule(1, "Bbva", MIN, 10.0), 10.5)
+        assert states.update("Bbva", 10.6, [], 10) == []
+
+
+class TestAlertCoalescer:
+    def test_window(self):
+        send_queue = SendQueue()
+        coalescer = AlertCoalescer(send_queue, window=60)
+        coalescer.add(1, ["a"], 0)
+        coalescer.add(1, ["b"], 10)
+        coalescer.add(1, ["c", "d"], 20)
+        coalescer.add(2, ["e"], 20)
+        assert send_queue.messages == [(1, "a"), (2, "e")]
+        assert coalescer.flush(30) == 30
+        assert coalescer.flush(60) == 60
+        assert send_queue.messages[2:] == [(1, "b\nc\nd")]
+        # a new window starts with the flush
+        coalescer.add(1, ["f"], 100)
+        assert coalescer.flush(100, force=True) == 60
+        assert send_queue.messages[3:] == [(1, "f")]
+
+    def test_length(self):
+        send_queue = SendQueue()
+        coalescer = AlertCoalescer(send_queue, window=0)
+        coalescer.add(1, ["x" * 3000, "y" * 3000], 0)
+        assert [len(text) for _, text in send_queue.messages] == \
+            [3000, 3000]
+        assert all(len(text) <= MAX_LENGTH
+                   for _, text in send_queue.messages)
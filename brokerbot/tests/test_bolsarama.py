@@ -21,8 +21,12 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import os
 from broker.bolsarama import Bolsarama
 
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures",
+                       "bolsarama.html")
+
 
 class TestBolsarama:
     @classmethod
@@ -35,3 +39,10 @@ class TestBolsarama:
         print(data)
         assert data is not None
         assert len(data) == 35
+
+    def test_process(self):
+        with open(FIXTURE, "rb") as fr:
+            data = Bolsarama.process(fr.read())
+        assert len(data) == 35
+        assert data["Acciona"] == 137.53
+        assert "Acciona Energía" in data
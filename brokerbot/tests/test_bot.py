@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import time
+import pytest
+from broker.bot import Bot
+from broker.checkpoint import Checkpoint
+from broker.monitor import Monitor
+from broker.snapshot import Snapshot
+
+
+def update(update_id, chat_id, text="/list"):
+    return {"update_id": update_id,
+            "message": {"chat": {"id": chat_id}, "text": text}}
+
+
+class FakeTelegramClient:
+    def __init__(self, batches=()):
+        self.batches = list(batches)
+        self.offsets = []
+        self.next_id = 1
+
+    def get_updates(self, offset, timeout):
+        self.offsets.append(offset)
+        result = self.batches.pop(0) if self.batches else []
+        return {"ok": True, "result": result}
+
+    def add(self, chat_id, *texts):
+        """A batch with the texts sent to the chat"""
+        self.batches.append([update(update_id, chat_id, text)
+                             for update_id, text in enumerate(texts,
+                                                              self.next_id)])
+        self.next_id += len(texts)
+
+
+class FakeSendQueue:
+    def __init__(self, slow_chats=(), delay=0.0):
+        self.slow_chats = slow_chats
+        self.delay = delay
+        self.messages = []
+
+    def send_message(self, text, chat_id, thread_id=0):
+        if chat_id in self.slow_chats:
+            time.sleep(self.delay)
+        self.messages.append((chat_id, text, time.monotonic()))
+
+    def wait(self, count, timeout=5):
+        start = time.monotonic()
+        while len(self.messages) < count:
+            assert time.monotonic() - start < timeout
+            time.sleep(0.01)
+
+
+class FakeAggregator:
+    def get(self):
+        return {"Bbva": 7.0, "Sab": 2.1}
+
+
+class FakeMonitor:
+    def __init__(self):
+        self.snapshot = Snapshot.build(1, {"Bbva": 7.0}, time.time())
+        self.rules = []
+
+    def set_max(self, chat_id, name, value):
+        self.rules.append((chat_id, name, "max", value))
+
+    def get_subscribers(self):
+        return frozenset({1})
+
+    def get_snapshot(self):
+        return self.snapshot
+
+
+class TestBot:
+    def test_slow_chat(self, tmp_path):
+        telegram_client = FakeTelegramClient([[update(1, 10)],
+                                              [update(2, 11)]])
+        send_queue = FakeSendQueue(slow_chats=(10,), delay=1)
+        bot = Bot(telegram_client, FakeMonitor(), send_queue,
+                  Checkpoint(str(tmp_path)))
+        start = time.monotonic()
+        for _ in range(3):
+            bot.get_updates()
+        send_queue.wait(2)
+        # the other chat does not wait for the slow handler
+        assert [chat_id for chat_id, _, _ in send_queue.messages] == \
+            [11, 10]
+        assert send_queue.messages[0][2] - start < 0.5
+        assert telegram_client.offsets == [0, 2, 3]
+
+    def test_max_not_finite(self, tmp_path):
+        telegram_client = FakeTelegramClient([[update(1, 10, "/max Bbva,nan"),
+                                               update(2, 10, "/max Bbva,inf"),
+                                               update(3, 10, "/max Bbva,8")]])
+        send_queue = FakeSendQueue()
+        monitor = FakeMonitor()
+        bot = Bot(telegram_client, monitor, send_queue,
+                  Checkpoint(str(tmp_path)))
+        bot.get_updates()
+        send_queue.wait(3)
+        assert [text for _, text, _ in send_queue.messages] == [
+            "nan is not a valid value", "inf is not a valid value",
+            "Configured max value for Bbva (8.0)"]
+        assert monitor.rules == [(10, "Bbva", "max", 8.0)]
+
+
+    def test_duplicated(self, tmp_path):
+        telegram_client = FakeTelegramClient([[update(1, 10)],
+                                              [update(1, 10), update(2, 11)]])
+        send_queue = FakeSendQueue()
+        bot = Bot(telegram_client, FakeMonitor(), send_queue,
+                  Checkpoint(str(tmp_path)))
+        bot.get_updates()
+        send_queue.wait(1)
+        bot.get_updates()
+        send_queue.wait(2)
+        time.sleep(0.1)
+        # the update sent again is not answered twice
+        assert [chat_id for chat_id, _, _ in send_queue.messages] == [10, 11]
+        assert telegram_client.offsets == [0, 2]
+
+    def test_restart(self, tmp_path):
+        telegram_client = FakeTelegramClient([[update(1, 10),
+                                               update(2, 11)]])
+        send_queue = FakeSendQueue(slow_chats=(10,), delay=1)
+        checkpoint = Checkpoint(str(tmp_path))
+        bot = Bot(telegram_client, FakeMonitor(), send_queue, checkpoint)
+        bot.get_updates()
+        send_queue.wait(1)
+        # the bot stops while the update 1 is running
+        checkpoint.flush()
+        checkpoint = Checkpoint(str(tmp_path))
+        assert checkpoint.offset == 1
+        telegram_client = FakeTelegramClient([[update(1, 10),
+                                               update(2, 11)]])
+        restarted = FakeSendQueue()
+        bot = Bot(telegram_client, FakeMonitor(), restarted, checkpoint)
+        bot.get_updates()
+        restarted.wait(1)
+        time.sleep(0.1)
+        # only the one that was not finished is processed again
+        assert [chat_id for chat_id, _, _ in restarted.messages] == [10]
+        assert telegram_client.offsets == [1]
+        send_queue.wait(2)
+
+    def test_stop(self, tmp_path):
+        telegram_client = FakeTelegramClient([[update(1, 10)]])
+        send_queue = FakeSendQueue(slow_chats=(10,), delay=0.2)
+        bot = Bot(telegram_client, FakeMonitor(), send_queue,
+                  Checkpoint(str(tmp_path), flush_every=100))
+        bot.get_updates()
+        # waits for the handler and saves the checkpoint
+        bot.stop()
+        assert len(send_queue.messages) == 1
+        assert Checkpoint(str(tmp_path)).offset == 2
+
+class TestCommands:
+    """The replies of the handlers, with a Monitor on fake quotes"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path):
+        self.telegram_client = FakeTelegramClient()
+        self.send_queue = FakeSendQueue()
+        self.monitor = Monitor(self.send_queue, FakeAggregator(), window=0)
+        self.bot = Bot(self.telegram_client, self.monitor, self.send_queue,
+                       Checkpoint(str(tmp_path)), username="brokerbot")
+
+    def chat(self, *texts, replies=None):
+        """The replies to the texts sent to the chat 10"""
+        sent = len(self.send_queue.messages)
+        self.telegram_client.add(10, *texts)
+        self.bot.get_updates()
+        self.send_queue.wait(sent + (len(texts) if replies is None
+                                     else replies))
+        return [text for _, text, _ in self.send_queue.messages[sent:]]
+
+    def test_get(self):
+        assert self.chat("/get bbva", "/get Grifols", "/get") == [
+            "Valor para Bbva: 7.0",
+            "Error: no encontrado este valor para Grifols",
+            "Error: tienes que proporcionar un nombre"]
+
+    def test_list(self):
+        assert self.chat("/list") == [self.monitor.get_snapshot().text]
+
+    def test_rules(self):
+        assert self.chat("/configuration", "/max Bbva,8", "/min Bbva",
+                         "/min Bbva,abc", "/min Grifols,1",
+                         "/min Bbva,6.5", "/configuration") == [
+            "There is no max and min values or alerts configurated",
+            "Configured max value for Bbva (8.0)",
+            "Name and value are mandatories. Set as 'name,value'",
+            "abc is not a valid value",
+            "Grifols is not in the quotes",
+            "Configured min value for Bbva (6.5)",
+            "Bbva 👉 Max: 8.0, Min: 6.5"]
+
+    def test_alerts(self):
+        assert self.chat("/alert", "/alert Bbva > 6", "/alert Sab < 2",
+                         "/alert Bbva >", "/unalert 3",
+                         "/configuration", "/unalert 1",
+                         "/configuration") == [
+            "The expression is mandatory (/alert Bbva > 9)",
+            "Configured alert Bbva > 6 (ya se cumple)",
+            "Configured alert Sab < 2",
+            "Unexpected end of the expression",
+            "The number of the alert is mandatory, see /configuration",
+            "1. Bbva > 6\n2. Sab < 2",
+            "Removed alert Bbva > 6",
+            "1. Sab < 2"]
+
+    def test_crossings(self):
+        assert self.chat("/cross Bbva,ema20", "/cross Bbva,xyz",
+                         "/uncross Bbva,sma20", "/uncross Bbva,EMA20") == [
+            "Configured crossing of ema20 for Bbva",
+            "xyz is not sma<period> or ema<period>",
+            "There is no crossing of sma20 for Bbva",
+            "Removed crossing of EMA20 for Bbva"]
+
+    def test_not_a_command(self):
+        replies = self.chat("/help", "/foo")
+        assert replies[0].startswith("/help 👉 show this help")
+        assert replies[1] == "The command /foo is not implemented"
+        # the commands for other bots and the texts are not answered
+        assert self.chat("/list@otherbot", "Hola", "/get@BrokerBot bbva",
+                         replies=1) == ["Valor para Bbva: 7.0"]
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import struct
+import zlib
+import pytest
+from broker.chart import (ChartCache, ChartException, merge_bars,
+                          parse_window, render_candles, render_line)
+
+
+def read_png(data):
+    assert data[:8] == b"\x89PNG\r\n\x1a\n"
+    position = 8
+    chunks = {}
+    while position < len(data):
+        length, = struct.unpack(">I", data[position:position + 4])
+        kind = data[position + 4:position + 8]
+        content = data[position + 8:position + 8 + length]
+        crc, = struct.unpack(">I", data[position + 8 + length:
+                                        position + 12 + length])
+        assert crc == zlib.crc32(kind + content)
+        chunks[kind] = chunks.get(kind, b"") + content
+        position += 12 + length
+    return chunks
+
+
+class TestChart:
+    def test_line(self):
+        chunks = read_png(render_line([1, 3, 2, 5], width=40, height=20))
+        width, height = struct.unpack(">II", chunks[b"IHDR"][:8])
+        assert (width, height) == (40, 20)
+        assert len(zlib.decompress(chunks[b"IDAT"])) == 20 * (1 + 3 * 40)
+        assert b"IEND" in chunks
+
+    def test_candles(self):
+        bars = [(index, index, index + 2, index - 1, index + 1)
+                for index in range(10)]
+        candles = merge_bars(bars, count=5)
+        assert candles[0] == (0, 3, -1, 2)
+        assert len(candles) == 5
+        assert read_png(render_candles(candles))[b"IHDR"]
+
+    def test_empty(self):
+        with pytest.raises(ChartException):
+            render_line([])
+
+    def test_window(self):
+        assert parse_window("6h") == 6 * 3600
+        assert parse_window("5D") == 5 * 86400
+        with pytest.raises(ChartException):
+            parse_window("1y")
+        with pytest.raises(ChartException):
+            parse_window("90d")
+
+    def test_cache(self):
+        renders = []
+
+        def render():
+            renders.append(1)
+            return b"png"
+
+        cache = ChartCache(size=2)
+        assert cache.get(("Bbva", 1, 1), render) == b"png"
+        assert cache.get(("Bbva", 1, 1), render) == b"png"
+        assert len(renders) == 1
+        cache.get(("Bbva", 1, 2), render)
+        cache.get(("Bbva", 1, 1), render)
+        cache.get(("Bbva", 1, 3), render)
+        assert len(cache) == 2
+        cache.get(("Bbva", 1, 1), render)
+        assert len(renders) == 3
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import json
+import os
+from broker.checkpoint import CHECKPOINT, Checkpoint
+
+
+class TestCheckpoint:
+    def test_old_config(self, tmp_path):
+        with open(os.path.join(tmp_path, CHECKPOINT), "w") as fw:
+            json.dump({"offset": 10}, fw)
+        checkpoint = Checkpoint(tmp_path)
+        assert checkpoint.offset == 10
+
+    def test_corrupted_config(self, tmp_path):
+        with open(os.path.join(tmp_path, CHECKPOINT), "w") as fw:
+            fw.write('{"offset": 1')
+        checkpoint = Checkpoint(tmp_path)
+        assert checkpoint.offset == 0
+
+    def test_batched_flush(self, tmp_path):
+        checkpoint = Checkpoint(tmp_path, flush_interval=3600, flush_every=3)
+        for update_id in range(2):
+            assert not checkpoint.seen(update_id)
+            checkpoint.done(update_id)
+            checkpoint.advance(update_id + 1)
+        assert not os.path.exists(os.path.join(tmp_path, CHECKPOINT))
+        assert not checkpoint.seen(2)
+        checkpoint.advance(3)
+        checkpoint.done(2)
+        with open(os.path.join(tmp_path, CHECKPOINT), "r") as fr:
+            config = json.load(fr)
+        assert config["offset"] == 3
+        assert config["seen"] == [0, 1, 2]
+
+    def test_replay_after_crash(self, tmp_path):
+        checkpoint = Checkpoint(tmp_path, flush_interval=3600,
+                                flush_every=100)
+        for update_id in range(5):
+            checkpoint.seen(update_id)
+            checkpoint.done(update_id)
+            checkpoint.advance(update_id + 1)
+        # no flush: the bot crashes here
+        recovered = Checkpoint(tmp_path)
+        # Telegram sends them again and they are discarded
+        assert recovered.offset == 0
+        assert recovered.seen(3)
+        assert not recovered.seen(5)
+
+    def test_running_not_passed(self, tmp_path):
+        checkpoint = Checkpoint(tmp_path, flush_interval=3600, flush_every=2)
+        for update_id in range(3):
+            checkpoint.seen(update_id)
+        checkpoint.advance(3)
+        assert checkpoint.seen(1)
+        checkpoint.done(0)
+        checkpoint.done(2)
+        # polls past it, but the checkpoint keeps it
+        assert checkpoint.offset == 3
+        with open(os.path.join(tmp_path, CHECKPOINT), "r") as fr:
+            assert json.load(fr)["offset"] == 1
+        # the bot crashes while the update 1 is running
+        recovered = Checkpoint(tmp_path)
+        assert recovered.offset == 1
+        assert not recovered.seen(1)
+        assert recovered.seen(2)
+        checkpoint.done(1)
+        assert checkpoint.offset == 3
+
+    def test_seen_is_bounded(self, tmp_path):
+        checkpoint = Checkpoint(tmp_path, seen_size=2)
+        for update_id in range(3):
+            checkpoint.seen(update_id)
+            checkpoint.done(update_id)
+        assert not checkpoint.seen(0)
+        assert checkpoint.seen(2)
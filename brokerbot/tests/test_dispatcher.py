@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import time
+from threading import Lock
+from broker.dispatcher import Dispatcher
+
+
+def update(update_id, chat_id):
+    return {"update_id": update_id,
+            "message": {"chat": {"id": chat_id}, "text": f"{update_id}"}}
+
+
+class TestDispatcher:
+    def test_order_per_chat(self):
+        processed = []
+        dispatcher = Dispatcher(processed.append, workers=4)
+        dispatcher.start()
+        for update_id in range(100):
+            dispatcher.dispatch(update(update_id, update_id % 3))
+        dispatcher.join()
+        dispatcher.stop()
+        assert len(processed) == 100
+        for chat_id in range(3):
+            ids = [item["update_id"] for item in processed
+                   if item["message"]["chat"]["id"] == chat_id]
+            assert ids == sorted(ids)
+
+    def test_chats_in_parallel(self):
+        lock = Lock()
+        running = []
+        peak = []
+
+        def handler(item):
+            with lock:
+                running.append(item)
+                peak.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.remove(item)
+
+        dispatcher = Dispatcher(handler, workers=4)
+        dispatcher.start()
+        for chat_id in range(4):
+            dispatcher.dispatch(update(chat_id, chat_id))
+        dispatcher.join()
+        dispatcher.stop()
+        assert max(peak) > 1
+
+    def test_get_key(self):
+        assert Dispatcher.get_key(update(1, 42)) == 42
+        assert Dispatcher.get_key({"update_id": 7}) == 7
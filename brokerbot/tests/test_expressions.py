@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import pytest
+from broker.expressions import (ExpressionException, ExpressionIndex,
+                                compile_expression)
+
+
+def no_history(name, seconds):
+    return None
+
+
+class TestExpressions:
+    def test_compile(self):
+        expression = compile_expression("Santander >  4.2 and Bbva < 9")
+        assert expression.text == "Santander > 4.2 and Bbva < 9"
+        assert expression.tickers == {"Santander", "Bbva"}
+        assert expression.evaluate({"Santander": 4.3, "Bbva": 8.5},
+                                   no_history)
+        assert not expression.evaluate({"Santander": 4.1, "Bbva": 8.5},
+                                       no_history)
+        # unknown prices are never true
+        assert not expression.evaluate({"Santander": 4.3}, no_history)
+
+    def test_names(self):
+        expression = compile_expression(
+                'Acciona Energía - 2 * "B.B.V.A." >= 10 or not (Sab > 1)')
+        assert expression.tickers == {"Acciona Energia", "Bbva", "Sab"}
+        assert expression.evaluate({"Acciona Energia": 30, "Bbva": 5,
+                                    "Sab": 2}, no_history)
+        assert not expression.evaluate({"Acciona Energia": 15, "Bbva": 5,
+                                        "Sab": 2}, no_history)
+
+    def test_pct(self):
+        expression = compile_expression("pct(Iberdrola, 1d) < -3")
+        seconds = []
+
+        def past(name, window):
+            seconds.append(window)
+            return 10.0
+        assert expression.evaluate({"Iberdrola": 9.6}, past)
+        assert not expression.evaluate({"Iberdrola": 9.8}, past)
+        assert seconds == [86400, 86400]
+        assert not expression.evaluate({"Iberdrola": 9.6}, no_history)
+
+    @pytest.mark.parametrize("text", [
+        "", "Bbva", "Bbva >", "Bbva > 1d", "pct(Bbva, 2) > 1",
+        "Bbva > 1 and 3", "(Bbva > 1) + 2 > 1", "Bbva $ 3", "Bbva > 1 )",
+        "not Bbva", "Bbva > 1 > 2", "Bbva > " + "1 + " * 100 + "1"])
+    def test_errors(self, text):
+        with pytest.raises(ExpressionException):
+            compile_expression(text)
+
+
+class TestExpressionIndex:
+    def test_update(self):
+        index = ExpressionIndex(cooldown=0)
+        index.add(1, compile_expression("Bbva > 9"))
+        index.add(2, compile_expression("Sab < 2 and Bbva > 8"))
+        assert len(index) == 2
+        fired = index.update({"Bbva": 9.5, "Sab": 1.5}, ["Bbva"],
+                             no_history, 0)
+        assert sorted((chat_id, expression.text)
+                      for chat_id, expression in fired) == \
+            [(1, "Bbva > 9"), (2, "Sab < 2 and Bbva > 8")]
+        # still true, it does not fire again
+        assert index.update({"Bbva": 9.6, "Sab": 1.5}, ["Bbva"],
+                            no_history, 1) == []
+        index.update({"Bbva": 8.5, "Sab": 1.5}, ["Bbva"], no_history, 2)
+        fired = index.update({"Bbva": 9.5, "Sab": 1.5}, ["Bbva"],
+                             no_history, 3)
+        assert [chat_id for chat_id, _ in fired] == [1]
+
+    def test_dependencies(self):
+        index = ExpressionIndex(cooldown=0)
+        index.add(1, compile_expression("Bbva > 9"))
+        # the price of Bbva did not change, not evaluated
+        assert index.update({"Bbva": 9.5}, ["Sab"], no_history, 0) == []
+        assert index.remove(1, "Bbva > 9")
+        assert not index.remove(1, "Bbva > 9")
+        assert index.update({"Bbva": 9.5}, ["Bbva"], no_history, 0) == []
+        assert len(index) == 0
+
+    def test_cooldown(self):
+        index = ExpressionIndex(cooldown=60)
+        index.add(1, compile_expression("Bbva > 9"), value=True)
+        # true when added, it fires when it becomes true again
+        assert index.update({"Bbva": 9.5}, ["Bbva"], no_history, 0) == []
+        index.update({"Bbva": 8.5}, ["Bbva"], no_history, 1)
+        assert len(index.update({"Bbva": 9.5}, ["Bbva"], no_history, 2))
+        index.update({"Bbva": 8.5}, ["Bbva"], no_history, 3)
+        assert index.update({"Bbva": 9.5}, ["Bbva"], no_history, 4) == []
+        assert index.get_expressions(1)[0].text == "Bbva > 9"
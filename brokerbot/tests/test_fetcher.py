@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import gzip
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+import requests
+from broker.fetcher import Fetcher
+
+PAGE = b"<html><body><table></table></body></html>"
+ETAG = '"v1"'
+
+
+class Handler(BaseHTTPRequestHandler):
+    etag = ETAG
+
+    def do_GET(self):
+        if self.etag and self.headers.get("If-None-Match") == self.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = gzip.compress(PAGE)
+        self.send_response(200)
+        self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        if self.etag:
+            self.send_header("ETag", self.etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestFetcher:
+    @classmethod
+    def setup_class(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}/"
+
+    @classmethod
+    def teardown_class(cls):
+        cls.server.shutdown()
+
+    def test_not_modified(self):
+        Handler.etag = ETAG
+        fetcher = Fetcher(self.url)
+        assert fetcher.get() == PAGE
+        assert fetcher.get() is None
+        assert fetcher.get_stats()["not_modified"] == 1
+
+    def test_unchanged(self):
+        Handler.etag = None
+        fetcher = Fetcher(self.url)
+        assert fetcher.get() == PAGE
+        assert fetcher.get() is None
+        assert fetcher.get_stats()["unchanged"] == 1
+        fetcher.reset()
+        assert fetcher.get() == PAGE
+
+    def test_shared_session(self):
+        Handler.etag = ETAG
+        session = requests.Session()
+        headers = dict(session.headers)
+        fetcher = Fetcher(self.url, session=session)
+        assert fetcher.get() == PAGE
+        assert fetcher.get() is None
+        assert dict(session.headers) == headers
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import pytest
+from broker.history import History, HistoryException, Series
+
+
+class TestHistory:
+    def test_range(self, tmp_path):
+        series = Series(str(tmp_path / "bbva.bin"), capacity=10)
+        for index in range(5):
+            series.append(100 + index, float(index))
+        assert len(series) == 5
+        assert series.range(101, 103) == [(101, 1.0), (102, 2.0),
+                                          (103, 3.0)]
+        assert series.range(200, 300) == []
+        assert series.at(102.5) == 2.0
+        assert series.at(99) is None
+        assert series.last() == (104, 4.0)
+        series.close()
+
+    def test_ring(self, tmp_path):
+        series = Series(str(tmp_path / "bbva.bin"), capacity=3)
+        for index in range(7):
+            series.append(index, float(index))
+        assert len(series) == 3
+        assert series.range(0, 10) == [(4, 4.0), (5, 5.0), (6, 6.0)]
+        series.close()
+
+    def test_older(self, tmp_path):
+        series = Series(str(tmp_path / "bbva.bin"), capacity=3)
+        series.append(10, 1.0)
+        with pytest.raises(HistoryException):
+            series.append(5, 1.0)
+        series.close()
+
+    def test_truncated(self, tmp_path):
+        filename = str(tmp_path / "Bbva.bin")
+        open(filename, "wb").close()
+        with pytest.raises(HistoryException):
+            Series(filename, 4)
+        series = Series(str(tmp_path / "Sab.bin"), 4)
+        series.close()
+        with open(str(tmp_path / "Sab.bin"), "r+b") as fw:
+            fw.truncate(40)
+        with pytest.raises(HistoryException):
+            Series(str(tmp_path / "Sab.bin"), 4)
+
+    def test_persistence(self, tmp_path):
+        history = History(str(tmp_path), capacity=4)
+        for index in range(6):
+            history.add({"BBVA": float(index), "Acciona Energía": 1.0},
+                        timestamp=index)
+        history.close()
+        history = History(str(tmp_path), capacity=4)
+        assert history.names() == ["Acciona Energia", "Bbva"]
+        assert history.range("Bbva", 0, 10) == [(2, 2.0), (3, 3.0),
+                                                (4, 4.0), (5, 5.0)]
+        assert history.range("Grifols", 0, 10) == []
+        history.close()
+
+    def test_retention(self, tmp_path):
+        history = History(str(tmp_path), capacity=100, retention=50)
+        for index in range(100):
+            history.add({"Bbva": float(index)}, timestamp=index)
+        assert history.compact(now=100) == 50
+        assert history.get("Bbva").first() == 50
+        assert history.range("Bbva", 0, 52) == [(50, 50.0), (51, 51.0),
+                                                (52, 52.0)]
+        history.close()
+        history = History(str(tmp_path), capacity=100, retention=50)
+        assert history.get("Bbva").first() == 50
+        history.close()
+
+    def test_query(self, tmp_path):
+        history = History(str(tmp_path), retention=3600)
+        # a quote every 5 minutes during two days
+        for index in range(2 * 288):
+            history.add({"Bbva": float(index)}, timestamp=index * 300)
+        now = 2 * 86400
+        history.compact(now)
+        resolution, bars = history.query("Bbva", now - 1800, now)
+        assert resolution == 0
+        assert bars[-1] == (now - 300, 575.0, 575.0, 575.0, 575.0)
+        resolution, bars = history.query("Bbva", now - 6 * 3600, now)
+        assert resolution == 60
+        # older than the quotes kept, from the hours
+        resolution, bars = history.query("Bbva", 0, now, points=10)
+        assert resolution == 3600
+        assert bars[0] == (0, 0.0, 11.0, 0.0, 11.0)
+        assert len(bars) == 48
+        # the minute bar of the quote at 900
+        assert history.at("Bbva", 1000) == 3.0
+        assert history.at("Bbva", now - 100) == 575.0
+        history.close()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import math
+import pytest
+from datetime import date
+from broker.indicators import (DailyRange, ExponentialMovingAverage,
+                               IndicatorEngine, IndicatorException,
+                               SimpleMovingAverage, Volatility,
+                               parse_indicator)
+
+DAY = date(2024, 3, 4)
+
+
+class TestIndicators:
+    def test_sma(self):
+        sma = SimpleMovingAverage(3)
+        for value in (1, 2):
+            sma.update(value)
+        assert sma.value is None
+        for value in (3, 4):
+            sma.update(value)
+        assert sma.value == 3
+
+    def test_ema(self):
+        ema = ExponentialMovingAverage(3)
+        for value in (10, 10, 10):
+            ema.update(value)
+        assert ema.value == 10
+        ema.update(14)
+        assert ema.value == 12
+
+    def test_volatility(self):
+        volatility = Volatility(2)
+        for value in (100, 110, 100):
+            volatility.update(value)
+        log_return = math.log(1.1)
+        assert volatility.value == pytest.approx(log_return)
+
+    def test_daily(self):
+        daily = DailyRange()
+        for value in (10, 12, 9, 11):
+            daily.update(value, DAY)
+        assert (daily.open, daily.high, daily.low, daily.close) == (10, 12,
+                                                                    9, 11)
+        daily.update(20, date(2024, 3, 5))
+        assert (daily.open, daily.high, daily.low) == (20, 20, 20)
+
+    def test_parse(self):
+        assert parse_indicator("EMA50") == ("ema", 50)
+        with pytest.raises(IndicatorException):
+            parse_indicator("rsi14")
+        with pytest.raises(IndicatorException):
+            parse_indicator("sma1000")
+
+
+class TestIndicatorEngine:
+    def test_crossing(self):
+        engine = IndicatorEngine()
+        engine.subscribe(1, "Bbva", "sma3")
+        engine.subscribe(2, "Bbva", "sma3")
+        crossings = []
+        for value in (10, 10, 10, 9, 8, 12):
+            crossings.append(engine.update({"Bbva": value}, DAY))
+        assert all(not items for items in crossings[:-1])
+        assert sorted(item.chat_id for item in crossings[-1]) == [1, 2]
+        assert crossings[-1][0].upwards
+        assert engine.get_subscriptions(1) == [("Bbva", "sma3")]
+        assert engine.unsubscribe(1, "Bbva", "sma3")
+        assert not engine.unsubscribe(1, "Bbva", "sma3")
+        assert [item.chat_id for item in
+                engine.update({"Bbva": 1}, DAY)] == [2]
+        assert engine.unsubscribe(2, "Bbva", "sma3")
+        assert engine._subscriptions == {}
+
+    def test_load(self):
+        engine = IndicatorEngine()
+        engine.subscribe(1, "Bbva", "sma3")
+        engine.load("Bbva", [10, 12, 8], DAY)
+        assert engine.get("Bbva")["open"] == 10
+        assert engine.update({"Bbva": 9}, DAY) == []
+
+    def test_get(self):
+        engine = IndicatorEngine()
+        assert engine.get("Bbva") is None
+        engine.update({"Bbva": 10}, DAY)
+        values = engine.get("Bbva")
+        assert values["open"] == 10
+        assert values["sma20"] is None
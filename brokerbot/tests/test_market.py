@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import pytest
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+from broker.market import AdaptiveInterval, MarketCalendar, easter
+
+MADRID = ZoneInfo("Europe/Madrid")
+
+
+class TestMarketCalendar:
+    @classmethod
+    def setup_class(cls):
+        cls.calendar = MarketCalendar()
+
+    def test_easter(self):
+        assert easter(2024) == date(2024, 3, 31)
+        assert easter(2025) == date(2025, 4, 20)
+
+    def test_is_open(self):
+        assert self.calendar.is_open(datetime(2024, 3, 4, 10, 0,
+                                              tzinfo=MADRID))
+        assert not self.calendar.is_open(datetime(2024, 3, 4, 8, 59,
+                                                  tzinfo=MADRID))
+        assert not self.calendar.is_open(datetime(2024, 3, 4, 17, 40,
+                                                  tzinfo=MADRID))
+        # saturday, Good Friday and December 24 afternoon
+        for closed in (datetime(2024, 3, 9, 12), datetime(2024, 3, 29, 12),
+                       datetime(2024, 12, 24, 15)):
+            assert not self.calendar.is_open(closed.replace(tzinfo=MADRID))
+
+    def test_next_open(self):
+        # Thursday before Easter, after the close: Tuesday at 9:00
+        now = datetime(2024, 3, 28, 18, 0, tzinfo=MADRID)
+        assert self.calendar.next_open(now) == datetime(2024, 4, 2, 9, 0,
+                                                        tzinfo=MADRID)
+        now = datetime(2024, 3, 28, 12, 0, tzinfo=MADRID)
+        assert self.calendar.next_open(now) == now
+
+
+class TestAdaptiveInterval:
+    def test_volatility(self):
+        interval = AdaptiveInterval(60, 900, target=0.002)
+        assert interval.update({"Bbva": 10.0}, 0) == 60
+        # 0.1 % in 100 seconds: 0.2 % in 200 seconds
+        assert interval.update({"Bbva": 10.01}, 100) == pytest.approx(200)
+        # no moves, as slow as possible
+        quiet = AdaptiveInterval(60, 900)
+        quiet.update({"Bbva": 10.0}, 0)
+        assert quiet.update({"Bbva": 10.0}, 100) == 900
+        # big moves, as fast as possible
+        busy = AdaptiveInterval(60, 900)
+        busy.update({"Bbva": 10.0}, 0)
+        assert busy.update({"Bbva": 11.0}, 100) == 60
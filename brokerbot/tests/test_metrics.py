@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import urllib.request
+from broker.metrics import MetricsServer, Registry
+
+
+class TestMetrics:
+    def setup_method(self):
+        self.registry = Registry()
+
+    def test_counter(self):
+        counter = self.registry.counter("errors_total", "Errors",
+                                        ("endpoint",))
+        counter.inc(endpoint="sendMessage")
+        counter.inc(2, endpoint="sendMessage")
+        assert counter.get(endpoint="sendMessage") == 3
+        assert 'errors_total{endpoint="sendMessage"} 3' in \
+            self.registry.render()
+
+    def test_histogram(self):
+        histogram = self.registry.histogram("poll_seconds", "Polls",
+                                            buckets=(0.1, 1))
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+        lines = self.registry.render().splitlines()
+        assert "# TYPE poll_seconds histogram" in lines
+        assert 'poll_seconds_bucket{le="0.1"} 1' in lines
+        assert 'poll_seconds_bucket{le="1"} 2' in lines
+        assert 'poll_seconds_bucket{le="+Inf"} 3' in lines
+        assert "poll_seconds_sum 5.55" in lines
+        assert "poll_seconds_count 3" in lines
+
+    def test_same_metric(self):
+        first = self.registry.counter("calls_total", "Calls")
+        second = self.registry.counter("calls_total", "Calls")
+        assert first is second
+
+    def test_server(self):
+        self.registry.gauge("depth", "Depth", lambda: 7)
+        server = MetricsServer(port=0, registry=self.registry)
+        server.start()
+        try:
+            url = f"http://127.0.0.1:{server.port}/metrics"
+            with urllib.request.urlopen(url) as response:
+                content = response.read().decode()
+        finally:
+            server.stop()
+        assert "depth 7" in content.splitlines()
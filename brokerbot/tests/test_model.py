@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import pytest
+from broker.model import Message, Update, User
+
+UPDATE = {
+    "update_id": 10,
+    "message": {
+        "message_id": 1,
+        "message_thread_id": 3,
+        "date": 1700000000,
+        "chat": {"id": -100, "type": "supergroup"},
+        "from": {"id": 7, "is_bot": False, "first_name": "Ana",
+                 "last_name": "García", "username": "ana"},
+        "text": "/get Telefonica"
+    }
+}
+
+
+class TestModel:
+    def test_update(self):
+        update = Update.from_dict(UPDATE)
+        assert update.update_id == 10
+        message = update.message
+        assert message.chat_id == -100
+        assert message.thread_id == 3
+        assert message.date == 1700000000
+        assert message.text == "/get Telefonica"
+        assert message.user.id == 7
+        assert message.user.alias == "@ana"
+
+    def test_defaults(self):
+        message = Message.from_dict({"chat": {"id": 1}})
+        assert message.thread_id == 0
+        assert message.text is None
+        assert message.user is None
+        assert Update.from_dict({"update_id": 1}).message is None
+
+    def test_alias_without_username(self):
+        user = User.from_dict({"id": 1, "first_name": "Ana",
+                               "last_name": "García"})
+        assert user.alias == "Ana García"
+
+    def test_slots(self):
+        user = User(1)
+        assert not hasattr(user, "__dict__")
+        with pytest.raises(AttributeError):
+            user.username = "ana"
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import math
+from datetime import datetime
+from zoneinfo import ZoneInfo
+import pytest
+from broker.market import MarketCalendar
+from broker.monitor import Monitor, MonitorException
+from broker.store import Store
+
+MAX_MSG = "El valor de Bbva superó el máximo fijado"
+MIN_MSG = "El valor de Sab bajó por debajo de el mínimo fijado"
+DAY = 24 * 3600
+
+
+class FakeAggregator:
+    def __init__(self, data):
+        self.data = dict(data)
+        self.fails = False
+
+    def get(self):
+        if self.fails:
+            raise ConnectionError("Can not connect")
+        return dict(self.data)
+
+
+class FakeSendQueue:
+    def __init__(self):
+        self.messages = []
+
+    def send_message(self, text, chat_id, thread_id=0):
+        self.messages.append((chat_id, text))
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = datetime(2024, 1, 8, 10).timestamp()
+
+    def __call__(self):
+        return self.now
+
+
+class Fixture:
+    """A monitor with a fake clock, aggregator and send queue"""
+
+    def __init__(self, data, **kwargs):
+        self.clock = FakeClock()
+        self.aggregator = FakeAggregator(data)
+        self.send_queue = FakeSendQueue()
+        kwargs.setdefault("window", 0)
+        self.monitor = Monitor(self.send_queue, self.aggregator,
+                               clock=self.clock, **kwargs)
+
+    def check(self, seconds=60, **prices):
+        """The prices seconds later, returns the messages sent by check"""
+        self.clock.now += seconds
+        self.aggregator.data.update(prices)
+        sent = len(self.send_queue.messages)
+        self.monitor.check()
+        return self.send_queue.messages[sent:]
+
+
+class TestMonitor:
+    def test_max_hysteresis(self):
+        fixture = Fixture({"Bbva": 9.0}, cooldown=0)
+        fixture.monitor.set_max(1, "bbva", 10.0)
+        assert fixture.check(Bbva=10.5) == [(1, MAX_MSG)]
+        # within the hysteresis band the rule stays disarmed
+        assert fixture.check(Bbva=9.99) == []
+        assert fixture.check(Bbva=10.5) == []
+        assert fixture.check(Bbva=9.9) == []
+        assert fixture.check(Bbva=10.5) == [(1, MAX_MSG)]
+
+    def test_min(self):
+        fixture = Fixture({"Sab": 2.1})
+        fixture.monitor.set_min(2, "Sab", 2.0)
+        assert fixture.check(Sab=2.05) == []
+        assert fixture.check(Sab=1.9) == [(2, MIN_MSG)]
+
+    def test_cooldown(self):
+        fixture = Fixture({"Bbva": 9.0}, cooldown=600)
+        fixture.monitor.set_max(1, "Bbva", 10.0)
+        start = fixture.clock.now
+        assert fixture.check(Bbva=10.5) == [(1, MAX_MSG)]
+        assert fixture.check(Bbva=9.0) == []
+        # crossed again in the cooldown, held until it ends
+        assert fixture.check(Bbva=10.5) == []
+        while fixture.clock.now < start + 600:
+            assert fixture.check() == []
+        assert fixture.check() == [(1, MAX_MSG)]
+
+    def test_cooldown_back(self):
+        fixture = Fixture({"Bbva": 9.0}, cooldown=600)
+        fixture.monitor.set_max(1, "Bbva", 10.0)
+        assert fixture.check(Bbva=10.5) == [(1, MAX_MSG)]
+        assert fixture.check(Bbva=9.0) == []
+        assert fixture.check(Bbva=10.5) == []
+        # the held alert is dropped if the price goes back
+        assert fixture.check(Bbva=9.5) == []
+        assert fixture.check(seconds=600) == []
+
+    def test_already_beyond(self):
+        fixture = Fixture({"Bbva": 11.0})
+        fixture.monitor.set_max(1, "Bbva", 10.0)
+        assert fixture.check() == [(1, MAX_MSG)]
+        assert fixture.check() == []
+
+    def test_replace(self):
+        fixture = Fixture({"Bbva": 9.0})
+        fixture.monitor.set_max(1, "Bbva", 10.0)
+        fixture.monitor.set_max(1, "Bbva", 12.0)
+        assert [rule.threshold
+                for rule in fixture.monitor.get_rules(1)] == [12.0]
+        assert fixture.check(Bbva=11.0) == []
+
+    def test_invalid_rule(self):
+        fixture = Fixture({"Bbva": 9.0})
+        with pytest.raises(MonitorException):
+            fixture.monitor.set_max(1, "Grifols", 10.0)
+        for value in (math.nan, math.inf):
+            with pytest.raises(MonitorException):
+                fixture.monitor.set_min(1, "Bbva", value)
+        assert fixture.monitor.get_rules(1) == []
+
+    def test_coalesce(self):
+        fixture = Fixture({"Bbva": 9.0, "Sab": 2.1, "Grifols": 10.0},
+                          window=300)
+        fixture.monitor.set_max(1, "Bbva", 10.0)
+        fixture.monitor.set_min(1, "Sab", 2.0)
+        fixture.monitor.set_max(1, "Grifols", 11.0)
+        # the alerts of a check go in one message
+        assert fixture.check(Bbva=10.5, Sab=1.9) == [
+            (1, f"{MAX_MSG}\n{MIN_MSG}")]
+        # and the next ones wait for the end of the window
+        assert fixture.check(Grifols=11.5) == []
+        assert fixture.monitor.flush_alerts() == 240
+        assert fixture.send_queue.messages[1:] == []
+        fixture.clock.now += 240
+        assert fixture.monitor.flush_alerts() == 300
+        assert fixture.send_queue.messages[1:] == [
+            (1, "El valor de Grifols superó el máximo fijado")]
+
+    def test_crossing(self):
+        fixture = Fixture({"Bbva": 10.0})
+        fixture.monitor.subscribe_crossing(1, "Bbva", "SMA2")
+        assert fixture.monitor.get_crossings(1) == [("Bbva", "sma2")]
+        assert fixture.check() == []
+        assert fixture.check(Bbva=12.0) == []
+        assert fixture.check(Bbva=8.0) == [
+            (1, "Bbva cruzó hacia abajo su SMA2 (10.000)")]
+        assert fixture.monitor.unsubscribe_crossing(1, "Bbva", "sma2")
+        assert fixture.check(Bbva=12.0) == []
+
+    def test_daily_open(self):
+        fixture = Fixture({"Bbva": 10.0})
+        fixture.monitor.subscribe(1)
+        fixture.monitor.subscribe(2)
+        assert fixture.check() == []
+        assert fixture.monitor.get_indicators("Bbva")["open"] == 10.0
+        assert sorted(fixture.check(Bbva=10.4)) == [
+            (1, "El valor de Bbva se incrementó 4.00%"),
+            (2, "El valor de Bbva se incrementó 4.00%")]
+        # once a day
+        assert fixture.check(Bbva=10.5) == []
+        # the first quote of the next day is its open
+        assert fixture.check(seconds=DAY) == []
+        assert fixture.monitor.get_indicators("Bbva")["open"] == 10.5
+        assert fixture.check(Bbva=10.0)[0] == (
+            1, "El valor de Bbva se decrementó -4.76%")
+
+    def test_expression(self):
+        fixture = Fixture({"Bbva": 9.0, "Sab": 2.1})
+        expression, value = fixture.monitor.add_alert(
+                1, "bbva > 10 and Sab < 2")
+        assert not value
+        message = (1, f"Se cumple la alerta {expression.text}")
+        assert fixture.check(Bbva=10.5) == []
+        assert fixture.check(Sab=1.9) == [message]
+        # only when it becomes true
+        assert fixture.check(Bbva=10.6) == []
+        assert fixture.monitor.remove_alert(1, expression.text)
+        assert fixture.check(Bbva=9.0) == []
+        assert fixture.check(Bbva=10.5) == []
+
+    def test_aggregator_fails(self):
+        fixture = Fixture({"Bbva": 9.0})
+        snapshot = fixture.monitor.get_snapshot()
+        fixture.aggregator.fails = True
+        assert fixture.check() == []
+        assert fixture.monitor.get_snapshot() is snapshot
+        fixture.aggregator.fails = False
+        fixture.check(Bbva=9.5)
+        assert fixture.monitor.get_snapshot().data == {"Bbva": 9.5}
+
+    def test_store(self, tmp_path):
+        store = Store(str(tmp_path / "brokerbot.db"))
+        fixture = Fixture({"Bbva": 9.0, "Sab": 2.1}, store=store)
+        fixture.monitor.subscribe(3)
+        fixture.monitor.set_max(1, "Bbva", 10.0)
+        fixture.monitor.subscribe_crossing(1, "Sab", "ema20")
+        fixture.monitor.add_alert(2, "Sab < 2")
+        # the bot restarts
+        fixture = Fixture({"Bbva": 9.0, "Sab": 2.1}, store=store)
+        monitor = fixture.monitor
+        assert monitor.get_subscribers() == frozenset({3})
+        assert [rule.threshold for rule in monitor.get_rules(1)] == [10.0]
+        assert monitor.get_crossings(1) == [("Sab", "ema20")]
+        assert [alert.text for alert in monitor.get_alerts(2)] == ["Sab < 2"]
+        assert fixture.check(Bbva=10.5, Sab=1.9) == [
+            (1, MAX_MSG), (2, "Se cumple la alerta Sab < 2")]
+        store.close()
+
+    def test_market_closed(self):
+        fixture = Fixture({"Bbva": 9.0}, calendar=MarketCalendar())
+        # a Saturday, the market opens on Monday at 9:00
+        fixture.clock.now = datetime(2024, 1, 6, 12, tzinfo=ZoneInfo(
+                "Europe/Madrid")).timestamp()
+        fixture.aggregator.fails = True
+        assert fixture.monitor.check() == 45 * 3600
+        fixture.clock.now += 45 * 3600 + 60
+        fixture.aggregator.fails = False
+        fixture.aggregator.data["Bbva"] = 9.5
+        assert fixture.monitor.check() is None
+        assert fixture.monitor.get_snapshot().data == {"Bbva": 9.5}
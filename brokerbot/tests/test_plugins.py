@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import pytest
+from broker.plugins import (PluginException, create, get_plugins,
+                            parse_sources, register)
+
+
+@register("fake")
+class Fake:
+    url = "https://example.com/ibex35"
+
+    def __init__(self, timeout, url=None):
+        self.timeout = timeout
+        self.url = url or self.url
+
+    def get(self):
+        return {"Bbva": 7.1}
+
+
+class TestPlugins:
+    def test_create(self):
+        assert "fake" in get_plugins()
+        source = create("fake", 5)
+        assert (source.timeout, source.url) == (5,
+                                                "https://example.com/ibex35")
+        with pytest.raises(PluginException):
+            create("unknown", 5)
+
+    def test_parse_sources(self):
+        sources, intervals = parse_sources(
+                "fake, continuo:fake:300:https://example.com/mc", 5)
+        assert list(sources) == ["fake", "continuo"]
+        assert sources["continuo"].url == "https://example.com/mc"
+        assert intervals == {"fake": 0.0, "continuo": 300.0}
+
+    def test_parse_errors(self):
+        for text in ("", "fake,fake", "fake:fake:often", "unknown"):
+            with pytest.raises(PluginException):
+                parse_sources(text, 5)
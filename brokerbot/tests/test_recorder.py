@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import gzip
+import pytest
+from broker.recorder import (Recorder, RecorderException, read_records,
+                             replay, write_record)
+
+
+class Source:
+    def __init__(self, results):
+        self._results = iter(results)
+
+    def get(self):
+        return next(self._results)
+
+
+class TestRecorder:
+    def test_record(self, tmp_path):
+        filename = str(tmp_path / "quotes.jsonl.gz")
+        recorder = Recorder(Source([{"Bbva": 7.1}, None, b"<html/>"]),
+                            filename, "expansion", clock=lambda: 100)
+        assert recorder.get() == {"Bbva": 7.1}
+        assert recorder.get() is None
+        assert recorder.get() == b"<html/>"
+        recorder.close()
+        records = list(read_records(filename,
+                                    {"expansion": lambda page: {"Page": 1}}))
+        assert records == [(100, {"Bbva": 7.1}), (100, {"Page": 1})]
+
+    def test_not_closed(self, tmp_path):
+        filename = str(tmp_path / "quotes.jsonl.gz")
+        now = [0]
+        recorder = Recorder(Source([{"Bbva": 7.1}, {"Bbva": 7.2}]),
+                            filename, clock=lambda: now[0],
+                            flush_interval=60)
+        recorder.get()
+        now[0] = 60
+        # closes the member, a minute after it was opened
+        recorder.get()
+        # the bot stops in the middle of the next member
+        with open(filename, "ab") as fw:
+            fw.write(gzip.compress(b"{}")[:10])
+        assert list(read_records(filename)) == [(0, {"Bbva": 7.1}),
+                                                (60, {"Bbva": 7.2})]
+
+    def test_accents(self, tmp_path):
+        filename = str(tmp_path / "quotes.jsonl.gz")
+        for index, price in enumerate((4.0, 4.2)):
+            write_record(filename, 1700000000 + 60 * index,
+                         page=f"{price}".encode(), source="expansion")
+        records = read_records(filename, {
+            "expansion": lambda page: {"Telefónica": float(page)}})
+        result = replay(records, rules=[(1, "Telefonica", "max", 4.1)])
+        assert [chat_id for _, chat_id, _ in result["alerts"]] == [1]
+
+    def test_corrupt(self, tmp_path):
+        filename = str(tmp_path / "quotes.jsonl.gz")
+        write_record(filename, 100, {"Bbva": 7.1})
+        with gzip.open(filename, "at") as fw:
+            fw.write("{\n")
+        with pytest.raises(RecorderException):
+            list(read_records(filename))
+
+    def test_replay(self):
+        prices = [7.0, 7.2, 7.5, 7.3, 6.9]
+        records = [(1700000000 + 60 * index, {"Bbva": price})
+                   for index, price in enumerate(prices)]
+        result = replay(records, rules=[(1, "bbva", "max", 7.4),
+                                        (2, "bbva", "min", 7.0)])
+        assert result["ticks"] == 4
+        assert [(timestamp - 1700000000, chat_id)
+                for timestamp, chat_id, _ in result["alerts"]] == \
+            [(120, 1), (240, 2)]
+
+    def test_oscillation(self):
+        prices = [7.3, 7.45, 7.38, 7.42, 7.39, 7.41, 7.2, 7.5]
+        records = [(1700000000 + 60 * index, {"Bbva": price})
+                   for index, price in enumerate(prices)]
+        result = replay(records, rules=[(1, "Bbva", "max", 7.4)])
+        # fires once, re-armed at 7.2 but still in its cooldown
+        assert len(result["alerts"]) == 1
+
+    def test_expressions(self):
+        prices = [(9.0, 2.1), (9.5, 2.1), (9.5, 1.9), (9.6, 1.8)]
+        records = [(1700000000 + 60 * index, {"Bbva": bbva, "Sab": sab})
+                   for index, (bbva, sab) in enumerate(prices)]
+        result = replay(records, expressions=[(1, "Bbva > 9 and Sab < 2")])
+        assert [(timestamp - 1700000000, text)
+                for timestamp, _, text in result["alerts"]] == \
+            [(120, "Se cumple la alerta Bbva > 9 and Sab < 2")]
+
+    def test_past(self):
+        prices = [10.0, 10.2, 10.4, 10.9]
+        records = [(1700000000 + 60 * index, {"Bbva": price})
+                   for index, price in enumerate(prices)]
+        result = replay(records, expressions=[(1, "pct(Bbva, 3m) > 8")])
+        assert [(timestamp - 1700000000, chat_id)
+                for timestamp, chat_id, _ in result["alerts"]] == \
+            [(180, 1)]
+
+    def test_variation(self):
+        prices = [10.0, 10.2, 10.35]
+        records = [(1700000000 + 60 * index, {"Bbva": price})
+                   for index, price in enumerate(prices)]
+        result = replay(records, subscribers=[1])
+        # from the first quote of the day, the open
+        assert [(timestamp - 1700000000, chat_id)
+                for timestamp, chat_id, _ in result["alerts"]] == \
+            [(120, 1)]
+
+    def test_empty(self):
+        with pytest.raises(RecorderException):
+            replay([])
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import pytest
+from broker.rollup import (Archive, Bars, DAY, HOUR, MINUTE, Rollup,
+                           RollupException)
+
+
+class TestBars:
+    def test_add(self, tmp_path):
+        bars = Bars(str(tmp_path / "bbva.60.bars"), MINUTE, 10)
+        for timestamp, price in ((0, 5.0), (20, 7.0), (40, 4.0),
+                                 (59, 6.0), (60, 6.5)):
+            bars.add(timestamp, price)
+        assert len(bars) == 2
+        assert bars.range(0, 60) == [(0, 5.0, 7.0, 4.0, 6.0),
+                                     (60, 6.5, 6.5, 6.5, 6.5)]
+        assert bars.at(30) == 6.0
+        with pytest.raises(RollupException):
+            bars.add(10, 1.0)
+        bars.close()
+
+    def test_evict(self, tmp_path):
+        filename = str(tmp_path / "bbva.60.bars")
+        bars = Bars(filename, MINUTE, 10)
+        for index in range(5):
+            bars.add(index * 60, float(index))
+        assert [bar[0] for bar in bars.cold(180)] == [0, 60, 120]
+        assert bars.evict(180) == 3
+        bars.close()
+        bars = Bars(filename, MINUTE, 10)
+        assert len(bars) == 2
+        assert bars.first() == 180
+        bars.close()
+
+
+class TestArchive:
+    def test_range(self, tmp_path):
+        archive = Archive(str(tmp_path / "bbva.3600.archive"))
+        assert archive.first() is None
+        archive.append([(index * 3600, 1.0, 2.0, 0.5, 1.5)
+                        for index in range(10)])
+        archive.append([(index * 3600, 1.0, 2.0, 0.5, 1.5)
+                        for index in range(10, 20)])
+        assert archive.first() == 0
+        assert [bar[0] for bar in archive.range(9 * 3600, 11 * 3600)] == \
+            [9 * 3600, 10 * 3600, 11 * 3600]
+        assert archive.at(10 * 3600 + 60) == 1.5
+        assert archive.at(-1) is None
+
+    def test_repeated(self, tmp_path):
+        archive = Archive(str(tmp_path / "bbva.3600.archive"))
+        # a crash in compact between the archive and the eviction
+        archive.append([(index * 3600, 1.0, 2.0, 0.5, float(index))
+                        for index in range(5)])
+        archive.append([(index * 3600, 1.0, 2.0, 0.5, float(index))
+                        for index in range(8)])
+        assert [bar[0] for bar in archive.range(0, 10 * 3600)] == \
+            [index * 3600 for index in range(8)]
+        assert archive.at(6 * 3600) == 6.0
+
+
+class TestRollup:
+    def test_compact(self, tmp_path):
+        tiers = ((MINUTE, HOUR, False), (HOUR, DAY, True),
+                 (DAY, 10 * DAY, True))
+        rollup = Rollup(str(tmp_path), tiers)
+        # a quote every minute during three days, compacted every hour
+        evicted = 0
+        for index in range(3 * 1440):
+            rollup.add("Bbva", index * 60, float(index))
+            if index % 60 == 0:
+                evicted += rollup.compact(index * 60)
+        now = 3 * DAY
+        evicted += rollup.compact(now)
+        assert evicted == (3 * 1440 - 60) + (3 * 24 - 24)
+        assert rollup.first("Bbva", MINUTE) == now - HOUR
+        # the cold hours are in the archive
+        assert rollup.first("Bbva", HOUR) == 0
+        bars = rollup.range("Bbva", HOUR, 0, now)
+        assert len(bars) == 72
+        assert bars[1] == (HOUR, 60.0, 119.0, 60.0, 119.0)
+        assert rollup.at("Bbva", HOUR, HOUR + 30) == 119.0
+        rollup.close()
+        rollup = Rollup(str(tmp_path), tiers)
+        assert rollup.first("Bbva", MINUTE) == now - HOUR
+        assert len(rollup.range("Bbva", DAY, 0, now)) == 3
+        rollup.close()
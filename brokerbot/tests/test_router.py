@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import pytest
+from broker.metrics import Registry
+from broker.router import Router
+
+
+class TestRouter:
+    def setup_method(self):
+        self.calls = []
+        self.router = Router("brokerbot", Registry())
+        self.router.add(self.calls.append, "/participo")
+        self.router.add(self.fail, "/noparticipo", "/no-participo")
+
+    def fail(self, message):
+        raise ValueError(message)
+
+    def test_get_command(self):
+        assert self.router.get_command("/participo") == "/participo"
+        assert self.router.get_command("/participo ya") == "/participo"
+        assert self.router.get_command("/participo@BrokerBot") == \
+            "/participo"
+        assert self.router.get_command("/participo@otrobot") is None
+        assert self.router.get_command("participo") is None
+
+    def test_dispatch(self):
+        assert self.router.dispatch("/participo", "hola")
+        assert self.calls == ["hola"]
+        assert not self.router.dispatch("/participar", "hola")
+
+    def test_prefixes(self):
+        # /noparticipo is not mistaken for /participo
+        with pytest.raises(ValueError):
+            self.router.dispatch("/noparticipo", "hola")
+        assert self.calls == []
+
+    def test_stats(self):
+        self.router.dispatch("/participo", "hola")
+        with pytest.raises(ValueError):
+            self.router.dispatch("/no-participo", "hola")
+        stats = self.router.get_stats()
+        assert stats["/participo"]["calls"] == 1
+        assert stats["/participo"]["errors"] == 0
+        assert stats["/participo"]["buckets"][float("inf")] == 1
+        assert stats["/no-participo"]["errors"] == 1
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import pytest
+from broker.rules import MAX, MIN, RuleException, RuleIndex
+
+
+class TestRuleIndex:
+    def test_max(self):
+        index = RuleIndex()
+        index.set(1, "Bbva", MAX, 10.0)
+        index.set(2, "Bbva", MAX, 12.0)
+        index.set(3, "Bbva", MAX, 20.0)
+        crossed = index.crossed("Bbva", 9.0, 15.0)
+        assert [rule.chat_id for rule in crossed] == [1, 2]
+        assert index.crossed("Bbva", 15.0, 9.0) == []
+        assert index.crossed("Bbva", 15.0, 15.0) == []
+        assert index.crossed("Grifols", 1.0, 100.0) == []
+
+    def test_min(self):
+        index = RuleIndex()
+        index.set(1, "Bbva", MIN, 10.0)
+        index.set(2, "Bbva", MIN, 5.0)
+        crossed = index.crossed("Bbva", 11.0, 6.0)
+        assert [rule.chat_id for rule in crossed] == [1]
+        assert len(index.crossed("Bbva", 10.0, 4.0)) == 2
+
+    def test_replace_and_remove(self):
+        index = RuleIndex()
+        index.set(1, "Bbva", MAX, 10.0)
+        index.set(1, "Bbva", MAX, 30.0)
+        index.set(1, "Bbva", MIN, 5.0)
+        assert len(index) == 2
+        assert index.crossed("Bbva", 9.0, 15.0) == []
+        assert [rule.threshold for rule in index.get_rules(1)] == [30.0,
+                                                                   5.0]
+        assert index.remove(1, "Bbva", MAX).threshold == 30.0
+        assert index.remove(1, "Bbva", MAX) is None
+        assert index.get_rules(2) == []
+
+    def test_same_threshold(self):
+        index = RuleIndex()
+        for chat_id in range(5):
+            index.set(chat_id, "Bbva", MAX, 10.0)
+        index.remove(3, "Bbva", MAX)
+        crossed = index.crossed("Bbva", 9.0, 11.0)
+        assert sorted(rule.chat_id for rule in crossed) == [0, 1, 2, 4]
+
+    def test_kind(self):
+        with pytest.raises(RuleException):
+            RuleIndex().set(1, "Bbva", "otro", 1.0)
+
+    def test_remove_same_threshold(self):
+        index = RuleIndex()
+        for chat_id in (1, 2, 3):
+            index.set(chat_id, "Bbva", MAX, 10.0)
+        index.remove(2, "Bbva", MAX)
+        crossed = index.crossed("Bbva", 9.0, 11.0)
+        assert [rule.chat_id for rule in crossed] == [1, 3]
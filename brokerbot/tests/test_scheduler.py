@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import time
+from threading import Event
+from broker.main import compact_history
+from broker.scheduler import Scheduler
+
+
+class TestScheduler:
+    def test_every(self):
+        runs = []
+        done = Event()
+
+        def task():
+            runs.append(time.monotonic())
+            if len(runs) == 3:
+                done.set()
+
+        scheduler = Scheduler()
+        scheduler.every(0.05, task)
+        scheduler.start()
+        assert done.wait(2)
+        scheduler.stop()
+        assert runs[2] - runs[0] >= 0.09
+
+    def test_next_run_from_task(self):
+        runs = []
+        done = Event()
+
+        def task():
+            runs.append(time.monotonic())
+            if len(runs) == 2:
+                done.set()
+            return 0.01
+
+        scheduler = Scheduler()
+        scheduler.every(60, task)
+        scheduler.start()
+        assert done.wait(2)
+        scheduler.stop()
+
+    def test_int_from_task(self):
+        runs = []
+
+        class History:
+            def compact(self):
+                runs.append(time.monotonic())
+                # nothing evicted, it is not the seconds to the next run
+                return 0
+
+        scheduler = Scheduler()
+        scheduler.every(0.2, lambda: compact_history(History()))
+        scheduler.start()
+        time.sleep(0.1)
+        scheduler.stop()
+        assert len(runs) == 1
+
+    def test_error_does_not_stop(self):
+        runs = []
+        done = Event()
+
+        def task():
+            runs.append(1)
+            if len(runs) == 2:
+                done.set()
+            raise ValueError("boom")
+
+        scheduler = Scheduler()
+        scheduler.every(0.01, task)
+        scheduler.start()
+        assert done.wait(2)
+        scheduler.stop()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import time
+from concurrent.futures import Future
+from broker.sendqueue import SendQueue, TokenBucket
+
+
+class RetryAfter(Exception):
+    def __init__(self, retry_after):
+        super().__init__("Too Many Requests")
+        self.retry_after = retry_after
+
+
+class FakeTelegramClient:
+    def __init__(self, fails=0):
+        self.messages = []
+        self.fails = fails
+
+    def send_message(self, text, chat_id, thread_id=0):
+        if self.fails > 0:
+            self.fails -= 1
+            raise RetryAfter(0.1)
+        self.messages.append((chat_id, text, time.monotonic()))
+
+    def send_photo(self, photo, chat_id, caption="", thread_id=0):
+        self.messages.append((chat_id, photo, time.monotonic()))
+
+
+class FakeAsyncRunner:
+    """Like AsyncTelegramRunner, the futures are resolved by the test"""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, method, *args):
+        future = Future()
+        self.submitted.append((args[1], args[0], future))
+        return future
+
+
+def wait_until(condition, timeout=5):
+    start = time.monotonic()
+    while not condition():
+        assert time.monotonic() - start < timeout
+        time.sleep(0.01)
+
+
+def wait_empty(send_queue, timeout=5):
+    start = time.monotonic()
+    while send_queue.get_stats()["depth"] > 0:
+        assert time.monotonic() - start < timeout
+        time.sleep(0.01)
+
+
+class TestTokenBucket:
+    def test_wait_time(self):
+        bucket = TokenBucket(1, 2, 0)
+        assert bucket.wait_time(0) == 0
+        bucket.consume(0)
+        bucket.consume(0)
+        assert bucket.wait_time(0) == 1
+        assert bucket.wait_time(0.5) == 0.5
+        assert bucket.wait_time(1) == 0
+
+    def test_pause(self):
+        bucket = TokenBucket(10, 10, 0)
+        bucket.pause(0, 3)
+        assert bucket.wait_time(1) == 2
+
+
+class TestSendQueue:
+    def test_order_per_chat(self):
+        telegram_client = FakeTelegramClient()
+        send_queue = SendQueue(telegram_client, global_rate=1000,
+                               global_burst=1000)
+        send_queue.start()
+        for index in range(3):
+            send_queue.send_message(f"{index}", 1)
+            send_queue.send_message(f"{index}", 2)
+        wait_empty(send_queue)
+        send_queue.stop()
+        for chat_id in (1, 2):
+            texts = [text for chat, text, _ in telegram_client.messages
+                     if chat == chat_id]
+            assert texts == ["0", "1", "2"]
+        assert send_queue.get_stats()["sent"] == 6
+
+    def test_retry_after(self):
+        telegram_client = FakeTelegramClient(fails=1)
+        send_queue = SendQueue(telegram_client)
+        send_queue.start()
+        start = time.monotonic()
+        send_queue.send_message("Hola", 1)
+        wait_empty(send_queue)
+        send_queue.stop()
+        stats = send_queue.get_stats()
+        assert stats["retried"] == 1
+        assert stats["sent"] == 1
+        assert telegram_client.messages[0][2] - start >= 0.1
+
+    def test_round_robin(self):
+        telegram_client = FakeTelegramClient()
+        send_queue = SendQueue(telegram_client, global_rate=1000,
+                               global_burst=1000)
+        # groups, with a burst of three messages
+        for index in range(3):
+            send_queue.send_message(f"{index}", -1)
+        for index in range(3):
+            send_queue.send_message(f"{index}", -2)
+        send_queue.start()
+        wait_empty(send_queue)
+        send_queue.stop()
+        assert [chat for chat, _, _ in telegram_client.messages] == \
+            [-1, -2, -1, -2, -1, -2]
+
+    def test_retry_after_other_chats(self):
+        telegram_client = FakeTelegramClient(fails=1)
+        send_queue = SendQueue(telegram_client)
+        send_queue.send_message("Hola", 1)
+        send_queue.send_message("Hola", 2)
+        start = time.monotonic()
+        send_queue.start()
+        wait_empty(send_queue)
+        send_queue.stop()
+        # only the chat of the 429 waits
+        chat_id, _, sent = telegram_client.messages[0]
+        assert chat_id == 2
+        assert sent - start < 0.1
+
+    def test_prune(self):
+        now = [0.0]
+        send_queue = SendQueue(FakeTelegramClient(), clock=lambda: now[0])
+        send_queue.start()
+        send_queue.send_message("Hola", 1)
+        wait_empty(send_queue)
+        assert send_queue.get_stats()["buckets"] == 1
+        now[0] = 100
+        send_queue.send_message("Hola", 2)
+        wait_empty(send_queue)
+        send_queue.stop()
+        assert send_queue.get_stats()["buckets"] == 1
+
+    def test_photo(self):
+        telegram_client = FakeTelegramClient()
+        send_queue = SendQueue(telegram_client, global_rate=1000,
+                               global_burst=1000)
+        send_queue.start()
+        send_queue.send_message("chart", -1)
+        send_queue.send_photo(b"png", -1, "Bbva 1d")
+        wait_empty(send_queue)
+        send_queue.stop()
+        assert [item[1] for item in telegram_client.messages] == ["chart",
+                                                                  b"png"]
+
+    def test_in_flight(self):
+        runner = FakeAsyncRunner()
+        send_queue = SendQueue(runner, global_rate=1000, global_burst=1000)
+        send_queue.send_message("0", 1)
+        send_queue.send_message("1", 1)
+        send_queue.send_message("0", 2)
+        send_queue.start()
+        # one request in flight per chat, the other chats do not wait
+        wait_until(lambda: len(runner.submitted) == 2)
+        assert [item[:2] for item in runner.submitted] == [(1, "0"),
+                                                           (2, "0")]
+        assert send_queue.get_stats()["in_flight"] == 2
+        runner.submitted[0][2].set_exception(RetryAfter(0.1))
+        wait_until(lambda: len(runner.submitted) == 3)
+        assert runner.submitted[2][:2] == (1, "0")
+        runner.submitted[2][2].set_result({"ok": True})
+        wait_until(lambda: len(runner.submitted) == 4)
+        assert runner.submitted[3][:2] == (1, "1")
+        runner.submitted[1][2].set_result({"ok": True})
+        runner.submitted[3][2].set_result({"ok": True})
+        wait_empty(send_queue)
+        send_queue.stop()
+        stats = send_queue.get_stats()
+        assert (stats["sent"], stats["retried"], stats["in_flight"]) == \
+            (3, 1, 0)
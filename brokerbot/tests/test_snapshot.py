@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import pytest
+from broker.snapshot import Snapshot
+
+
+class TestSnapshot:
+    def test_build(self):
+        data = {"Bbva": 7.12, "Grifols": 10.5}
+        snapshot = Snapshot.build(3, data, timestamp=100)
+        data["Bbva"] = 0
+        assert snapshot.version == 3
+        assert snapshot.data["Bbva"] == 7.12
+        assert snapshot.text == "Bbva: 7.12\nGrifols: 10.5"
+
+    def test_immutable(self):
+        snapshot = Snapshot.build(1, {"Bbva": 7.12})
+        with pytest.raises(TypeError):
+            snapshot.data["Bbva"] = 0
+        with pytest.raises(AttributeError):
+            snapshot.version = 2
+
+    def test_stale(self):
+        snapshot = Snapshot.build(1, {}, timestamp=100)
+        assert snapshot.get_age(now=160) == 60
+        assert not snapshot.is_stale(900, now=160)
+        assert snapshot.is_stale(900, now=1100)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from broker.rules import MAX, MIN, Rule
+from broker.store import Store
+
+
+class TestStore:
+    def test_rules(self, tmp_path):
+        db = str(tmp_path / "brokerbot.db")
+        store = Store(db)
+        store.save_rule(Rule(1, "Bbva", MAX, 10.0))
+        store.save_rule(Rule(1, "Bbva", MAX, 12.0))
+        store.save_rule(Rule(1, "Bbva", MIN, 5.0))
+        store.save_rule(Rule(2, "Grifols", MIN, 8.0))
+        store.delete_rule(2, "Grifols", MIN)
+        store.close()
+        store = Store(db)
+        rules = sorted((rule.chat_id, rule.name, rule.kind, rule.threshold)
+                       for rule in store.get_rules())
+        assert rules == [(1, "Bbva", MAX, 12.0), (1, "Bbva", MIN, 5.0)]
+        store.close()
+
+    def test_subscribers(self, tmp_path):
+        db = str(tmp_path / "brokerbot.db")
+        store = Store(db)
+        store.add_subscriber(1)
+        store.add_subscriber(1)
+        store.add_subscriber(-100)
+        store.close()
+        store = Store(db)
+        assert sorted(store.get_subscribers()) == [-100, 1]
+        store.close()
+
+    def test_wal(self, tmp_path):
+        store = Store(str(tmp_path / "brokerbot.db"))
+        mode = store._execute("PRAGMA journal_mode")[0][0]
+        store.close()
+        assert mode == "wal"
+
+    def test_crossings(self, tmp_path):
+        db = str(tmp_path / "brokerbot.db")
+        store = Store(db)
+        store.save_crossing(1, "Bbva", "ema20")
+        store.save_crossing(1, "Bbva", "sma50")
+        store.delete_crossing(1, "Bbva", "sma50")
+        store.close()
+        store = Store(db)
+        assert store.get_crossings() == [(1, "Bbva", "ema20")]
+        store.close()
+
+    def test_expressions(self, tmp_path):
+        db = str(tmp_path / "brokerbot.db")
+        store = Store(db)
+        store.save_expression(1, "Bbva > 9")
+        store.save_expression(1, "Bbva > 9")
+        store.save_expression(2, "pct(Bbva, 1d) < -3")
+        store.delete_expression(2, "pct(Bbva, 1d) < -3")
+        store.close()
+        store = Store(db)
+        assert store.get_expressions() == [(1, "Bbva > 9")]
+        store.close()
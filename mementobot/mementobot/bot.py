@@ -22,16 +22,23 @@
 # SOFTWARE.
 
 from io import StringIO
-import json
 import logging
-import os
+from checkpoint import Checkpoint
+from dispatcher import Dispatcher, WORKERS
+from metrics import REGISTRY
+from model import Update
+from router import Router
+from sendqueue import SendQueue
 from telegram import TelegramClient
 from timewatcher import TimeWatcher
 
 logger = logging.getLogger(__name__)
 
-CURDIR = os.path.realpath(os.path.dirname(__file__))
-CONFIG = os.path.join(CURDIR, "config.json")
+POLL_SECONDS = REGISTRY.histogram("bot_poll_seconds",
+                                  "Time of the getUpdates long polls")
+UPDATES = REGISTRY.counter("bot_updates_total", "Updates received",
+                           ("status",))
+
 HAND = "👉"
 
 
@@ -40,91 +47,109 @@ class BotException(Exception):
 
 
 class Bot:
-    def __init__(self, token, time_watcher: TimeWatcher, pool_time=300):
+    def __init__(self, telegram_client: TelegramClient,
+                 time_watcher: TimeWatcher, send_queue: SendQueue,
+                 checkpoint: Checkpoint, username="", pool_time=300,
+                 workers=WORKERS):
         logger.debug("__init__")
         self._pool_time = pool_time
-        self._telegram_client = TelegramClient(token)
+        self._telegram_client = telegram_client
+        self._send_queue = send_queue
         self._time_watcher = time_watcher
-        self._read_config()
-
-    def _read_config(self) -> None:
-        logger.debug("_read_config")
-        if os.path.exists(CONFIG):
-            with open(CONFIG, "r") as fr:
-                config = json.load(fr)
-                self._offset = config["offset"]
-        else:
-            self._offset = 0
-
-    def _save_config(self) -> None:
-        logger.debug("_save_config")
-        with open(CONFIG, "w") as fw:
-            config = {
-                "offset": self._offset
-            }
-            json.dump(config, fw)
+        self._checkpoint = checkpoint
+        self._router = Router(username)
+        self._router.add(self.process_help, "/help")
+        self._router.add(self.process_list, "/list")
+        self._router.add(self.process_add, "/add")
+        self._router.add(self.process_del, "/del")
+        self._dispatcher = Dispatcher(self._handle_update, workers)
+        self._dispatcher.start()
+
+    def set_webhook(self, url: str, secret_token: str = "") -> None:
+        logger.debug("set_webhook")
+        self._telegram_client.set_webhook(url, secret_token)
+
+    def delete_webhook(self) -> None:
+        logger.debug("delete_webhook")
+        self._telegram_client.delete_webhook()
+
+    def stop(self) -> None:
+        """Wait for the updates dispatched and save the checkpoint"""
+        logger.debug("stop")
+        self._dispatcher.stop()
+        self._checkpoint.flush()
 
     def get_updates(self):
         logger.debug("get_updates")
-        response = self._telegram_client.get_updates(self._offset,
-                                                     self._pool_time)
+        with POLL_SECONDS.time():
+            response = self._telegram_client.get_updates(
+                    self._checkpoint.offset, self._pool_time)
         if response["ok"] and response["result"]:
             offset = max([item["update_id"] for item in response["result"]])
-            self._offset = offset + 1
-            self._save_config()
             self._process_response(response)
+            self._checkpoint.advance(offset + 1)
 
     def _process_response(self, response):
         logger.debug("_process_response")
-        chat_id = None
         for message in response["result"]:
-            try:
-                logger.debug(f"Message: {message}")
-                chat_id = message["message"]["chat"]["id"]
-                if self._time_watcher.get_chat_id() is None:
-                    self._time_watcher.set_chat_id(chat_id)
-                text = message["message"]["text"]
-                logger.debug(f"Text: {text}")
-                if text.startswith("/help"):
-                    self.process_help(message)
-                elif text.startswith("/list"):
-                    self.process_list(message)
-                elif text.startswith("/add"):
-                    self.process_add(message)
-                elif text.startswith("/del"):
-                    self.process_del(message)
-                elif text.startswith("/"):
-                    command = text.split(" ")[0]
-                    msg = f"The command {command} is not implemented"
-                    raise BotException(msg)
-            except Exception as exception:
-                if chat_id:
-                    self._telegram_client.send_message(str(exception), chat_id)
+            if self._checkpoint.seen(message["update_id"]):
+                logger.debug(f"Already processed: {message['update_id']}")
+                UPDATES.inc(status="duplicated")
+                continue
+            UPDATES.inc(status="dispatched")
+            self._dispatcher.dispatch(message)
+
+    def _handle_update(self, data):
+        # in the worker: the update is done once the handler finishes
+        try:
+            self._process_update(data)
+        finally:
+            self._checkpoint.done(data["update_id"])
+
+    def _process_update(self, data):
+        logger.debug("_process_update")
+        chat_id = None
+        try:
+            logger.debug(f"Message: {data}")
+            message = Update.from_dict(data).message
+            if message is None or message.text is None:
+                return
+            chat_id = message.chat_id
+            if self._time_watcher.get_chat_id() is None:
+                self._time_watcher.set_chat_id(chat_id)
+            logger.debug(f"Text: {message.text}")
+            command = self._router.get_command(message.text)
+            if command and not self._router.dispatch(command, message):
+                msg = f"The command {command} is not implemented"
+                raise BotException(msg)
+        except Exception as exception:
+            if chat_id:
+                self._send_queue.send_message(str(exception), chat_id)
 
     def process_help(self, message):
-        chat_id = message["message"]["chat"]["id"]
+        chat_id = message.chat_id
         strbuf = StringIO()
         strbuf.write("/help show this help\n")
         strbuf.write("/list list all the reminders\n")
         strbuf.write("/add add a reminder (/set <when => message>)\n")
         strbuf.write("/del del a reminder (/del <index>)\n")
-        self._telegram_client.send_message(strbuf.getvalue(), chat_id)
+        self._send_queue.send_message(strbuf.getvalue(), chat_id)
 
     def process_add(self, message):
         logger.debug("process_warning")
-        data = message["message"]["text"][5:].strip().split("=>")
+        data = message.text[5:].strip().split("=>")
         logger.debug(data)
         when, msg = data
         self._time_watcher.add_reminder(when.strip(), msg.strip())
 
     def process_del(self, message):
         logger.debug("process_warning")
-        index = message["message"]["text"][5:].strip()
+        index = message.text[5:].strip()
         self._time_watcher.remove_reminder(index)
 
     def process_list(self, message):
         logger.debug("process_list")
-        chat_id = message["message"]["chat"]["id"]
+        chat_id = message.chat_id
         response = ""
         data = self._time_watcher.get_reminders()
         if data:
@@ -133,4 +158,4 @@ class Bot:
                     {item['message']}" for item in data])
         else:
             response = "No reminders"
-        self._telegram_client.send_message(response, chat_id=chat_id)
+        self._send_queue.send_message(response, chat_id=chat_id)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import logging
+from queue import Queue
+from threading import Thread
+
+logger = logging.getLogger(__name__)
+
+WORKERS = 8
+QUEUE_SIZE = 100
+
+
+class Worker(Thread):
+    def __init__(self, handler, queue_size: int) -> None:
+        super().__init__()
+        self.daemon = True
+        self._handler = handler
+        self._queue = Queue(queue_size)
+
+    def put(self, update) -> None:
+        self._queue.put(update)
+
+    def join_queue(self) -> None:
+        self._queue.join()
+
+    def run(self):
+        while True:
+            update = self._queue.get()
+            try:
+                if update is None:
+                    return
+                self._handler(update)
+            except Exception as exception:
+                logger.error(f"Error processing {update}: {exception}")
+            finally:
+                self._queue.task_done()
+
+
+class Dispatcher:
+    """A bounded pool of workers for the updates
+
+    All the updates of a chat go to the same worker, so they are processed
+    in order, while the updates of different chats are processed in
+    parallel. When the queue of a worker is full `dispatch` blocks, so the
+    poller never gets too far ahead of the handlers.
+    """
+
+    def __init__(self, handler, workers: int = WORKERS,
+                 queue_size: int = QUEUE_SIZE) -> None:
+        logger.debug("__init__")
+        self._workers = [Worker(handler, queue_size) for _ in range(workers)]
+
+    def start(self) -> None:
+        logger.debug("start")
+        for worker in self._workers:
+            worker.start()
+
+    def stop(self) -> None:
+        logger.debug("stop")
+        for worker in self._workers:
+            worker.put(None)
+        for worker in self._workers:
+            worker.join()
+
+    def join(self) -> None:
+        """Wait until all the dispatched updates are processed"""
+        for worker in self._workers:
+            worker.join_queue()
+
+    @staticmethod
+    def get_key(update: dict):
+        for kind in ("message", "edited_message", "channel_post",
+                     "callback_query"):
+            if kind in update:
+                item = update[kind]
+                if kind == "callback_query":
+                    item = item.get("message", {})
+                if "chat" in item:
+                    return item["chat"]["id"]
+        return update.get("update_id", 0)
+
+    def dispatch(self, update: dict) -> None:
+        key = self.get_key(update)
+        self._workers[hash(key) % len(self._workers)].put(update)
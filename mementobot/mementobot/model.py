@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from dataclasses import dataclass
+
+
+@dataclass(slots=True, frozen=True)
+class User:
+    id: int
+    is_bot: bool = False
+    first_name: str = ""
+    last_name: str = ""
+    username: str = ""
+    language_code: str = ""
+
+    @property
+    def alias(self) -> str:
+        """The @username or, if there is not, the name of the user"""
+        if self.username:
+            return f"@{self.username}"
+        return f"{self.first_name} {self.last_name}"
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "User":
+        return cls(data["id"], data.get("is_bot", False),
+                   data.get("first_name", ""), data.get("last_name", ""),
+                   data.get("username", ""), data.get("language_code", ""))
+
+
+@dataclass(slots=True, frozen=True)
+class Message:
+    chat_id: int
+    thread_id: int = 0
+    text: str | None = None
+    date: int = 0
+    user: User | None = None
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Message":
+        user = data.get("from")
+        return cls(data["chat"]["id"], data.get("message_thread_id", 0),
+                   data.get("text"), data.get("date", 0),
+                   User.from_dict(user) if user else None)
+
+
+@dataclass(slots=True, frozen=True)
+class Update:
+    """An update of Telegram, parsed once and passed to the handlers"""
+    update_id: int
+    message: Message | None = None
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Update":
+        message = data.get("message")
+        return cls(data["update_id"],
+                   Message.from_dict(message) if message else None)
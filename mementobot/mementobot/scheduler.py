@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import heapq
+import itertools
+import logging
+import time
+from threading import Condition, Thread
+
+logger = logging.getLogger(__name__)
+
+
+class Scheduler(Thread):
+    """Runs periodic tasks in a single thread
+
+    A task can return the number of seconds until its next run, otherwise
+    it runs again after its interval.
+    """
+
+    def __init__(self, clock=time.monotonic) -> None:
+        logger.debug("__init__")
+        super().__init__()
+        self.daemon = True
+        self._clock = clock
+        self._condition = Condition()
+        self._tasks = []
+        self._counter = itertools.count()
+        self._running = True
+
+    def every(self, interval: float, task, delay: float = 0) -> None:
+        """Run `task` every `interval` seconds, the first time after
+        `delay` seconds"""
+        logger.debug("every")
+        self._push(self._clock() + delay, interval, task)
+
+    def _push(self, when: float, interval: float, task) -> None:
+        with self._condition:
+            heapq.heappush(self._tasks,
+                           (when, next(self._counter), interval, task))
+            self._condition.notify()
+
+    def stop(self) -> None:
+        logger.debug("stop")
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+
+    def run(self):
+        logger.debug("run")
+        while True:
+            with self._condition:
+                while self._running:
+                    if not self._tasks:
+                        self._condition.wait()
+                        continue
+                    wait = self._tasks[0][0] - self._clock()
+                    if wait <= 0:
+                        break
+                    self._condition.wait(wait)
+                if not self._running:
+                    return
+                _, _, interval, task = heapq.heappop(self._tasks)
+            next_run = None
+            try:
+                next_run = task()
+            except Exception as exception:
+                logger.error(f"Error in {task}: {exception}")
+            if next_run is None:
+                next_run = interval
+            self._push(self._clock() + next_run, interval, task)
@@ -21,34 +21,80 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import asyncio
+import json
 import logging
+from concurrent.futures import Future
+from threading import Thread
+from typing import TYPE_CHECKING
+
 import requests
+from metrics import REGISTRY
+
+if TYPE_CHECKING:
+    import aiohttp
 
 logger = logging.getLogger(__name__)
 
+API_URL = "https://api.telegram.org"
+POOL_SIZE = 100
+KEEPALIVE_TIMEOUT = 60
+REQUEST_TIMEOUT = 30
+DEFAULT_RETRY_AFTER = 5
+
+REQUEST_SECONDS = REGISTRY.histogram(
+        "telegram_request_seconds", "Time of the requests to the Bot API",
+        ("endpoint",))
+REQUEST_ERRORS = REGISTRY.counter(
+        "telegram_request_errors_total", "Failed requests to the Bot API",
+        ("endpoint", "status"))
+
+
+def _retry_after(content: str) -> int:
+    """Seconds to wait from the body of a 429 response"""
+    try:
+        return int(json.loads(content)["parameters"]["retry_after"])
+    except (ValueError, KeyError, TypeError):
+        return DEFAULT_RETRY_AFTER
+
 
 class ExceptionTelegram(Exception):
     pass
 
 
+class ExceptionTelegramRetry(ExceptionTelegram):
+    """Too Many Requests. Telegram asks to wait `retry_after` seconds"""
+
+    def __init__(self, msg: str, retry_after: int) -> None:
+        super().__init__(msg)
+        self.retry_after = retry_after
+
+
 class TelegramClient:
     """A Telegram Client"""
 
-    def __init__(self, token: str) -> None:
+    def __init__(self, token: str, api_url: str = API_URL,
+                 session: requests.Session | None = None) -> None:
         """Init the client
 
         Parameters
         ----------
         token : str
             Token of the client
+        api_url : str
+            Url of the Bot API server
+        session : requests.Session
+            Shared session (connection pool). If None, the client creates
+            its own session
         update_offset : int
             First uptate to get
         update_timeout : int
             Timeout between calls
         """
         logger.debug("__init__")
-        self._url = f"https://api.telegram.org/bot{token}"
-        self._session = requests.Session()
+        self._url = f"{api_url}/bot{token}"
+        self._session = session if session is not None else \
+            requests.Session()
 
     def get_me(self) -> dict:
         """Get info about the client
@@ -105,6 +151,71 @@ class TelegramClient:
             data.update({"message_thread_id": thread_id})
         return self._post("sendMessage", data)
 
+    def send_photo(self, photo: bytes, chat_id: int, caption: str = "",
+                   thread_id: int = 0) -> dict:
+        """Send a photo
+
+        Parameters
+        ----------
+        photo : bytes
+            The image (PNG or JPEG)
+        chat_id : int
+            The chat_it
+        caption : str
+            Text under the photo
+        thread_id : int
+            The thread_id if any
+
+        Returns
+        -------
+        dict
+            The response
+        """
+        logger.debug("send_photo")
+        data = {
+            "chat_id": chat_id
+        }
+        if caption:
+            data.update({"caption": caption})
+        if thread_id > 0:
+            data.update({"message_thread_id": thread_id})
+        files = {"photo": ("photo.png", photo)}
+        return self._post("sendPhoto", data, files)
+
+    def set_webhook(self, url: str, secret_token: str = "") -> dict:
+        """Send the updates to a webhook instead of getUpdates
+
+        Parameters
+        ----------
+        url : str
+            HTTPS url of the webhook
+        secret_token : str
+            Sent by Telegram in the X-Telegram-Bot-Api-Secret-Token header
+
+        Returns
+        -------
+        dict
+            The response
+        """
+        logger.debug("set_webhook")
+        data = {
+            "url": url
+        }
+        if secret_token:
+            data.update({"secret_token": secret_token})
+        return self._post("setWebhook", data)
+
+    def delete_webhook(self) -> dict:
+        """Remove the webhook to go back to getUpdates
+
+        Returns
+        -------
+        dict
+            The response
+        """
+        logger.debug("delete_webhook")
+        return self._post("deleteWebhook")
+
     def _get(self, endpoint: str, params: dict = {}) -> dict:
         """Send a generic GET
 
@@ -124,13 +235,23 @@ class TelegramClient:
         logger.debug(f"endpoint: {endpoint}")
         logger.debug(f"params: {params}")
         url = f"{self._url}/{endpoint}"
-        response = self._session.get(url, params=params)
+        try:
+            with REQUEST_SECONDS.time(endpoint=endpoint):
+                response = self._session.get(url, params=params)
+        except requests.RequestException:
+            REQUEST_ERRORS.inc(endpoint=endpoint, status="error")
+            raise
         if response.status_code != 200:
+            REQUEST_ERRORS.inc(endpoint=endpoint,
+                               status=response.status_code)
             msg = f"Error HTTP {response.status_code}. {response.text}"
+            if response.status_code == 429:
+                raise ExceptionTelegramRetry(msg, _retry_after(response.text))
             raise ExceptionTelegram(msg)
         return response.json()
 
-    def _post(self, endpoint: str, data: dict = {}) -> dict:
+    def _post(self, endpoint: str, data: dict = {},
+              files: dict | None = None) -> dict:
         """Send a generic POST
 
         Parameters
@@ -139,6 +260,8 @@ class TelegramClient:
             The endpoint
         data : dict
             Data to send
+        files : dict
+            Files to upload (multipart/form-data) if any
 
         Returns
         -------
@@ -149,8 +272,329 @@ class TelegramClient:
         logger.debug(f"endpoint: {endpoint}")
         logger.debug(f"data: {data}")
         url = f"{self._url}/{endpoint}"
-        response = self._session.get(url, json=data)
+        try:
+            with REQUEST_SECONDS.time(endpoint=endpoint):
+                if files:
+                    response = self._session.post(url, data=data,
+                                                  files=files)
+                else:
+                    response = self._session.get(url, json=data)
+        except requests.RequestException:
+            REQUEST_ERRORS.inc(endpoint=endpoint, status="error")
+            raise
         if response.status_code != 200:
+            REQUEST_ERRORS.inc(endpoint=endpoint,
+                               status=response.status_code)
             msg = f"Error HTTP {response.status_code}. {response.text}"
+            if response.status_code == 429:
+                raise ExceptionTelegramRetry(msg, _retry_after(response.text))
             raise ExceptionTelegram(msg)
         return response.json()
+
+
+class AsyncTelegramClient:
+    """An asyncio Telegram Client
+
+    All the requests go through a bounded keep-alive connection pool. The
+    pool (an `aiohttp.ClientSession`) can be shared between several clients
+    so that one event loop can keep hundreds of requests in flight.
+
+    aiohttp is an optional dependency (the `async` extra), so it is imported
+    lazily and the bots that only use the sync `TelegramClient` do not need
+    it installed.
+    """
+
+    def __init__(self, token: str,
+                 session: "aiohttp.ClientSession | None" = None,
+                 pool_size: int = POOL_SIZE, api_url: str = API_URL) -> None:
+        """Init the client
+
+        Parameters
+        ----------
+        token : str
+            Token of the client
+        session : aiohttp.ClientSession
+            Shared session (connection pool). If None, the client creates
+            and owns its own session
+        pool_size : int
+            Max number of simultaneous connections of the own session
+        api_url : str
+            Url of the Bot API server
+        """
+        logger.debug("__init__")
+        self._url = f"{api_url}/bot{token}"
+        self._session = session
+        self._own_session = session is None
+        self._pool_size = pool_size
+
+    @staticmethod
+    def create_session(pool_size: int = POOL_SIZE
+                       ) -> "aiohttp.ClientSession":
+        """Create a bounded keep-alive connection pool
+
+        Parameters
+        ----------
+        pool_size : int
+            Max number of simultaneous connections
+
+        Returns
+        -------
+        aiohttp.ClientSession
+            The session to share between clients
+        """
+        import aiohttp
+        connector = aiohttp.TCPConnector(limit=pool_size,
+                                         limit_per_host=pool_size,
+                                         keepalive_timeout=KEEPALIVE_TIMEOUT)
+        return aiohttp.ClientSession(connector=connector,
+                                     timeout=aiohttp.ClientTimeout(
+                                         total=REQUEST_TIMEOUT))
+
+    async def close(self) -> None:
+        """Close the session if it is owned by the client"""
+        logger.debug("close")
+        if self._own_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
+
+    async def get_me(self) -> dict:
+        """Get info about the client
+
+        Returns
+        -------
+        dict
+            Info about the client
+        """
+        logger.debug("get_me")
+        return await self._get("getMe")
+
+    async def get_updates(self, offset, timeout) -> dict:
+        """Get updates
+
+        Returns
+        -------
+        dict
+            Updates
+        """
+        import aiohttp
+        logger.debug("get_updates")
+        params = {
+            "offset": offset,
+            "timeout": timeout
+        }
+        # the long poll must not be cut by the default request timeout
+        client_timeout = aiohttp.ClientTimeout(total=timeout +
+                                               REQUEST_TIMEOUT)
+        response = await self._get("getUpdates", params, client_timeout)
+        logger.debug(f"Response: {response}")
+        return response
+
+    async def send_message(self, text: str, chat_id: int,
+                           thread_id: int = 0) -> dict:
+        """Send a message
+
+        Parameters
+        ----------
+        text : str
+            The message
+        chat_id : int
+            The chat_it
+        thread_id : int
+            The thread_id if any
+
+        Returns
+        -------
+        dict
+            The response
+        """
+        logger.debug("send_message")
+        data = {
+            "chat_id": chat_id,
+            "text": text
+        }
+        if thread_id > 0:
+            data.update({"message_thread_id": thread_id})
+        return await self._post("sendMessage", data)
+
+    async def send_photo(self, photo: bytes, chat_id: int, caption: str = "",
+                         thread_id: int = 0) -> dict:
+        """Send a photo
+
+        Parameters
+        ----------
+        photo : bytes
+            The image (PNG or JPEG)
+        chat_id : int
+            The chat_it
+        caption : str
+            Text under the photo
+        thread_id : int
+            The thread_id if any
+
+        Returns
+        -------
+        dict
+            The response
+        """
+        import aiohttp
+        logger.debug("send_photo")
+        form = aiohttp.FormData()
+        form.add_field("chat_id", str(chat_id))
+        if caption:
+            form.add_field("caption", caption)
+        if thread_id > 0:
+            form.add_field("message_thread_id", str(thread_id))
+        form.add_field("photo", photo, filename="photo.png")
+        return await self._post("sendPhoto", form=form)
+
+    async def get_member(self, chat_id, user_id) -> dict:
+        logger.debug("get_member")
+        data = {
+            "chat_id": chat_id,
+            "user_id": user_id
+        }
+        return await self._post("getChatMember", data)
+
+    async def get_administrators(self, chat_id) -> dict:
+        logger.debug("get_administrators")
+        data = {
+            "chat_id": chat_id
+        }
+        return await self._post("getChatAdministrators", data)
+
+    def _get_session(self) -> "aiohttp.ClientSession":
+        # the session must be created inside the running loop
+        if self._session is None:
+            self._session = self.create_session(self._pool_size)
+        return self._session
+
+    async def _get(self, endpoint: str, params: dict = {},
+                   timeout: "aiohttp.ClientTimeout | None" = None) -> dict:
+        """Send a generic GET
+
+        Parameters
+        ----------
+        endpoint : str
+            The endpoint
+        params : dict
+            Params for the query
+        timeout : aiohttp.ClientTimeout
+            Timeout for this request if not the default one
+
+        Returns
+        -------
+        dict
+            Response from Telegram
+        """
+        import aiohttp
+        logger.debug("_get")
+        logger.debug(f"endpoint: {endpoint}")
+        logger.debug(f"params: {params}")
+        url = f"{self._url}/{endpoint}"
+        kwargs = {"timeout": timeout} if timeout else {}
+        with REQUEST_SECONDS.time(endpoint=endpoint):
+            try:
+                async with self._get_session().get(url, params=params,
+                                                   **kwargs) as response:
+                    return await self._process(endpoint, response)
+            except aiohttp.ClientError:
+                REQUEST_ERRORS.inc(endpoint=endpoint, status="error")
+                raise
+
+    async def _post(self, endpoint: str, data: dict = {},
+                    form: "aiohttp.FormData | None" = None) -> dict:
+        """Send a generic POST
+
+        Parameters
+        ----------
+        endpoint : str
+            The endpoint
+        data : dict
+            Data to send
+        form : aiohttp.FormData
+            Form with files to upload (multipart/form-data) if any
+
+        Returns
+        -------
+        dict
+            Response from Telegram
+        """
+        import aiohttp
+        logger.debug("_post")
+        logger.debug(f"endpoint: {endpoint}")
+        logger.debug(f"data: {data}")
+        url = f"{self._url}/{endpoint}"
+        kwargs = {"data": form} if form else {"json": data}
+        with REQUEST_SECONDS.time(endpoint=endpoint):
+            try:
+                async with self._get_session().post(url,
+                                                    **kwargs) as response:
+                    return await self._process(endpoint, response)
+            except aiohttp.ClientError:
+                REQUEST_ERRORS.inc(endpoint=endpoint, status="error")
+                raise
+
+    @staticmethod
+    async def _process(endpoint: str,
+                       response: "aiohttp.ClientResponse") -> dict:
+        if response.status != 200:
+            REQUEST_ERRORS.inc(endpoint=endpoint, status=response.status)
+            text = await response.text()
+            msg = f"Error HTTP {response.status}. {text}"
+            if response.status == 429:
+                raise ExceptionTelegramRetry(msg, _retry_after(text))
+            raise ExceptionTelegram(msg)
+        return await response.json()
+
+
+class AsyncTelegramRunner(Thread):
+    """Runs an AsyncTelegramClient in an event loop of its own thread
+
+    It is the bridge between the sync code and the asyncio client: the
+    SendQueue submits the requests and gets a `concurrent.futures.Future`
+    for each one, so it can keep many requests in flight from one thread.
+    """
+
+    def __init__(self, client: AsyncTelegramClient) -> None:
+        super().__init__()
+        logger.debug("__init__")
+        self.daemon = True
+        self._client = client
+        self._loop = asyncio.new_event_loop()
+
+    def submit(self, method: str, *args) -> Future:
+        """Run a method of the client in the loop
+
+        Parameters
+        ----------
+        method : str
+            Name of the method of the AsyncTelegramClient
+        args : tuple
+            Arguments of the method
+
+        Returns
+        -------
+        Future
+            The future result of the request
+        """
+        coroutine = getattr(self._client, method)(*args)
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    def run(self) -> None:
+        logger.debug("run")
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_forever()
+            self._loop.run_until_complete(self._client.close())
+        finally:
+            self._loop.close()
+
+    def stop(self) -> None:
+        logger.debug("stop")
+        self._loop.call_soon_threadsafe(self._loop.stop)
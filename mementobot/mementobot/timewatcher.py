@@ -24,15 +24,19 @@
 import logging
 from dateparser import parse
 from datetime import datetime
-from telegram import TelegramClient
-from threading import Thread
-from time import sleep
+from metrics import REGISTRY
+from sendqueue import SendQueue
 from typing import Optional
 
 SETTINGS = {"DEFAULT_LANGUAGES": ["es"],
             "TIMEZONE": "UTC"}
 SLEEP_TIME = 1
 
+DRIFT_SECONDS = REGISTRY.histogram(
+        "mementobot_reminder_drift_seconds",
+        "Delay between the time of a reminder and its delivery",
+        buckets=(0.1, 0.25, 0.5, 1, 1.5, 2, 5, 10, 30, 60))
+
 logger = logging.getLogger(__name__)
 
 
@@ -40,12 +44,12 @@ class TimeWatcherException(Exception):
     pass
 
 
-class TimeWatcher(Thread):
-    def __init__(self, token: str) -> None:
+class TimeWatcher:
+    """Sends the reminders. Schedule check every SLEEP_TIME seconds"""
+
+    def __init__(self, send_queue: SendQueue) -> None:
         logger.debug("__init__")
-        super().__init__()
-        self.setDaemon(True)
-        self._telegram_client = TelegramClient(token)
+        self._send_queue = send_queue
         self._chat_id = None
         self._reminders = []
 
@@ -88,17 +92,17 @@ class TimeWatcher(Thread):
                 return
         raise TimeWatcherException("Reminder not found")
 
-    def run(self):
-        while True:
-            for reminder in self._reminders:
-                now = datetime.now().timestamp()
-                logger.debug(f"{reminder['index']} - {now} > {reminder['timestamp']}")
-                if now > reminder["timestamp"]:
-                    logger.debug(f"Send reminder: {reminder['index']}")
-                    if self._chat_id is not None:
-                        self._telegram_client.send_message(reminder["message"],
-                                                           self._chat_id)
-                        self.remove_reminder(reminder["index"])
-                    else:
-                        raise TimeWatcherException("Chat id not set")
-            sleep(SLEEP_TIME)
+    def check(self):
+        logger.debug("check")
+        for reminder in self._reminders:
+            now = datetime.now().timestamp()
+            logger.debug(f"{reminder['index']} - {now} > {reminder['timestamp']}")
+            if now > reminder["timestamp"]:
+                logger.debug(f"Send reminder: {reminder['index']}")
+                if self._chat_id is not None:
+                    DRIFT_SECONDS.observe(now - reminder["timestamp"])
+                    self._send_queue.send_message(reminder["message"],
+                                                  self._chat_id)
+                    self.remove_reminder(reminder["index"])
+                else:
+                    raise TimeWatcherException("Chat id not set")
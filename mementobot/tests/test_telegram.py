@@ -22,9 +22,18 @@
 # SOFTWARE.
 
 
+import asyncio
 import os
+import sys
 from dotenv import load_dotenv
-from mementobot.telegram import TelegramClient
+from mementobot.sendqueue import SendQueue
+from mementobot.telegram import (AsyncTelegramClient, AsyncTelegramRunner,
+                                 TelegramClient)
+
+# the fake Bot API of the benchmark
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))), "benchmark"))
+from fakeapi import FakeTelegramAPI  # noqa: E402
 
 
 class TestTelegramClient:
@@ -50,3 +59,61 @@ class TestTelegramClient:
         text = "Este es un mensaje de prueba"
         response = self.telegram_client.send_message(text, self.chat_id)
         assert response is not None
+
+
+class TestAsyncTelegramClient:
+    """Against the fake Bot API of the benchmark, not the real one"""
+
+    @classmethod
+    def setup_class(cls):
+        cls.api = FakeTelegramAPI()
+        cls.api.start()
+
+    @classmethod
+    def teardown_class(cls):
+        cls.api.stop()
+
+    def test_get_me(self):
+        async def get_me():
+            async with AsyncTelegramClient(
+                    "token", api_url=self.api.url) as telegram_client:
+                return await telegram_client.get_me()
+        response = asyncio.run(get_me())
+        assert response["result"]["username"] == "fakebot"
+
+    def test_shared_session(self):
+        async def send_messages():
+            session = AsyncTelegramClient.create_session()
+            try:
+                telegram_client = AsyncTelegramClient(
+                        "token", session, api_url=self.api.url)
+                return await asyncio.gather(*[
+                    telegram_client.send_message(f"Mensaje {index}", 10)
+                    for index in range(3)])
+            finally:
+                await session.close()
+        sent = len(self.api.messages)
+        responses = asyncio.run(send_messages())
+        assert [response["ok"] for response in responses] == [True] * 3
+        texts = {message["text"] for message in self.api.messages[sent:]}
+        assert texts == {"Mensaje 0", "Mensaje 1", "Mensaje 2"}
+
+    def test_send_queue(self):
+        runner = AsyncTelegramRunner(
+                AsyncTelegramClient("token", api_url=self.api.url))
+        runner.start()
+        send_queue = SendQueue(runner)
+        send_queue.start()
+        try:
+            sent = len(self.api.messages)
+            for chat_id in (20, 21, 22):
+                send_queue.send_message(f"Hola {chat_id}", chat_id)
+            assert self.api.wait_replies(sent + 3, 5)
+            chats = {message["chat"]["id"]
+                     for message in self.api.messages[sent:]}
+            assert chats == {20, 21, 22}
+        finally:
+            send_queue.stop()
+            runner.stop()
+            runner.join(5)
+        assert send_queue.get_stats()["in_flight"] == 0
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import argparse
+import importlib
+import json
+import logging
+import os
+import sys
+from threading import Thread
+import requests
+from requests.adapters import HTTPAdapter
+from scheduler import Scheduler
+
+logging.basicConfig(
+        stream=sys.stdout,
+        level=logging.DEBUG,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+        )
+logger = logging.getLogger(__name__)
+
+CURDIR = os.path.realpath(os.path.dirname(__file__))
+POOL_SIZE = 100
+
+
+def create_session(pool_size: int = POOL_SIZE) -> requests.Session:
+    """A session with a connection pool shared by all the bots"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size,
+                          pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def load_main(path: str):
+    """Import the `main` module of a bot without mixing it with the others
+
+    The bots share module names (bot, telegram, ...), so every bot is
+    imported with its own directory in `sys.path` and its modules are
+    removed from `sys.modules` afterwards. The loaded modules keep their
+    references to each other.
+    """
+    logger.debug(f"load_main {path}")
+    path = os.path.realpath(path)
+    sys.path.insert(0, path)
+    try:
+        return importlib.import_module("main")
+    finally:
+        sys.path.remove(path)
+        for name, module in list(sys.modules.items()):
+            filename = getattr(module, "__file__", None) or ""
+            if filename.startswith(path + os.sep):
+                del sys.modules[name]
+
+
+def read_config(filename: str) -> list:
+    """List of bots with their `name`, `path` and `env`"""
+    with open(filename, "r") as fr:
+        return json.load(fr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run several bots")
+    parser.add_argument("config", nargs="?",
+                        default=os.path.join(CURDIR, "bots.json"))
+    args = parser.parse_args()
+    session = create_session()
+    scheduler = Scheduler()
+    threads = []
+    for item in read_config(args.config):
+        path = os.path.join(os.path.dirname(args.config), item["path"])
+        env = item.get("env", {})
+        module = load_main(path)
+        bot = module.setup(env, scheduler, session)
+        thread = Thread(target=module.serve, args=(bot, env),
+                        name=item["name"], daemon=True)
+        threads.append(thread)
+        logger.info(f"Loaded {item['name']}")
+    scheduler.start()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
@@ -22,20 +22,27 @@
 # SOFTWARE.
 
 from io import StringIO
-import json
 import logging
 import log
-import os
 import random
+from checkpoint import Checkpoint
+from dispatcher import Dispatcher, WORKERS
+from metrics import REGISTRY
+from model import Update
 from telegram import TelegramClient
 from register import Register, RegisterExists, RegisterNotExists
+from router import Router
+from sendqueue import SendQueue
 from datetime import datetime
 
 
 logger = logging.getLogger(__name__)
 
-CURDIR = os.path.realpath(os.path.dirname(__file__))
-CONFIG = os.path.join(CURDIR, "config.json")
+POLL_SECONDS = REGISTRY.histogram("bot_poll_seconds",
+                                  "Time of the getUpdates long polls")
+UPDATES = REGISTRY.counter("bot_updates_total", "Updates received",
+                           ("status",))
+
 MAXDATE = datetime(2023, 12, 2, 23, 59, 59)
 HAND = "👉"
 
@@ -46,91 +53,102 @@ class BotException(Exception):
 
 class Bot:
     @log.debug
-    def __init__(self, token, chat_id, thread_id, register: Register,
-                 pool_time=300):
+    def __init__(self, telegram_client: TelegramClient,
+                 send_queue: SendQueue, chat_id, thread_id,
+                 register: Register, checkpoint: Checkpoint, username="",
+                 pool_time=300, workers=WORKERS):
         self._pool_time = pool_time
-        self._telegram_client = TelegramClient(token)
+        self._telegram_client = telegram_client
+        self._send_queue = send_queue
         self._chat_id = int(chat_id)
         self._thread_id = int(thread_id)
         self._register = register
-        self._read_config()
+        self._checkpoint = checkpoint
+        self._router = Router(username)
+        self._router.add(self.process_help, "/help", "/ayuda")
+        self._router.add(self.process_si, "/participo")
+        self._router.add(self.process_no, "/noparticipo", "/no-participo")
+        self._router.add(self.process_status, "/estado")
+        self._router.add(self.process_sortea, "/sortea")
+        self._router.add(self.process_count, "/cuenta")
+        self._router.add(self.process_plazo, "/plazo")
+        self._dispatcher = Dispatcher(self._handle_update, workers)
+        self._dispatcher.start()
 
     @log.debug
-    def _read_config(self) -> None:
-        if os.path.exists(CONFIG):
-            with open(CONFIG, "r") as fr:
-                config = json.load(fr)
-                self._offset = config["offset"]
-        else:
-            self._offset = 0
+    def set_webhook(self, url: str, secret_token: str = "") -> None:
+        self._telegram_client.set_webhook(url, secret_token)
+
+    @log.debug
+    def delete_webhook(self) -> None:
+        self._telegram_client.delete_webhook()
 
     @log.debug
-    def _save_config(self) -> None:
-        with open(CONFIG, "w") as fw:
-            config = {
-                "offset": self._offset
-            }
-            json.dump(config, fw)
+    def stop(self) -> None:
+        """Wait for the updates dispatched and save the checkpoint"""
+        self._dispatcher.stop()
+        self._checkpoint.flush()
 
     @log.debug
     def get_updates(self):
-        response = self._telegram_client.get_updates(self._offset,
-                                                     self._pool_time)
+        with POLL_SECONDS.time():
+            response = self._telegram_client.get_updates(
+                    self._checkpoint.offset, self._pool_time)
         if response["ok"] and response["result"]:
             offset = max([item["update_id"] for item in response["result"]])
-            self._offset = offset + 1
-            self._save_config()
             self._process_response(response)
+            self._checkpoint.advance(offset + 1)
 
     @log.debug
     def _process_response(self, response):
+        for message in response["result"]:
+            if self._checkpoint.seen(message["update_id"]):
+                logger.debug(f"Already processed: {message['update_id']}")
+                UPDATES.inc(status="duplicated")
+                continue
+            UPDATES.inc(status="dispatched")
+            self._dispatcher.dispatch(message)
+
+    def _handle_update(self, data):
+        # in the worker: the update is done once the handler finishes
+        try:
+            self._process_update(data)
+        finally:
+            self._checkpoint.done(data["update_id"])
+
+    @log.debug
+    def _process_update(self, data):
         chat_id = None
         thread_id = 0
-        for message in response["result"]:
-            try:
-                chat_id = message["message"]["chat"]["id"]
-                thread_id = message["message"]["message_thread_id"] if \
-                    "message_thread_id" in message["message"] else 0
-                if chat_id != self._chat_id or \
-                        thread_id != self._thread_id or \
-                        "text" not in message["message"]:
-                    logger.debug(f"{chat_id} <=> {self._chat_id}")
-                    logger.debug(f"{thread_id} <=> {self._thread_id}")
-                    logger.debug("Me salgo")
-                    return
-                logger.debug(f"Message: {message}")
-                text = message["message"]["text"]
-                logger.debug(f"Text: {text}")
-                if text.startswith("/help") or text.startswith("/ayuda"):
-                    self.process_help(message)
-                elif text.startswith("/participo"):
-                    self.process_si(message)
-                elif text.startswith("/noparticipo") or \
-                        text.startswith("/no-participo"):
-                    self.process_no(message)
-                elif text.startswith("/estado"):
-                    self.process_status(message)
-                elif text.startswith("/sortea"):
-                    self.process_sortea(message)
-                elif text.startswith("/cuenta"):
-                    self.process_count(message)
-                elif text.startswith("/plazo"):
-                    self.process_plazo(message)
-                elif text.startswith("/"):
-                    command = text.split(" ")[0]
-                    msg = f"The command {command} is not implemented"
-                    raise BotException(msg)
-            except Exception as exception:
-                if chat_id:
-                    logger.error(exception)
-                    self._telegram_client.send_message(str(exception), chat_id,
-                                                       thread_id)
+        try:
+            message = Update.from_dict(data).message
+            if message is None:
+                return
+            chat_id = message.chat_id
+            thread_id = message.thread_id
+            if chat_id != self._chat_id or \
+                    thread_id != self._thread_id or \
+                    message.text is None:
+                logger.debug(f"{chat_id} <=> {self._chat_id}")
+                logger.debug(f"{thread_id} <=> {self._thread_id}")
+                logger.debug("Me salgo")
+                return
+            logger.debug(f"Message: {data}")
+            logger.debug(f"Text: {message.text}")
+            command = self._router.get_command(message.text)
+            if command and not self._router.dispatch(command, message):
+                msg = f"The command {command} is not implemented"
+                raise BotException(msg)
+        except Exception as exception:
+            if chat_id:
+                logger.error(exception)
+                self._send_queue.send_message(str(exception), chat_id,
+                                              thread_id)
 
     @log.debug
     def process_help(self, message):
-        chat_id = message["message"]["chat"]["id"]
-        thread_id = message["message"]["message_thread_id"] if \
-            "message_thread_id" in message["message"] else 0
+        chat_id = message.chat_id
+        thread_id = message.thread_id
         strbuf = StringIO()
         strbuf.write(f"`/ayuda` {HAND} muestra esta ayuda\n")
         strbuf.write(f"`/participo` {HAND} te añade a la lista del sorteo\n")
@@ -141,89 +159,73 @@ class Bot:
         strbuf.write(f"`/cuenta` {HAND} muestra el número de participantes\n")
         strbuf.write(f"`/plazo` {HAND} muestra el plazo del sorteo\n")
         strbuf.write(f"`/sortea` {HAND} realiza el sorteo\n")
-        self._telegram_client.send_message(strbuf.getvalue(), chat_id,
-                                           thread_id)
+        self._send_queue.send_message(strbuf.getvalue(), chat_id,
+                                      thread_id)
 
     @log.debug
     def process_si(self, message):
-        user = message["message"]["from"]
-        chat_id = message["message"]["chat"]["id"]
-        thread_id = message["message"]["message_thread_id"] if \
-            "message_thread_id" in message["message"] else 0
-        username = user["username"] if "username" in user else None
-        first_name = user["first_name"] if "first_name" in user else ""
-        last_name = user["last_name"] if "last_name" in user else ""
-        alias = f"@{username}" if username else f"{first_name} {last_name}"
-        if user["is_bot"]:
+        user = message.user
+        chat_id = message.chat_id
+        thread_id = message.thread_id
+        alias = user.alias
+        if user.is_bot:
             message = f"`{alias}`, lo siento, los bot no pueden participar"
         elif datetime.now() > MAXDATE:
             message = f"`{alias}`, el plazo para apuntarse terminó. Lo siento."
         else:
             try:
-                self._register.add(message["message"])
+                self._register.add(message)
                 message = f"Conseguido!, ya estás registrado `{alias}`"
             except RegisterExists:
                 message = f"`{alias}`, ya estabas registrado para el sorteo!!"
             except Exception as exception:
                 message = f"Error: {exception}"
-        self._telegram_client.send_message(message, chat_id, thread_id)
+        self._send_queue.send_message(message, chat_id, thread_id)
 
     @log.debug
     def process_plazo(self, message):
-        user = message["message"]["from"]
-        chat_id = message["message"]["chat"]["id"]
-        thread_id = message["message"]["message_thread_id"] if \
-            "message_thread_id" in message["message"] else 0
-        username = user["username"] if "username" in user else None
-        first_name = user["first_name"] if "first_name" in user else ""
-        last_name = user["last_name"] if "last_name" in user else ""
-        alias = f"@{username}" if username else f"{first_name} {last_name}"
-        if user["is_bot"]:
+        user = message.user
+        chat_id = message.chat_id
+        thread_id = message.thread_id
+        alias = user.alias
+        if user.is_bot:
             message = f"`{alias}`, lo siento, los bot no pueden participar"
         else:
             fechamax = MAXDATE.strftime("el %d/%m/%Y a las %H:%M:%S")
             message = f"`{alias}`, el plazo termina {fechamax}"
-        self._telegram_client.send_message(message, chat_id, thread_id)
+        self._send_queue.send_message(message, chat_id, thread_id)
 
     @log.debug
     def process_no(self, message):
-        user = message["message"]["from"]
-        chat_id = message["message"]["chat"]["id"]
-        thread_id = message["message"]["message_thread_id"] if \
-            "message_thread_id" in message["message"] else 0
-        username = user["username"] if "username" in user else None
-        first_name = user["first_name"] if "first_name" in user else ""
-        last_name = user["last_name"] if "last_name" in user else ""
-        alias = f"@{username}" if username else f"{first_name} {last_name}"
-        if user["is_bot"]:
+        user = message.user
+        chat_id = message.chat_id
+        thread_id = message.thread_id
+        alias = user.alias
+        if user.is_bot:
             message = f"`{alias}`, lo siento, los bot no pueden participar"
         elif datetime.now() > MAXDATE:
             message = f"`{alias}`, el plazo terminó. Lo siento."
         else:
             try:
-                self._register.rm(message["message"])
+                self._register.rm(message)
                 message = f"Vaya, lo siento!, ya no participas `{alias}`"
             except RegisterNotExists:
                 message = f"`{alias}`, no estabas registrado para el sorteo!!"
             except Exception as exception:
                 message = f"Error: {exception}"
-        self._telegram_client.send_message(message, chat_id, thread_id)
+        self._send_queue.send_message(message, chat_id, thread_id)
 
     @log.debug
     def process_status(self, message):
-        user = message["message"]["from"]
-        chat_id = message["message"]["chat"]["id"]
-        thread_id = message["message"]["message_thread_id"] if \
-            "message_thread_id" in message["message"] else 0
-        username = user["username"] if "username" in user else None
-        first_name = user["first_name"] if "first_name" in user else ""
-        last_name = user["last_name"] if "last_name" in user else ""
-        alias = f"@{username}" if username else f"{first_name} {last_name}"
-        if user["is_bot"]:
+        user = message.user
+        chat_id = message.chat_id
+        thread_id = message.thread_id
+        alias = user.alias
+        if user.is_bot:
             message = f"`{alias}`, lo siento, los bot no pueden participar"
         else:
             try:
-                if self._register.exists(message["message"]):
+                if self._register.exists(message):
                     message = f"Estás registrado, `{alias}`"
                 else:
                     message = f"NO estás registrado, `{alias}`"
@@ -231,34 +233,29 @@ class Bot:
                 message = f"`{alias}`, no estabas registrado para el sorteo!!"
             except Exception as exception:
                 message = f"Error: {exception}"
-        self._telegram_client.send_message(message, chat_id, thread_id)
+        self._send_queue.send_message(message, chat_id, thread_id)
 
     @log.debug
     def process_count(self, message):
-        chat_id = message["message"]["chat"]["id"]
-        thread_id = message["message"]["message_thread_id"] if \
-            "message_thread_id" in message["message"] else 0
+        chat_id = message.chat_id
+        thread_id = message.thread_id
         participantes = self._register.count()
         if participantes and participantes[0] > 0:
             message = f"Número de participantes: {participantes[0]}"
         else:
             message = "Todavía no hay ningún participante!!!"
-        self._telegram_client.send_message(message, chat_id, thread_id)
+        self._send_queue.send_message(message, chat_id, thread_id)
 
     @log.debug
     def process_sortea(self, message):
-        user = message["message"]["from"]
-        chat_id = message["message"]["chat"]["id"]
-        thread_id = message["message"]["message_thread_id"] if \
-            "message_thread_id" in message["message"] else 0
-        username = user["username"] if "username" in user else None
-        first_name = user["first_name"] if "first_name" in user else ""
-        last_name = user["last_name"] if "last_name" in user else ""
-        alias = f"@{username}" if username else f"{first_name} {last_name}"
+        user = message.user
+        chat_id = message.chat_id
+        thread_id = message.thread_id
+        alias = user.alias
         response = self._telegram_client.get_administrators(chat_id)
-        admin_ids = [user["user"]["id"] for user in response["result"]]
+        admin_ids = [admin["user"]["id"] for admin in response["result"]]
         logger.debug(admin_ids)
-        if user["id"] in admin_ids:
+        if user.id in admin_ids:
             participantes = self._register.list()
             logger.debug(f"Participantes: {participantes}")
             selected = int(random.uniform(0, len(participantes)))
@@ -268,4 +265,4 @@ class Bot:
             message = f"El premiado es {seleccionado}"
         else:
             message = f"{alias}, solo los admin puendesortear! 😜"
-        self._telegram_client.send_message(message, chat_id, thread_id)
+        self._send_queue.send_message(message, chat_id, thread_id)
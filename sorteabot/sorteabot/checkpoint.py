@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import json
+import log
+import logging
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT = "config.json"
+JOURNAL = "seen.log"
+FLUSH_INTERVAL = 60
+FLUSH_EVERY = 100
+SEEN_SIZE = 1000
+
+
+class CheckpointException(Exception):
+    pass
+
+
+class Checkpoint:
+    """Offset of getUpdates and recently seen update ids
+
+    The offset is written with an atomic replace (and fsync) only every
+    `flush_every` updates or `flush_interval` seconds. In between, the ids
+    of the processed updates are appended to a journal without fsync, so
+    after a crash of the bot the updates that Telegram sends again are
+    discarded instead of processed twice.
+
+    An update is journaled only when its handler finishes, and the offset
+    written to the checkpoint never goes past the lowest update still
+    running, so the updates that were running during a crash are not
+    taken as processed. getUpdates polls with the offset past the last
+    update received, so a slow handler does not hold the other chats.
+    """
+
+    @log.debug
+    def __init__(self, state_dir: str, flush_interval: float = FLUSH_INTERVAL,
+                 flush_every: int = FLUSH_EVERY,
+                 seen_size: int = SEEN_SIZE) -> None:
+        os.makedirs(state_dir, exist_ok=True)
+        self._state_dir = state_dir
+        self._path = os.path.join(state_dir, CHECKPOINT)
+        self._journal_path = os.path.join(state_dir, JOURNAL)
+        self._flush_interval = flush_interval
+        self._flush_every = flush_every
+        self._seen_size = seen_size
+        self._seen = OrderedDict()
+        self._lock = Lock()
+        self._offset = 0
+        # dispatched and not finished yet
+        self._running = set()
+        self._pending = 0
+        self._load()
+        self._journal = open(self._journal_path, "a")
+        self._last_flush = time.monotonic()
+
+    @log.debug
+    def _load(self) -> None:
+        if os.path.exists(self._path):
+            try:
+                with open(self._path, "r") as fr:
+                    config = json.load(fr)
+                self._offset = config.get("offset", 0)
+                for update_id in config.get("seen", []):
+                    self._remember(update_id)
+            except (ValueError, AttributeError) as exception:
+                logger.error(f"Corrupted checkpoint {self._path}: "
+                             f"{exception}")
+        if os.path.exists(self._journal_path):
+            with open(self._journal_path, "r") as fr:
+                for line in fr:
+                    try:
+                        update_id = int(line)
+                    except ValueError:
+                        # the last line can be cut by the crash
+                        continue
+                    # not the offset: an older update can be unfinished
+                    self._remember(update_id)
+
+    def _remember(self, update_id: int) -> None:
+        self._seen[update_id] = None
+        self._seen.move_to_end(update_id)
+        if len(self._seen) > self._seen_size:
+            self._seen.popitem(last=False)
+
+    @property
+    def offset(self) -> int:
+        return self._offset
+
+    def _get_saved_offset(self) -> int:
+        return min(self._running, default=self._offset)
+
+    def seen(self, update_id: int) -> bool:
+        """Check if the update was already dispatched. If not, mark it"""
+        with self._lock:
+            if update_id in self._seen or update_id in self._running:
+                return True
+            self._running.add(update_id)
+            return False
+
+    def done(self, update_id: int) -> None:
+        """Journal the update once its handler has finished"""
+        with self._lock:
+            self._running.discard(update_id)
+            self._remember(update_id)
+            self._journal.write(f"{update_id}\n")
+            self._journal.flush()
+            self._pending += 1
+            self._flush_if_needed()
+
+    def advance(self, offset: int) -> None:
+        """Set the next offset, flushing only when it is time to"""
+        with self._lock:
+            self._offset = max(self._offset, offset)
+            self._flush_if_needed()
+
+    def _flush_if_needed(self) -> None:
+        if self._pending >= self._flush_every or \
+                time.monotonic() - self._last_flush >= self._flush_interval:
+            self._flush()
+
+    @log.debug
+    def flush(self) -> None:
+        with self._lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        config = {
+            "offset": self._get_saved_offset(),
+            "seen": list(self._seen)
+        }
+        fd, tmp = tempfile.mkstemp(dir=self._state_dir, prefix=".config.")
+        try:
+            with os.fdopen(fd, "w") as fw:
+                json.dump(config, fw)
+                fw.flush()
+                os.fsync(fw.fileno())
+            os.replace(tmp, self._path)
+            dir_fd = os.open(self._state_dir, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+        except OSError as exception:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise CheckpointException(exception)
+        # everything in the journal is in the checkpoint now
+        self._journal.truncate(0)
+        self._pending = 0
+        self._last_flush = time.monotonic()
@@ -21,12 +21,20 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import atexit
 import logging
 import os
 import sys
 from bot import Bot
+from checkpoint import Checkpoint, FLUSH_EVERY, FLUSH_INTERVAL
+from dispatcher import WORKERS
 from dotenv import load_dotenv
+from metrics import MetricsServer, REGISTRY
 from register import Register
+from sendqueue import SendQueue
+from telegram import (API_URL, AsyncTelegramClient, AsyncTelegramRunner,
+                      TelegramClient)
+from webhook import WebhookServer
 
 logging.basicConfig(
         stream=sys.stdout,
@@ -35,18 +43,75 @@ logging.basicConfig(
         )
 logger = logging.getLogger(__name__)
 
+CURDIR = os.path.realpath(os.path.dirname(__file__))
+
+
+def setup(config, scheduler=None, session=None) -> Bot:
+    """Build the bot from its configuration (the environment variables)
+
+    The requests to Telegram use `session`, so that several bots can share
+    it. There are no periodic tasks, `scheduler` is there to keep the same
+    signature as the other bots.
+    """
+    logger.debug("setup")
+    token = config.get("TOKEN", "")
+    chat_id = config.get("CHAT_ID", "")
+    thread_id = config.get("THREAD_ID", "")
+    database = config.get("DATABASE", "database.db")
+    register = Register(database)
+    api_url = config.get("TELEGRAM_API_URL", API_URL)
+    telegram_client = TelegramClient(token, api_url, session)
+    if config.get("ASYNC_SEND", "false").lower() == "true":
+        # the messages go out through aiohttp, many of them in flight
+        async_runner = AsyncTelegramRunner(
+                AsyncTelegramClient(token, api_url=api_url))
+        async_runner.start()
+        send_queue = SendQueue(async_runner)
+    else:
+        send_queue = SendQueue(telegram_client)
+    send_queue.start()
+    metrics_port = config.get("METRICS_PORT", "")
+    if metrics_port:
+        REGISTRY.gauge("telegram_send_queue_depth",
+                       "Messages waiting to be sent",
+                       lambda: send_queue.get_stats()["depth"])
+        metrics_host = config.get("METRICS_HOST", "127.0.0.1")
+        metrics_server = MetricsServer(metrics_host, int(metrics_port))
+        metrics_server.start()
+    state_dir = config.get("STATE_DIR", CURDIR)
+    flush_interval = float(config.get("FLUSH_INTERVAL", FLUSH_INTERVAL))
+    flush_every = int(config.get("FLUSH_EVERY", FLUSH_EVERY))
+    checkpoint = Checkpoint(state_dir, flush_interval, flush_every)
+    atexit.register(checkpoint.flush)
+    username = telegram_client.get_me()["result"]["username"]
+    workers = int(config.get("WORKERS", WORKERS))
+    return Bot(telegram_client, send_queue, chat_id, thread_id, register,
+               checkpoint, username=username, workers=workers)
+
+
+def serve(bot: Bot, config) -> None:
+    """Receive the updates from the webhook or with long polling"""
+    logger.debug("serve")
+    webhook_url = config.get("WEBHOOK_URL", "")
+    if webhook_url:
+        webhook_secret = config.get("WEBHOOK_SECRET", "")
+        webhook_port = int(config.get("WEBHOOK_PORT", 8080))
+        bot.set_webhook(webhook_url, webhook_secret)
+        webhook = WebhookServer(bot, webhook_url, port=webhook_port,
+                                secret_token=webhook_secret)
+        webhook.run()
+    else:
+        # getUpdates does not work while a webhook is set
+        bot.delete_webhook()
+        while True:
+            bot.get_updates()
+
 
 def main():
     load_dotenv()
-    token = os.getenv("TOKEN", "")
-    chat_id = os.getenv("CHAT_ID", "")
-    thread_id = os.getenv("THREAD_ID", "")
-    database = os.getenv("DATABASE", "database.db")
-    register = Register(database)
-    bot = Bot(token, chat_id, thread_id, register)
+    bot = setup(os.environ)
     logger.debug("main")
-    while True:
-        bot.get_updates()
+    serve(bot, os.environ)
 
 
 if __name__ == "__main__":
@@ -24,6 +24,11 @@
 import log
 import logging
 import sqlite3
+import time
+from functools import wraps
+from metrics import REGISTRY
+from model import Message
+from threading import RLock
 
 
 PARTICIPANTES = """
@@ -42,6 +47,26 @@ PARTICIPANTES = """
 
 logger = logging.getLogger(__name__)
 
+REGISTER_SECONDS = REGISTRY.histogram(
+        "sorteabot_register_seconds", "Time of the database operations",
+        ("operation",))
+REGISTER_WAIT_SECONDS = REGISTRY.histogram(
+        "sorteabot_register_wait_seconds",
+        "Time waiting for the database connection", ("operation",))
+
+
+def synchronized(method):
+    """The connection is shared by the threads that process the updates"""
+    @wraps(method)
+    def wrap(self, *args, **kwargs):
+        start = time.perf_counter()
+        with self._lock:
+            REGISTER_WAIT_SECONDS.observe(time.perf_counter() - start,
+                                          operation=method.__name__)
+            with REGISTER_SECONDS.time(operation=method.__name__):
+                return method(self, *args, **kwargs)
+    return wrap
+
 
 class RegisterException(Exception):
     pass
@@ -59,7 +84,8 @@ class Register:
 
     @log.debug
     def __init__(self, db):
-        self._connection = sqlite3.connect(db)
+        self._lock = RLock()
+        self._connection = sqlite3.connect(db, check_same_thread=False)
         try:
             cursor = self._connection.cursor()
             cursor.execute(PARTICIPANTES)
@@ -67,6 +93,7 @@ class Register:
             raise RegisterException(e)
 
     @log.debug
+    @synchronized
     def list(self):
         try:
             sql = "SELECT * FROM participantes WHERE premiado = ?"
@@ -78,6 +105,7 @@ class Register:
             raise RegisterException(e)
 
     @log.debug
+    @synchronized
     def count(self):
         try:
             sql = "SELECT count(1) FROM participantes WHERE premiado = ?"
@@ -89,6 +117,7 @@ class Register:
             raise RegisterException(e)
 
     @log.debug
+    @synchronized
     def set_premiado(self, id):
         try:
             sql = "UPDATE participantes SET premiado = ? WHERE id = ?"
@@ -101,11 +130,11 @@ class Register:
             raise RegisterException(e)
 
     @log.debug
-    def exists(self, message):
+    @synchronized
+    def exists(self, message: Message):
         try:
-            user = message["from"]
             sql = "SELECT COUNT(*) FROM participantes WHERE id = ?"
-            data = (user["id"],)
+            data = (message.user.id,)
             cursor = self._connection.cursor()
             res = cursor.execute(sql, data)
             result = res.fetchone()
@@ -114,23 +143,18 @@ class Register:
             raise RegisterException(e)
 
     @log.debug
-    def add(self, message):
-        user = message["from"]
-        chat = message["chat"]
-        timestamp = message["date"]
+    @synchronized
+    def add(self, message: Message):
+        user = message.user
         if self.exists(message):
             raise RegisterExists("ya registrado")
         try:
             sql = ("INSERT INTO participantes (id, is_bot, first_name,"
                    " last_name, username, language_code, chat_id, timestamp,"
                    " premiado) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)")
-            username = user["username"] if "username" in user else ""
-            first_name = user["first_name"] if "first_name" in user else ""
-            last_name = user["last_name"] if "last_name" in user else ""
-            language_code = user["language_code"] if "language_code" in user \
-                else ""
-            data = (user["id"], user["is_bot"], first_name, last_name,
-                    username, language_code, chat["id"], timestamp, False,)
+            data = (user.id, user.is_bot, user.first_name, user.last_name,
+                    user.username, user.language_code, message.chat_id,
+                    message.date, False,)
             logger.debug(data)
             cursor = self._connection.cursor()
             result = cursor.execute(sql, data)
@@ -141,13 +165,13 @@ class Register:
             raise RegisterException(e)
 
     @log.debug
-    def rm(self, message):
-        user = message["from"]
+    @synchronized
+    def rm(self, message: Message):
         if not self.exists(message):
             raise RegisterNotExists("no registrado")
         try:
             sql = "DELETE FROM participantes WHERE id = ?"
-            data = (user["id"],)
+            data = (message.user.id,)
             cursor = self._connection.cursor()
             result = cursor.execute(sql, data)
             self._connection.commit()
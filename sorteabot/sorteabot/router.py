@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import log
+from metrics import REGISTRY, Registry
+
+
+class Router:
+    """Table of commands
+
+    The handler is found with a single lookup of the first token of the
+    text, without the `@botname` suffix that Telegram adds in groups.
+    """
+
+    @log.debug
+    def __init__(self, username: str = "",
+                 registry: Registry = REGISTRY) -> None:
+        self._username = username.lower()
+        self._handlers = {}
+        self._latency = registry.histogram(
+                "bot_command_seconds", "Time to process a command",
+                ("command",))
+        self._errors = registry.counter(
+                "bot_command_errors_total", "Commands that failed",
+                ("command",))
+
+    def add(self, handler, *commands: str) -> None:
+        for command in commands:
+            self._handlers[command] = handler
+
+    def get_command(self, text: str):
+        """The command of the text or None if it is not a command for us"""
+        if not text.startswith("/"):
+            return None
+        command, _, username = text.split(maxsplit=1)[0].partition("@")
+        if username and self._username and \
+                username.lower() != self._username:
+            return None
+        return command
+
+    def dispatch(self, command: str, message) -> bool:
+        """Run the handler of the command. False if there is no handler"""
+        handler = self._handlers.get(command)
+        if handler is None:
+            return False
+        with self._latency.time(command=command):
+            try:
+                handler(message)
+            except Exception:
+                self._errors.inc(command=command)
+                raise
+        return True
+
+    def get_stats(self) -> dict:
+        stats = {}
+        for command in self._handlers:
+            latency = self._latency.get(command=command)
+            stats[command] = {
+                "calls": latency["count"],
+                "errors": self._errors.get(command=command),
+                "total": latency["sum"],
+                "buckets": latency["buckets"]
+            }
+        return stats
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import log
+import logging
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import CancelledError, Future
+from threading import Condition, Thread
+
+logger = logging.getLogger(__name__)
+
+# Telegram limits: about 30 messages per second overall, one message per
+# second in the same chat and 20 messages per minute in the same group
+GLOBAL_RATE = 30
+GLOBAL_BURST = 30
+CHAT_RATE = 1
+CHAT_BURST = 1
+GROUP_RATE = 20 / 60
+GROUP_BURST = 3
+MAX_RETRIES = 5
+# max requests in flight when the client is an AsyncTelegramRunner
+MAX_IN_FLIGHT = 100
+# seconds between the removals of the buckets of idle chats
+PRUNE_INTERVAL = 60
+
+
+class TokenBucket:
+    """A token bucket
+
+    Attributes
+    ----------
+    rate : Tokens added per second
+    capacity : Max number of tokens (burst)
+    """
+
+    def __init__(self, rate: float, capacity: float, now: float) -> None:
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = capacity
+        self._timestamp = now
+        self._paused_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        if now > self._timestamp:
+            self._tokens = min(self._capacity, self._tokens +
+                               (now - self._timestamp) * self._rate)
+            self._timestamp = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds to wait before a token is available"""
+        self._refill(now)
+        wait = 0.0 if self._tokens >= 1 else (1 - self._tokens) / self._rate
+        return max(wait, self._paused_until - now)
+
+    def is_full(self, now: float) -> bool:
+        """True if the bucket is as if it were new, so it can be dropped"""
+        self._refill(now)
+        return self._tokens >= self._capacity and now >= self._paused_until
+
+    def consume(self, now: float) -> None:
+        self._refill(now)
+        self._tokens -= 1
+
+    def pause(self, now: float, seconds: float) -> None:
+        """Stop giving tokens for a while (Telegram retry_after)"""
+        self._paused_until = max(self._paused_until, now + seconds)
+        self._tokens = min(self._tokens, 0)
+
+
+class SendQueue(Thread):
+    """Outbound message queue between the bots and the TelegramClient
+
+    Messages are sent in order for every chat, respecting both the global
+    and the per chat limits of Telegram, and the chats take turns. When
+    Telegram answers with a 429 the message is requeued and its chat waits
+    `retry_after` seconds.
+
+    When the client has a `submit` method (AsyncTelegramRunner) the
+    requests are sent without waiting for the previous ones, one in flight
+    per chat so that the order of every chat is kept.
+    """
+
+    def __init__(self, telegram_client, global_rate: float = GLOBAL_RATE,
+                 global_burst: float = GLOBAL_BURST,
+                 max_retries: int = MAX_RETRIES,
+                 clock=time.monotonic) -> None:
+        super().__init__()
+        logger.debug("__init__")
+        self.daemon = True
+        self._telegram_client = telegram_client
+        self._clock = clock
+        self._max_retries = max_retries
+        self._condition = Condition()
+        self._global_bucket = TokenBucket(global_rate, global_burst, clock())
+        self._chat_buckets = {}
+        self._pruned = clock()
+        self._chats = OrderedDict()
+        self._in_flight = set()
+        self._depth = 0
+        self._sent = 0
+        self._failed = 0
+        self._retried = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._running = True
+
+    @log.debug
+    def send_message(self, text: str, chat_id: int,
+                     thread_id: int = 0) -> None:
+        """Queue a message. Same signature as TelegramClient.send_message"""
+        self._put(chat_id, "send_message", (text, chat_id, thread_id))
+
+    @log.debug
+    def send_photo(self, photo: bytes, chat_id: int, caption: str = "",
+                   thread_id: int = 0) -> None:
+        """Queue a photo. Same signature as TelegramClient.send_photo"""
+        self._put(chat_id, "send_photo", (photo, chat_id, caption, thread_id))
+
+    def _put(self, chat_id: int, method: str, args: tuple) -> None:
+        with self._condition:
+            if chat_id not in self._chats:
+                self._chats[chat_id] = deque()
+            self._chats[chat_id].append(
+                    [method, args, chat_id, self._clock(), 0])
+            self._depth += 1
+            self._condition.notify()
+
+    def get_stats(self) -> dict:
+        """Queue depth, counters and wait times (seconds)"""
+        with self._condition:
+            return {
+                "depth": self._depth,
+                "chats": len(self._chats),
+                "in_flight": len(self._in_flight),
+                "buckets": len(self._chat_buckets),
+                "sent": self._sent,
+                "failed": self._failed,
+                "retried": self._retried,
+                "wait_avg": self._wait_total / (self._sent + self._failed)
+                if self._sent + self._failed else 0.0,
+                "wait_max": self._wait_max
+            }
+
+    @log.debug
+    def stop(self) -> None:
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+
+    def _get_chat_bucket(self, chat_id: int) -> TokenBucket:
+        if chat_id not in self._chat_buckets:
+            # groups and channels have negative ids
+            if chat_id < 0:
+                bucket = TokenBucket(GROUP_RATE, GROUP_BURST, self._clock())
+            else:
+                bucket = TokenBucket(CHAT_RATE, CHAT_BURST, self._clock())
+            self._chat_buckets[chat_id] = bucket
+        return self._chat_buckets[chat_id]
+
+    def _prune(self) -> None:
+        """Drop the buckets of the chats without messages that are full"""
+        now = self._clock()
+        if now - self._pruned < PRUNE_INTERVAL:
+            return
+        self._pruned = now
+        for chat_id in [chat_id for chat_id, bucket
+                        in self._chat_buckets.items()
+                        if chat_id not in self._chats and bucket.is_full(now)]:
+            del self._chat_buckets[chat_id]
+
+    def _next(self):
+        """Next message that can be sent or the time to wait for it"""
+        if len(self._in_flight) >= MAX_IN_FLIGHT:
+            return None, None
+        now = self._clock()
+        global_wait = self._global_bucket.wait_time(now)
+        best_wait = None
+        for chat_id, items in self._chats.items():
+            if not items or chat_id in self._in_flight:
+                continue
+            wait = max(global_wait,
+                       self._get_chat_bucket(chat_id).wait_time(now))
+            if wait <= 0:
+                # round-robin: the chat goes after the others
+                self._chats.move_to_end(chat_id)
+                return chat_id, 0
+            if best_wait is None or wait < best_wait:
+                best_wait = wait
+        return None, best_wait
+
+    @log.debug
+    def run(self):
+        while True:
+            with self._condition:
+                self._prune()
+                chat_id, wait = self._next()
+                while self._running and chat_id is None:
+                    self._condition.wait(wait)
+                    chat_id, wait = self._next()
+                if not self._running:
+                    return
+                now = self._clock()
+                self._global_bucket.consume(now)
+                self._get_chat_bucket(chat_id).consume(now)
+                item = self._chats[chat_id].popleft()
+                self._in_flight.add(chat_id)
+            self._send(item)
+
+    def _send(self, item) -> None:
+        method, args = item[0], item[1]
+        submit = getattr(self._telegram_client, "submit", None)
+        try:
+            if submit is not None:
+                future = submit(method, *args)
+                future.add_done_callback(
+                        lambda future: self._finish(item, future))
+                return
+            getattr(self._telegram_client, method)(*args)
+        except Exception as exception:
+            self._finish(item, exception=exception)
+            return
+        self._finish(item)
+
+    def _finish(self, item, future: Future | None = None,
+                exception: BaseException | None = None) -> None:
+        """Account the result of a request, requeue it on a 429"""
+        method, args, chat_id, queued, retries = item
+        if future is not None:
+            exception = (CancelledError() if future.cancelled()
+                         else future.exception())
+        with self._condition:
+            self._in_flight.discard(chat_id)
+            self._condition.notify()
+            if exception is None:
+                self._sent += 1
+                self._done(chat_id, queued)
+                return
+            retry_after = getattr(exception, "retry_after", None)
+            if retry_after is not None and retries < self._max_retries:
+                logger.warning(f"Retry after {retry_after}s ({chat_id})")
+                now = self._clock()
+                self._get_chat_bucket(chat_id).pause(now, retry_after)
+                item[4] += 1
+                if chat_id not in self._chats:
+                    self._chats[chat_id] = deque()
+                self._chats[chat_id].appendleft(item)
+                self._retried += 1
+            else:
+                logger.error(f"Message to {chat_id} lost: {exception}")
+                self._failed += 1
+                self._done(chat_id, queued)
+
+    def _done(self, chat_id: int, queued: float) -> None:
+        wait = self._clock() - queued
+        self._wait_total += wait
+        self._wait_max = max(self._wait_max, wait)
+        self._depth -= 1
+        if not self._chats[chat_id]:
+            del self._chats[chat_id]
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import time
+from sorteabot.sendqueue import SendQueue
+
+
+class FakeTelegramClient:
+    def __init__(self):
+        self.messages = []
+
+    def send_message(self, text, chat_id, thread_id=0):
+        self.messages.append((chat_id, text))
+
+
+class TestSendQueue:
+    def test_send(self):
+        telegram_client = FakeTelegramClient()
+        send_queue = SendQueue(telegram_client)
+        send_queue.start()
+        send_queue.send_message("Hola", 1)
+        start = time.monotonic()
+        while send_queue.get_stats()["depth"] > 0:
+            assert time.monotonic() - start < 5
+            time.sleep(0.01)
+        send_queue.stop()
+        assert telegram_client.messages == [(1, "Hola")]
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Lorenzo Carbonell <a.k.a. atareao>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import json
+import urllib.error
+import urllib.request
+from sorteabot.webhook import SECRET_HEADER, WebhookServer
+
+URL = "https://example.com/webhook"
+SECRET = "secreto"
+
+
+class FakeBot:
+    def __init__(self):
+        self.responses = []
+
+    def _process_response(self, response):
+        self.responses.append(response)
+
+
+class TestWebhookServer:
+    @classmethod
+    def setup_class(cls):
+        cls.bot = FakeBot()
+        cls.webhook = WebhookServer(cls.bot, URL, host="127.0.0.1", port=0,
+                                    secret_token=SECRET)
+        cls.webhook.start()
+
+    @classmethod
+    def teardown_class(cls):
+        cls.webhook.stop()
+
+    def post(self, path, data, secret=SECRET):
+        url = f"http://127.0.0.1:{self.webhook.port}{path}"
+        request = urllib.request.Request(
+                url, data=json.dumps(data).encode(),
+                headers={"Content-Type": "application/json",
+                         SECRET_HEADER: secret})
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status
+        except urllib.error.HTTPError as error:
+            return error.code
+
+    def test_update(self):
+        update = {"update_id": 1,
+                  "message": {"chat": {"id": 1}, "text": "/help"}}
+        assert self.post("/webhook", update) == 200
+        assert self.bot.responses[-1] == {"ok": True, "result": [update]}
+
+    def test_wrong_secret(self):
+        assert self.post("/webhook", {"update_id": 2}, "otro") == 403
+
+    def test_wrong_path(self):
+        assert self.post("/otro", {"update_id": 3}) == 404